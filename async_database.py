@@ -0,0 +1,116 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+
+# Funções com estes prefixos apenas leem o banco e podem rodar em paralelo.
+# Todas as outras são tratadas como escrita e executadas em uma única thread, em ordem.
+READ_PREFIXES = ("get_", "count_")
+READ_WORKERS = 4 # Threads dedicadas às leituras
+MAX_PENDING_QUERIES = 64 # Limite de consultas em andamento; acima disso os comandos aguardam (back-pressure)
+SLOW_QUERY_THRESHOLD = 0.25 # Segundos; consultas mais lentas são registradas no console
+
+
+class QueryStats:
+    """Acumula o tempo de execução de uma função do banco."""
+
+    def __init__(self):
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed):
+        self.calls += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+    @property
+    def avg_time(self):
+        return self.total_time / self.calls if self.calls else 0.0
+
+
+class AsyncDatabase:
+    """
+    Fachada assíncrona sobre o módulo database.
+
+    Qualquer função de database.py pode ser chamada como `await db.nome_da_funcao(...)`.
+    A chamada roda fora do event loop do discord.py: leituras em um pool de threads e
+    escritas em uma única thread dedicada, evitando disputas pelo lock de escrita do SQLite.
+    """
+
+    def __init__(self, read_workers=READ_WORKERS, max_pending=MAX_PENDING_QUERIES, slow_query_threshold=SLOW_QUERY_THRESHOLD):
+        self.read_workers = read_workers
+        self.max_pending = max_pending
+        self.slow_query_threshold = slow_query_threshold
+        self._reader = None
+        self._writer = None
+        self._semaphore = None
+        self._stats_lock = threading.Lock()
+        self.stats = {}
+        self.pending = 0
+
+    def _executors(self):
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+            self._reader = ThreadPoolExecutor(max_workers=self.read_workers, thread_name_prefix="db-reader")
+        return self._reader, self._writer
+
+    def _timed_call(self, func, args, kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                self.stats.setdefault(func.__name__, QueryStats()).record(elapsed)
+            if elapsed >= self.slow_query_threshold:
+                print(f"[DB] Consulta lenta: {func.__name__} levou {elapsed * 1000:.0f} ms.")
+
+    async def run(self, func, *args, **kwargs):
+        """Executa uma função síncrona do banco na thread apropriada e aguarda o resultado."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_pending)
+        reader, writer = self._executors()
+        executor = reader if func.__name__.startswith(READ_PREFIXES) else writer
+
+        async with self._semaphore:
+            self.pending += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(executor, functools.partial(self._timed_call, func, args, kwargs))
+            finally:
+                self.pending -= 1
+
+    def __getattr__(self, name):
+        func = getattr(database, name)
+        if not callable(func):
+            raise AttributeError(name)
+
+        @functools.wraps(func)
+        async def call(*args, **kwargs):
+            return await self.run(func, *args, **kwargs)
+
+        setattr(self, name, call) # Guarda o wrapper para as próximas chamadas
+        return call
+
+    def report(self, limit=10):
+        """Retorna as funções que mais consumiram tempo, para diagnóstico."""
+        with self._stats_lock:
+            items = sorted(self.stats.items(), key=lambda kv: kv[1].total_time, reverse=True)
+        return [
+            f"{name}: {s.calls} chamadas | média {s.avg_time * 1000:.1f} ms | máx {s.max_time * 1000:.1f} ms"
+            for name, s in items[:limit]
+        ]
+
+    def shutdown(self):
+        """Aguarda as consultas pendentes e encerra as threads."""
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._reader.shutdown(wait=True)
+            self._writer = self._reader = None
+
+
+db = AsyncDatabase()
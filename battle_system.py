@@ -2,7 +2,11 @@ import discord
 import asyncio
 import random
 import database
-from game_constants import CLASS_DETAILS, XP_PER_LEVEL_MULTIPLIER, ATTRIBUTE_MAP_EN_PT
+import combat_engine
+from async_database import db
+from loot_system import roll_drops, LOOT_ROLLS, ELITE_LOOT_ROLLS
+from game_constants import XP_PER_LEVEL_MULTIPLIER
+from outbox_system import get_outbox
 
 
 class PVEBattle:
@@ -60,19 +64,15 @@ class PVEBattle:
         self.player_defending = False
 
         if action == "atacar":
-            class_info = CLASS_DETAILS.get(self.player['class'])
-            base_attack_stat_name = class_info.get('key_attribute', 'strength') if class_info['type'] == 'physical' else 'strength'
-            
-            base_attack_stat = self.player[base_attack_stat_name]
-            player_total_attack = base_attack_stat + self.player_bonuses['attack']
-            player_damage = max(0, round(player_total_attack * random.uniform(0.8, 1.2)) - self.enemy['defense'])
+            player_total_attack = combat_engine.player_attack_power(self.player, self.player_bonuses)
+            player_damage = combat_engine.roll_damage(player_total_attack, self.enemy['defense'])
             self.enemy_hp -= player_damage
             log_entries.append(f"⚔️ Você ataca o {self.enemy['name']} e causa **{player_damage}** de dano!")
 
             # Lógica de Lifesteal
             lifesteal_percent = self.player_bonuses.get("special", {}).get("LIFESTEAL_PERCENT")
             if lifesteal_percent and player_damage > 0:
-                life_drained = round(player_damage * (lifesteal_percent / 100))
+                life_drained = combat_engine.lifesteal_amount(player_damage, lifesteal_percent)
                 self.player_hp = min(self.player['max_hp'], self.player_hp + life_drained)
                 log_entries.append(f"🩸 Você drena **{life_drained}** de vida do inimigo! (HP: {self.player_hp})")
 
@@ -98,7 +98,7 @@ class PVEBattle:
 
     async def _use_skill(self, ctx):
         """Lógica para o jogador usar uma habilidade."""
-        skills = database.get_character_skills(self.player['class'], self.player['level'])
+        skills = await db.get_character_skills(self.player['class'], self.player['level'])
         if not skills:
             return ["Você ainda não aprendeu nenhuma habilidade! Você perde seu turno."]
 
@@ -124,7 +124,7 @@ class PVEBattle:
 
             # Deduz MP e aplica o efeito
             self.player_mp -= skill['mp_cost']
-            database.update_character_stats(self.player['user_id'], {'mp': self.player_mp})
+            database.buffer_character_stats(self.player['user_id'], {'mp': self.player_mp}) # Gravado no fim da batalha
             
             log_entries = [f"Você usou **{skill['name']}**!"]
             scaling_stat_value = self.player.get(skill['scaling_stat'], 0)
@@ -171,7 +171,7 @@ class PVEBattle:
 
     async def _use_item(self, ctx):
         """Lógica para o jogador usar um item."""
-        inventory = database.get_inventory(self.player['user_id'])
+        inventory = await db.get_inventory(self.player['user_id'])
         consumables = [item for item in inventory if item[5] == 'potion'] # item[5] é item_type
 
         if not consumables:
@@ -199,12 +199,12 @@ class PVEBattle:
             if effect_type == 'HEAL_HP':
                 healed_amount = min(self.player['max_hp'] - self.player_hp, effect_value)
                 self.player_hp += healed_amount
-                database.remove_item_from_inventory(self.player['user_id'], item_id, 1)
+                await db.remove_item_from_inventory(self.player['user_id'], item_id, 1)
                 return [f"Você usou **{name}** e recuperou **{healed_amount}** de HP! HP atual: {self.player_hp}"]
             elif effect_type == 'HEAL_MP':
                 healed_amount = min(self.player['max_mp'] - self.player_mp, effect_value)
                 self.player_mp += healed_amount
-                database.remove_item_from_inventory(self.player['user_id'], item_id, 1)
+                await db.remove_item_from_inventory(self.player['user_id'], item_id, 1)
                 return [f"Você usou **{name}** e recuperou **{healed_amount}** de MP! MP atual: {self.player_mp}"]
             else:
                 return [f"O item **{name}** não pode ser usado em batalha. Você perde seu turno."]
@@ -218,11 +218,9 @@ class PVEBattle:
         
         # Processar buffs/debuffs
         defense_buff = self.player_buffs.get('defense', {}).get('value', 0)
-        player_total_defense = self.player_bonuses['defense'] + (self.player['dexterity'] // 4) + defense_buff
-        if self.player_defending:
-            player_total_defense += self.player['dexterity'] // 2
+        player_total_defense = combat_engine.player_defense_power(self.player, self.player_bonuses, defense_buff, self.player_defending)
 
-        enemy_damage = max(0, round(self.enemy['attack'] * random.uniform(0.8, 1.2)) - player_total_defense)
+        enemy_damage = combat_engine.roll_damage(self.enemy['attack'], player_total_defense)
         self.player_hp -= enemy_damage
         log_entries.append(f"💥 O {self.enemy['name']} ataca e causa **{enemy_damage}** de dano em você!")
 
@@ -252,35 +250,26 @@ class PVEBattle:
 
     async def run_autohunt_loop(self, ctx):
         """Executa o loop de batalha automático."""
-        battle_log = []
-
-        while self.player_hp > 0 and self.enemy_hp > 0:
-            # Turno do Jogador
-            player_logs = await self._handle_player_action(ctx, "atacar")
-            battle_log.extend([f"Turno {self.turn}: {log}" for log in player_logs])
-            
-            if self.enemy_hp <= 0: break
-
-            # Turno do Inimigo
-            enemy_logs = self._process_enemy_turn()
-            battle_log.extend([f"Turno {self.turn}: {log}" for log in enemy_logs])
+        result = combat_engine.resolve_autohunt(self.player, self.player_bonuses, self.enemy, self.player_hp, self.enemy_hp)
+        self.player_hp = result.player_hp
+        self.enemy_hp = result.enemy_hp
+        self.turn = result.turns
 
-            self.turn += 1
-
-        log_message = "\n".join(battle_log)
+        log_message = result.format_log(self.enemy['name'])
         embed = discord.Embed(title=f"Resumo da Batalha: {self.player['name']} vs {self.enemy['name']}", description=log_message, color=discord.Color.orange())
+        embed.set_footer(text=result.summary())
         await ctx.send(embed=embed)
 
-        self.winner = 'player' if self.player_hp > 0 else 'enemy'
+        self.winner = result.winner
         await self._end_battle(ctx)
 
     async def run_manual_loop(self, ctx):
         """Executa o loop de batalha manual, aguardando input do jogador."""
+        # Os logs do turno são juntados pela fila do canal e saem com o próximo embed
+        outbox = get_outbox(ctx.channel)
         while self.winner is None:
             # Processar efeitos de status no inimigo (ex: veneno)
-            status_logs = self._process_status_effects()
-            if status_logs:
-                await ctx.send("\n".join(status_logs))
+            outbox.log(*self._process_status_effects())
             if self.enemy_hp <= 0:
                 self.winner = 'player'
                 break
@@ -289,7 +278,7 @@ class PVEBattle:
             embed.add_field(name=f"{self.player['name']} HP", value=f"{self.player_hp}/{self.player['max_hp']}", inline=True)
             embed.add_field(name=f"{self.player['name']} MP", value=f"{self.player_mp}/{self.player['max_mp']}", inline=True)
             embed.add_field(name=f"{self.enemy['name']} HP", value=f"{self.enemy_hp}/{self.enemy['hp']}", inline=True)
-            await ctx.send(embed=embed)
+            await outbox.send(embed=embed)
 
             try:
                 action_msg = await self.bot.wait_for(
@@ -299,12 +288,11 @@ class PVEBattle:
                 )
                 action = action_msg.content.lower()
             except asyncio.TimeoutError:
-                await ctx.send("Você demorou demais para agir! O inimigo ataca!")
+                outbox.log("Você demorou demais para agir! O inimigo ataca!")
                 action = "passar"
 
             if action != "passar":
-                player_logs = await self._handle_player_action(ctx, action)
-                if player_logs: await ctx.send("\n".join(player_logs))
+                outbox.log(*await self._handle_player_action(ctx, action))
 
             if self.winner is not None: break # Se o jogador fugiu
             if self.enemy_hp <= 0:
@@ -313,8 +301,7 @@ class PVEBattle:
 
             # Turno do Inimigo
             await asyncio.sleep(1)
-            enemy_logs = self._process_enemy_turn()
-            if enemy_logs: await ctx.send("\n".join(enemy_logs))
+            outbox.log(*self._process_enemy_turn())
 
             if self.player_hp <= 0:
                 self.winner = 'enemy'
@@ -324,6 +311,7 @@ class PVEBattle:
             self._tick_down_effects()
             self.turn += 1
 
+        await outbox.flush() # O resultado só aparece depois do último log
         await self._end_battle(ctx)
 
     async def _end_battle(self, ctx):
@@ -334,7 +322,7 @@ class PVEBattle:
             await ctx.send("Batalha encerrada.")
         elif self.winner == 'enemy':
             await ctx.send(f"☠️ Você foi derrotado pelo {self.enemy['name']}... Sua jornada termina aqui (por enquanto).")
-            database.update_character_stats(user_id, {"hp": 1})
+            database.buffer_character_stats(user_id, {"hp": 1})
         elif self.winner == 'player':
             result_embed = discord.Embed(title="🏆 **VITÓRIA!** 🏆", description=f"Você derrotou o {self.enemy['name']}!", color=discord.Color.green())
 
@@ -381,30 +369,30 @@ class PVEBattle:
                 updates['hp'] = updates['max_hp'] # Restaura HP e MP no level up
                 updates['mp'] = updates['max_mp']
 
-            database.update_character_stats(user_id, updates)
+            database.buffer_character_stats(user_id, updates)
 
             # Lógica de Loot
-            loot_rolls = 2 if self.is_elite else 1
-            loot_chance = 0.3
-            loot_found = []
-            
-            for _ in range(loot_rolls):
-                if random.random() <= loot_chance:
-                    loot_item = database.get_random_loot(self.player['level'])
-                    if loot_item:
-                        database.add_item_to_inventory(user_id, loot_item['id'])
-                        loot_found.append(f"🎁 **{loot_item['name']}**")
+            loot_rolls = ELITE_LOOT_ROLLS if self.is_elite else LOOT_ROLLS
+            drops = roll_drops(self.player['level'], loot_rolls, elite=self.is_elite)
+            if drops:
+                await db.add_items([(user_id, loot_item['id']) for loot_item in drops])
+            loot_found = [f"🎁 **{loot_item['name']}**" for loot_item in drops]
 
             loot_message = "\n".join(loot_found) if loot_found else "Nenhum item encontrado."
             result_embed.add_field(name="Loot", value=loot_message, inline=False)
             
-            updated_player = database.get_character(user_id)
+            updated_player = {**self.player, **updates} # Mesmos valores que get_character retornaria, sem reler o banco
             result_embed.set_footer(text=f"HP Final: {self.player_hp}/{updated_player['max_hp']} | XP: {updated_player['experience']}/{updated_player['level'] * XP_PER_LEVEL_MULTIPLIER}")
 
             await ctx.send(embed=result_embed)
 
-            # Atualiza o progresso da missão
-            database.update_quest_progress(user_id, 'kill', self.original_enemy_name)
+            # Atualiza o progresso da missão e avisa na hora se alguma foi completada
+            completed_quests = await db.update_quest_progress(user_id, 'kill', self.original_enemy_name)
+            for quest in completed_quests:
+                await ctx.send(f"📜 Missão **{quest['name']}** completa! Use `!quest complete {quest['id']}` para receber a recompensa.")
+
+        # Grava de uma vez todas as alterações de status da batalha
+        await db.flush_character_stats(user_id)
 
         # Limpa a batalha ativa
         if self.battle_manager and user_id in self.battle_manager:
@@ -0,0 +1,141 @@
+import asyncio
+import random
+import time
+
+import discord
+
+from config import GENERAL_CHANNEL_NAME
+
+# --- Configuração dos Anúncios ---
+BROADCAST_CONCURRENCY = 10 # Envios simultâneos
+# O Discord limita cada bot a 50 requisições/s no total; fica uma folga para os comandos dos jogadores
+BROADCAST_RATE_PER_SECOND = 30
+BROADCAST_MAX_ATTEMPTS = 3
+BROADCAST_RETRY_DELAY = 2.0 # Segundos; dobra a cada nova tentativa
+
+
+class RateLimiter:
+    """Balde de fichas assíncrono: no máximo `rate` aquisições a cada `per` segundos, com rajadas de até `rate`."""
+
+    def __init__(self, rate, per=1.0):
+        self.rate = rate
+        self.per = per
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.per)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self.per / self.rate)
+
+
+class GeneralChannelCache:
+    """
+    Guarda o ID do canal #geral de cada servidor, para não percorrer guild.text_channels a cada anúncio.
+    Servidores sem o canal também ficam guardados (como None). As entradas são descartadas pelos
+    eventos de criação, edição e exclusão de canais do main.py.
+    """
+
+    def __init__(self):
+        self._channel_ids = {} # {guild_id: channel_id ou None}
+
+    def get(self, guild):
+        if guild.id in self._channel_ids:
+            channel_id = self._channel_ids[guild.id]
+            if channel_id is None:
+                return None
+            channel = guild.get_channel(channel_id)
+            if channel is not None and channel.name == GENERAL_CHANNEL_NAME:
+                return channel
+        channel = discord.utils.get(guild.text_channels, name=GENERAL_CHANNEL_NAME)
+        self._channel_ids[guild.id] = channel.id if channel else None
+        return channel
+
+    def invalidate(self, guild_id):
+        self._channel_ids.pop(guild_id, None)
+
+
+def _is_transient(error):
+    """Erros em que vale tentar de novo: falhas do servidor do Discord, limites de taxa e rede."""
+    if isinstance(error, discord.HTTPException):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (asyncio.TimeoutError, OSError))
+
+
+class Broadcaster:
+    """
+    Envia a mesma mensagem para vários canais ao mesmo tempo.
+
+    Um semáforo limita quantos envios ficam em andamento e um balde de fichas mantém o ritmo
+    abaixo do limite global do Discord (os limites por canal já são tratados pelo discord.py,
+    e cada servidor tem o seu próprio canal). Falhas transitórias são tentadas de novo com espera
+    crescente; canais sem permissão ou apagados são contados como falha sem nova tentativa.
+    """
+
+    def __init__(self, concurrency=BROADCAST_CONCURRENCY, rate=BROADCAST_RATE_PER_SECOND,
+                 max_attempts=BROADCAST_MAX_ATTEMPTS, retry_delay=BROADCAST_RETRY_DELAY):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.channels = GeneralChannelCache()
+        self._limiter = RateLimiter(rate)
+        self._tasks = set() # Mantém referência aos anúncios em segundo plano
+
+    async def _send(self, semaphore, channel, content, embed, stats):
+        async with semaphore:
+            for attempt in range(1, self.max_attempts + 1):
+                await self._limiter.acquire()
+                try:
+                    await channel.send(content, embed=embed)
+                    stats['sent'] += 1
+                    return
+                except Exception as e:
+                    if isinstance(e, discord.NotFound):
+                        self.channels.invalidate(channel.guild.id)
+                    if not _is_transient(e) or attempt == self.max_attempts:
+                        stats['failed'] += 1
+                        print(f"Não foi possível enviar o anúncio no servidor '{channel.guild.name}': {e}")
+                        return
+                    stats['retries'] += 1
+                    delay = self.retry_delay * 2 ** (attempt - 1)
+                    await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+    async def broadcast(self, channels, content=None, embed=None):
+        """Envia a mensagem para todos os canais. Retorna as estatísticas do envio."""
+        stats = {'targets': len(channels), 'sent': 0, 'failed': 0, 'retries': 0}
+        start = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*(self._send(semaphore, channel, content, embed, stats) for channel in channels))
+        stats['elapsed'] = time.perf_counter() - start
+        return stats
+
+    async def announce(self, guilds, content=None, embed=None, label="anúncio"):
+        """Envia a mensagem para o canal #geral de cada servidor e mostra o resultado no console."""
+        channels = []
+        skipped = 0
+        for guild in guilds:
+            channel = self.channels.get(guild)
+            if channel:
+                channels.append(channel)
+            else:
+                skipped += 1
+        stats = await self.broadcast(channels, content, embed)
+        stats['skipped'] = skipped
+        print(f"Anúncio '{label}': {stats['sent']}/{stats['targets']} enviados, {stats['failed']} falha(s), "
+              f"{stats['retries']} nova(s) tentativa(s), {skipped} servidor(es) sem #{GENERAL_CHANNEL_NAME} "
+              f"em {stats['elapsed']:.1f}s.")
+        return stats
+
+    def announce_in_background(self, guilds, content=None, embed=None, label="anúncio"):
+        """Agenda announce() sem esperar por ele (ex.: dentro de uma tarefa periódica)."""
+        task = asyncio.create_task(self.announce(list(guilds), content, embed, label))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
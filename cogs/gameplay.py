@@ -191,26 +191,34 @@ class Gameplay(commands.Cog):
 
         final_xp_reward = base_xp_reward + bonus_xp
         final_gold_reward = base_gold_reward + bonus_gold
-
-        updates = {
-            'experience': player['experience'] + final_xp_reward,
-            'gold': player['gold'] + final_gold_reward
-        }
+        item_id = quest_info.get('item_reward_id')
+        item_quantity = quest_info.get('item_reward_quantity')
+
+        with database.transaction():
+            # Encerrar a missão primeiro garante que a recompensa seja entregue uma única vez,
+            # mesmo que o comando seja enviado duas vezes seguidas
+            completed = database.complete_quest(user_id, quest_id)
+            if completed:
+                player = database.get_character(user_id)
+                if item_id and item_quantity:
+                    database.add_item_to_inventory(user_id, item_id, item_quantity)
+                database.update_character_stats(user_id, {
+                    'experience': player['experience'] + final_xp_reward,
+                    'gold': player['gold'] + final_gold_reward
+                })
+
+        if not completed:
+            await ctx.send("Você não tem essa missão ativa ou o ID é inválido.")
+            return
 
         reward_message = f"🎉 Missão **'{quest_info['name']}'** completa!\n"
         reward_message += f"Você recebeu **{base_xp_reward}** XP{' (+'+str(bonus_xp)+')' if bonus_xp > 0 else ''} e **{base_gold_reward}** Ouro{' (+'+str(bonus_gold)+')' if bonus_gold > 0 else ''}!"
 
-        if quest_info.get('item_reward_id') and quest_info.get('item_reward_quantity'):
-            item_id = quest_info['item_reward_id']
-            item_quantity = quest_info['item_reward_quantity']
-            database.add_item_to_inventory(user_id, item_id, item_quantity)
+        if item_id and item_quantity:
             reward_item = database.get_item_by_id(item_id)
             if reward_item:
                 reward_message += f"\nE também recebeu **{item_quantity}x {reward_item['name']}**!"
 
-        database.update_character_stats(user_id, updates)
-        database.complete_quest(user_id, quest_id)
-
         await ctx.send(reward_message)
 
 async def setup(bot):
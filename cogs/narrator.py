@@ -1,12 +1,17 @@
 import discord
 from discord.ext import commands
 import database
-from narrator_system import NarrativeSession
+from narrator_system import NarrativeSession, narrator_stats, scheduler, summarizer
 
 class Narrator(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def cog_load(self):
+        # Retoma os resumos que não chegaram a ser gravados antes do último desligamento
+        summarizer.start()
+        await summarizer.enqueue_backlog()
+
     @commands.command(name="narrate", aliases=["adventure", "aventura"], help="Inicia uma aventura narrada por uma IA.")
     async def narrate(self, ctx):
         user_id = ctx.author.id
@@ -41,5 +46,31 @@ class Narrator(commands.Cog):
             if user_id in self.bot.narrative_sessions:
                 del self.bot.narrative_sessions[user_id]
 
+    @commands.command(name="narratorstats", help="Mostra o consumo do Narrador e o estado da fila de chamadas à IA.")
+    @commands.is_owner()
+    async def narrator_stats(self, ctx):
+        turns = narrator_stats['turns']
+        queue = scheduler.stats()
+        embed = discord.Embed(title="📊 Narrador", color=discord.Color.blurple())
+        embed.add_field(name="Turnos", value=(
+            f"{turns} no total ({narrator_stats['structured_turns']} estruturados, {narrator_stats['text_turns']} texto livre, "
+            f"{narrator_stats['fallback_turns']} no modo antigo, {narrator_stats['streamed_turns']} em streaming)\n"
+            f"Latência média: {narrator_stats['latency_total'] / turns if turns else 0:.2f}s | "
+            f"Primeiro texto: {narrator_stats['first_text_total'] / turns if turns else 0:.2f}s\n"
+            f"Chamadas: {narrator_stats['api_calls']} | Tokens: {narrator_stats['prompt_tokens']} + {narrator_stats['completion_tokens']}"
+        ), inline=False)
+        embed.add_field(name="Fila da IA", value=(
+            f"Em andamento: {queue['active']}/{scheduler.max_concurrency} | Na fila: {queue['queued_interactive']} turnos, "
+            f"{queue['queued_background']} resumos | Aguardando nova tentativa: {queue['waiting_retry']}\n"
+            f"Espera média: {queue['wait_avg']:.2f}s (máx. {queue['wait_max']:.2f}s) | Maior fila: {queue['max_queue_depth']}\n"
+            f"Concluídas: {queue['completed']} | Falhas: {queue['failed']} | Novas tentativas: {queue['retries']} | Tempo esgotado: {queue['timeouts']}"
+        ), inline=False)
+        summaries = summarizer.stats()
+        embed.add_field(name="Resumos", value=(
+            f"Gravados: {summaries['summarized']} em {summaries['batches']} lote(s) | Dispensados: {summaries['skipped']} | "
+            f"Na fila: {summaries['queued']} | Aguardando nova tentativa: {summaries['waiting_retry']} | Falhas: {summaries['failed']}"
+        ), inline=False)
+        await ctx.send(embed=embed)
+
 async def setup(bot):
     await bot.add_cog(Narrator(bot))
@@ -1,6 +1,7 @@
 import discord
 from discord.ext import commands
 import database
+from async_database import db
 
 class InventoryView(discord.ui.View):
     def __init__(self, author_id, character_name, items):
@@ -85,7 +86,7 @@ class PlayerActions(commands.Cog):
             return
 
         await ctx.send("🧹 Verificando e organizando seu inventário...")
-        unified_count = database.unify_stackable_items(user_id)
+        unified_count = await db.unify_stackable_items(user_id)
 
         if unified_count > 0:
             await ctx.send(f"✨ Organização concluída! {unified_count} tipo(s) de item foram unificados. Use `!inv` para ver o resultado.")
@@ -116,12 +117,8 @@ class PlayerActions(commands.Cog):
             return
 
         inventory = database.get_inventory(user_id)
-        item_to_use = None
-        for item in inventory:
-            # item: (inv_id, item_id, quantity, name, ...)
-            if item_name.lower() in item[3].lower():
-                item_to_use = item
-                break
+        # item: (inv_id, item_id, quantity, name, ...)
+        item_to_use = next(iter(database.match_inventory_items(inventory, item_name)), None)
 
         if not item_to_use:
             await ctx.send(f"Item '{item_name}' não encontrado no seu inventário.")
@@ -221,7 +218,9 @@ class PlayerActions(commands.Cog):
         inventory = database.get_inventory(user_id)
         
         # 2. Encontrar os itens correspondentes no inventário
-        items_to_enhance = [item for item in inventory if base_name.lower() in item[3].lower() and item[9] == current_enhancement]
+        matches = [item for item in database.match_inventory_items(inventory, base_name) if item[9] == current_enhancement]
+        # Apenas o item mais relevante da busca (as linhas de um mesmo item vêm juntas)
+        items_to_enhance = [item for item in matches if item[1] == matches[0][1]]
         
         if not items_to_enhance:
             display_name = f"{base_name} +{current_enhancement}" if current_enhancement > 0 else base_name
@@ -270,19 +269,20 @@ class PlayerActions(commands.Cog):
             await ctx.send(f"Você não possui a **{gem_name}** necessária para o aprimoramento.")
             return
 
-        # 6. Consumir materiais e criar o novo item, com lógica especial para itens únicos
-        if item_rarity == 'unique':
-            # Para itens únicos, remove o item antigo e a gema, e adiciona o novo item aprimorado.
-            # O item base não é consumido como material, ele é transformado.
-            database.remove_item_from_inventory(user_id, item_id, 1, enhancement_level=current_enhancement)
-            database.remove_item_from_inventory(user_id, gem_item['id'], 1)
-            database.add_item_to_inventory(user_id, item_id, 1, current_enhancement + 1)
-        else:
-            # Para itens normais, consome os itens base e a gema.
-            database.remove_item_from_inventory(user_id, item_id, required_items, enhancement_level=current_enhancement)
-            database.remove_item_from_inventory(user_id, gem_item['id'], 1)
+        # 6. Consumir materiais e criar o novo item, com lógica especial para itens únicos.
+        # Tudo em uma transação: se algum material já não estiver lá, nada é consumido.
+        # Para itens únicos, o item base não é consumido como material, ele é transformado (required_items = 1).
+        with database.transaction():
+            enhanced = database.remove_item_from_inventory(user_id, item_id, required_items, enhancement_level=current_enhancement) \
+                and database.remove_item_from_inventory(user_id, gem_item['id'], 1)
+            if not enhanced:
+                raise database.TransactionRollback()
             database.add_item_to_inventory(user_id, item_id, 1, current_enhancement + 1)
 
+        if not enhanced:
+            await ctx.send("Os materiais necessários não estão mais no seu inventário.")
+            return
+
         new_name = f"{name} +{current_enhancement + 1}"
         await ctx.send(f"✨ **SUCESSO!** ✨\nVocê aprimorou seu equipamento e criou um(a) **{new_name}**!")
 
@@ -299,7 +299,7 @@ class PlayerActions(commands.Cog):
             inv_id_to_equip = int(item_name)
             item_to_equip_data = next((item for item in inventory if item[0] == inv_id_to_equip), None)
         except ValueError:
-            item_to_equip_data = next((item for item in inventory if item_name.lower() in item[3].lower()), None)
+            item_to_equip_data = next(iter(database.match_inventory_items(inventory, item_name)), None)
 
         if not item_to_equip_data:
             await ctx.send(f"Item '{item_name}' não encontrado no seu inventário. Tente usar o ID do item (`!inv`).")
@@ -1,6 +1,7 @@
 import discord
 from discord.ext import commands
 import database
+from async_database import db
 from config import OWNER_ID
 
 class Utility(commands.Cog):
@@ -65,25 +66,36 @@ class Utility(commands.Cog):
         except Exception as e:
             print(f"Não foi possível enviar a notificação para o dono do bot: {e}")
 
-    @commands.command(name="leaderboard", aliases=["ranking", "top"], help="Mostra os rankings do servidor.")
-    async def leaderboard(self, ctx, ranking_type: str = 'level'):
-        if ranking_type.lower() not in ['level', 'pvp']:
+    @commands.command(name="leaderboard", aliases=["ranking", "top"], help="Mostra os rankings. Use `!leaderboard [level|pvp] [global|servidor]`.")
+    async def leaderboard(self, ctx, ranking_type: str = 'level', scope: str = 'global'):
+        ranking_type = ranking_type.lower()
+        if ranking_type not in ['level', 'pvp']:
             await ctx.send("Tipo de ranking inválido. Use `level` ou `pvp`.")
             return
+        if scope.lower() not in ['global', 'servidor', 'server']:
+            await ctx.send("Escopo inválido. Use `global` ou `servidor`.")
+            return
+
+        guild_id = ctx.guild.id if scope.lower() != 'global' and ctx.guild else None
+        data = await db.get_leaderboard(ranking_type, 10, guild_id)
+        my_rank = await db.get_leaderboard_rank(ctx.author.id, ranking_type, guild_id)
+        scope_label = f"em {ctx.guild.name}" if guild_id else "global"
 
-        if ranking_type.lower() == 'level':
-            data = database.get_leaderboard('level')
-            embed = discord.Embed(title="🏆 Placar de Líderes - Nível 🏆", description="Os aventureiros mais experientes.", color=discord.Color.gold())
+        if ranking_type == 'level':
+            embed = discord.Embed(title="🏆 Placar de Líderes - Nível 🏆", description=f"Os aventureiros mais experientes ({scope_label}).", color=discord.Color.gold())
             for i, player in enumerate(data):
                 embed.add_field(name=f"#{i+1} - {player['name']}", value=f"**Nível:** {player['level']} | **XP:** {player['experience']}", inline=False)
         
-        elif ranking_type.lower() == 'pvp':
-            data = database.get_leaderboard('pvp')
-            embed = discord.Embed(title="⚔️ Placar de Líderes - PvP Ranqueado ⚔️", description="Os duelistas mais temidos.", color=discord.Color.red())
+        elif ranking_type == 'pvp':
+            embed = discord.Embed(title="⚔️ Placar de Líderes - PvP Ranqueado ⚔️", description=f"Os duelistas mais temidos ({scope_label}).", color=discord.Color.red())
             for i, player in enumerate(data):
                 score = player.get('score', 0)
                 embed.add_field(name=f"#{i+1} - {player['name']}", value=f"**Score:** {score} | **Vitórias:** {player['pvp_wins']} | **Derrotas:** {player['pvp_losses']}", inline=False)
 
+        if my_rank:
+            position, total = my_rank
+            embed.set_footer(text=f"Sua posição: #{position} de {total}")
+
         await ctx.send(embed=embed)
 
     @commands.command(name="debug", help="Ativa ou desativa o modo de debug para o console.")
@@ -93,5 +105,30 @@ class Utility(commands.Cog):
         status = "ATIVADO" if self.bot.debug_mode else "DESATIVADO"
         await ctx.send(f"🔧 Modo de Debug foi **{status}**.")
 
+    @commands.command(name="dbstats", help="Mostra o tempo gasto pelas consultas assíncronas ao banco.")
+    @commands.is_owner()
+    async def db_stats(self, ctx):
+        lines = db.report()
+        description = "\n".join(lines) if lines else "Nenhuma consulta registrada ainda."
+        embed = discord.Embed(title="🗄️ Estatísticas do Banco", description=description, color=discord.Color.dark_grey())
+        buffer_stats = database.get_stat_buffer_stats()
+        embed.add_field(name="Buffer de Status", value=f"Pendentes: {buffer_stats['pending_characters']} | Gravações: {buffer_stats['flushes']} | Linhas gravadas: {buffer_stats['rows_written']}", inline=False)
+        equipment_stats = database.get_equipment_cache_stats()
+        embed.add_field(name="Cache de Equipamento", value=f"Acertos: {equipment_stats['hits']} | Falhas: {equipment_stats['misses']} | Invalidações: {equipment_stats['invalidations']}", inline=False)
+        embed.set_footer(text=f"Consultas em andamento: {db.pending}")
+        await ctx.send(embed=embed)
+
+    @commands.command(name="reloaddata", help="Recarrega inimigos, itens, habilidades e masmorras do banco de dados.")
+    @commands.is_owner()
+    async def reload_data(self, ctx):
+        version = await db.reload_game_data()
+        await db.invalidate_leaderboards()
+        game_data = database.get_game_data()
+        await ctx.send(
+            f"🔄 Dados do jogo recarregados (versão {version}): "
+            f"{len(game_data.enemies)} inimigos, {len(game_data.items)} itens, "
+            f"{sum(len(s) for s in game_data.skills_by_class.values())} habilidades, {len(game_data.dungeons)} masmorras."
+        )
+
 async def setup(bot):
     await bot.add_cog(Utility(bot))
\ No newline at end of file
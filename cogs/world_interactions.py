@@ -2,6 +2,7 @@ import discord
 from discord.ext import commands
 from datetime import datetime, timedelta
 import database
+from market_system import get_market, MarketError
 
 # As classes de View precisam ser movidas para cá também
 class ShopView(discord.ui.View):
@@ -88,11 +89,12 @@ class MarketView(discord.ui.View):
         self.children[1].disabled = self.current_page >= self.total_pages
 
     async def format_market_embed(self):
-        item_count = database.count_market_listings(self.search_term)
+        market = get_market()
+        item_count = market.count_listings(self.search_term)
         self.total_pages = (item_count - 1) // 10 + 1
         if self.total_pages == 0: self.total_pages = 1
 
-        listings = database.get_market_listings(self.current_page, 10, self.search_term)
+        listings = market.get_listings(self.current_page, 10, self.search_term)
         
         title = "🛒 Mercado de Jogadores 🛒"
         if self.search_term:
@@ -174,9 +176,11 @@ class WorldInteractions(commands.Cog):
         database.update_character_stats(user_id, {'last_work_check_in': datetime.now().isoformat()})
 
         # Atualiza o progresso da missão de trabalho
-        database.update_quest_progress(user_id, 'work', 'hours', hours_to_credit)
+        completed_quests = database.update_quest_progress(user_id, 'work', 'hours', hours_to_credit)
 
         await ctx.send(f"✅ Ponto batido! Você acumulou mais **{hours_to_credit:.2f}** horas de trabalho. Continue usando `!work` a cada 3 horas para não perder o progresso.")
+        for quest in completed_quests:
+            await ctx.send(f"📜 Missão **{quest['name']}** completa! Use `!quest complete {quest['id']}` para receber a recompensa.")
 
     @commands.group(name="job", aliases=["emprego", "profissao"], help="Gerencia sua profissão para ganhar ouro passivamente.", invoke_without_command=True)
     async def job(self, ctx):
@@ -348,17 +352,17 @@ class WorldInteractions(commands.Cog):
             return
 
         total_cost = item_to_buy['value'] * quantity
+        with database.transaction():
+            # Relê o ouro dentro da transação para que duas compras simultâneas não gastem o mesmo saldo
+            character = database.get_character(user_id)
+            if character['gold'] >= total_cost:
+                database.update_character_stats(user_id, {"gold": character['gold'] - total_cost})
+                database.add_item_to_inventory(user_id, item_to_buy['id'], quantity)
+
         if character['gold'] < total_cost:
             await ctx.send(f"Você não tem ouro suficiente! {quantity}x **{item_to_buy['name']}** custa {total_cost} de ouro. Você tem {character['gold']}.")
             return
 
-        database.update_character_stats(user_id, {"gold": character['gold'] - total_cost})
-        database.add_item_to_inventory(user_id, item_to_buy['id'], quantity)
-
-        # Se comprou múltiplos itens empilháveis, roda a limpeza silenciosamente
-        if quantity > 1 and item_to_buy['item_type'] in ['potion', 'material']:
-            database.unify_stackable_items(user_id)
-
         await ctx.send(f"Você comprou {quantity}x **{item_to_buy['name']}** por {total_cost} de ouro!")
 
     @shop.command(name="sell", help="Vende um item do seu inventário.")
@@ -381,7 +385,7 @@ class WorldInteractions(commands.Cog):
             item_name = " ".join(args)
 
         inventory = database.get_inventory(user_id)
-        item_to_sell_data = next((item for item in inventory if item_name.lower() in item[3].lower()), None)
+        item_to_sell_data = next(iter(database.match_inventory_items(inventory, item_name)), None)
         
         if not item_to_sell_data:
             await ctx.send(f"Você não possui o item '{item_name}' para vender.")
@@ -403,8 +407,13 @@ class WorldInteractions(commands.Cog):
 
         total_gain = unit_sell_price * quantity
 
-        if database.remove_item_from_inventory(user_id, item_id, quantity, enhancement_level=enhancement_level):
-            database.update_character_stats(user_id, {"gold": character['gold'] + total_gain})
+        with database.transaction():
+            sold = database.remove_item_from_inventory(user_id, item_id, quantity, enhancement_level=enhancement_level)
+            if sold:
+                character = database.get_character(user_id)
+                database.update_character_stats(user_id, {"gold": character['gold'] + total_gain})
+
+        if sold:
             await ctx.send(f"Você vendeu {quantity}x **{name}** por {total_gain} de ouro!")
         else:
             await ctx.send("Erro ao vender o item.")
@@ -434,7 +443,7 @@ class WorldInteractions(commands.Cog):
             item_name = " ".join(args)
 
         inventory = database.get_inventory(user_id)
-        item_to_sell_data = next((item for item in inventory if item_name.lower() in item[3].lower()), None)
+        item_to_sell_data = next(iter(database.match_inventory_items(inventory, item_name)), None)
 
         if not item_to_sell_data:
             await ctx.send(f"Você não possui o item '{item_name}'.")
@@ -446,67 +455,140 @@ class WorldInteractions(commands.Cog):
             await ctx.send(f"Você tem apenas {inv_quantity}x de {name} para vender.")
             return
 
-        if database.remove_item_from_inventory(user_id, item_id, quantity, enhancement_level):
-            listing_id = database.create_market_listing(user_id, item_id, quantity, price, enhancement_level)
-            display_name = f"{name} +{enhancement_level}" if enhancement_level > 0 else name
-            await ctx.send(f"✅ Você anunciou **{quantity}x {display_name}** no mercado por **{price}** ouro cada. (ID do Anúncio: `{listing_id}`)")
-        else:
-            await ctx.send("Erro ao remover o item do inventário para venda.")
+        try:
+            listing_id, trades = get_market().list_item(user_id, item_id, quantity, price, enhancement_level)
+        except MarketError as e:
+            await ctx.send(str(e))
+            return
+
+        display_name = f"{name} +{enhancement_level}" if enhancement_level > 0 else name
+        messages = []
+        sold = sum(trade['quantity'] for trade in trades)
+        if sold:
+            earned = sum(trade['quantity'] * trade['price'] for trade in trades)
+            messages.append(f"🤝 **{sold}x {display_name}** foram vendidos na hora para ordens de compra, por **{earned}** ouro no total!")
+        if listing_id is not None:
+            messages.append(f"✅ Você anunciou **{quantity - sold}x {display_name}** no mercado por **{price}** ouro cada. (ID do Anúncio: `{listing_id}`)")
+        await ctx.send("\n".join(messages))
 
     @market.command(name="buy", help="Compra um item do mercado. Uso: !market buy <ID do anúncio> [quantidade]")
     async def market_buy(self, ctx, listing_id: int, quantity: int = 1):
         user_id = ctx.author.id
-        buyer = database.get_character(user_id)
-        if not buyer:
+        if not database.get_character(user_id):
             await ctx.send("Você precisa de um personagem para comprar itens.")
             return
 
-        listing = database.get_market_listing_by_id(listing_id)
-        if not listing:
-            await ctx.send("Anúncio não encontrado.")
+        market = get_market()
+        listing = market.get_listing(listing_id)
+        try:
+            trade = market.buy_listing(user_id, listing_id, quantity)
+        except MarketError as e:
+            await ctx.send(str(e))
             return
 
-        if listing['seller_id'] == user_id:
-            await ctx.send("Você não pode comprar seus próprios itens.")
+        item_info = database.get_item_by_id(listing['item_id'])
+        await ctx.send(f"🛍️ Você comprou **{quantity}x {item_info['name']}** por **{trade['quantity'] * trade['price']}** ouro!")
+
+    @market.command(name="remove", help="Remove um de seus anúncios do mercado. Uso: !market remove <ID do anúncio>")
+    async def market_remove(self, ctx, listing_id: int):
+        try:
+            listing = get_market().cancel_listing(ctx.author.id, listing_id)
+        except MarketError as e:
+            await ctx.send(str(e))
             return
 
-        if quantity > listing['quantity']:
-            await ctx.send(f"Este anúncio tem apenas {listing['quantity']} unidade(s) disponível(is).")
+        item_info = database.get_item_by_id(listing['item_id'])
+        await ctx.send(f"Anúncio de **{listing['quantity']}x {item_info['name']}** removido. O item voltou para seu inventário.")
+
+    @market.command(name="order", aliases=["ordem"], help="Cria uma ordem de compra. Uso: !market order <preço máximo> [quantidade] <nome do item>[ +nível]")
+    async def market_order(self, ctx, price: int, *args):
+        user_id = ctx.author.id
+        if not database.get_character(user_id):
+            await ctx.send("Você precisa de um personagem para comprar itens.")
             return
 
-        total_cost = listing['price'] * quantity
-        if buyer['gold'] < total_cost:
-            await ctx.send(f"Você não tem ouro suficiente. Custo total: {total_cost} ouro.")
+        if not args:
+            await ctx.send("Uso: `!market order <preço máximo> [quantidade] <nome do item>[ +nível]`")
             return
 
-        seller = database.get_character(listing['seller_id'])
-        database.update_character_stats(listing['seller_id'], {'gold': seller['gold'] + total_cost})
-        database.update_character_stats(user_id, {'gold': buyer['gold'] - total_cost})
-        database.add_item_to_inventory(user_id, listing['item_id'], quantity, listing['enhancement_level'])
-        
-        if quantity == listing['quantity']:
-            database.remove_market_listing(listing_id)
-        else:
-            database.remove_market_listing(listing_id)
-            database.create_market_listing(listing['seller_id'], listing['item_id'], listing['quantity'] - quantity, listing['price'], listing['enhancement_level'])
+        quantity = 1
+        if args[0].isdigit():
+            quantity = int(args[0])
+            args = args[1:]
+        parts = " ".join(args).split('+')
+        try:
+            enhancement_level = int(parts[1]) if len(parts) > 1 else 0
+        except ValueError:
+            await ctx.send("Formato inválido. Use `<nome do item> +<nível>` para itens aprimorados.")
+            return
 
-        item_info = database.get_item_by_id(listing['item_id'])
-        await ctx.send(f"🛍️ Você comprou **{quantity}x {item_info['name']}** por **{total_cost}** ouro!")
+        item = database.get_item_by_name(parts[0].strip())
+        if not item:
+            await ctx.send(f"O item '{parts[0].strip()}' não existe.")
+            return
 
-    @market.command(name="remove", help="Remove um de seus anúncios do mercado. Uso: !market remove <ID do anúncio>")
-    async def market_remove(self, ctx, listing_id: int):
-        user_id = ctx.author.id
-        listing = database.get_market_listing_by_id(listing_id)
+        try:
+            order_id, trades = get_market().place_buy_order(user_id, item['id'], quantity, price, enhancement_level)
+        except MarketError as e:
+            await ctx.send(str(e))
+            return
 
-        if not listing or listing['seller_id'] != user_id:
-            await ctx.send("Anúncio não encontrado ou você não é o vendedor.")
+        display_name = f"{item['name']} +{enhancement_level}" if enhancement_level > 0 else item['name']
+        messages = []
+        bought = sum(trade['quantity'] for trade in trades)
+        if bought:
+            spent = sum(trade['quantity'] * trade['price'] for trade in trades)
+            messages.append(f"🛍️ Você comprou **{bought}x {display_name}** na hora por **{spent}** ouro no total!")
+        if order_id is not None:
+            messages.append(f"📋 Ordem de compra de **{quantity - bought}x {display_name}** a até **{price}** ouro cada criada (ID da Ordem: `{order_id}`). O ouro fica reservado até a ordem ser atendida ou cancelada.")
+        await ctx.send("\n".join(messages))
+
+    @market.command(name="orders", aliases=["ordens"], help="Lista suas ordens de compra abertas.")
+    async def market_orders(self, ctx):
+        orders = get_market().get_player_orders(ctx.author.id)
+        if not orders:
+            await ctx.send("Você não tem ordens de compra abertas.")
             return
 
-        database.add_item_to_inventory(user_id, listing['item_id'], listing['quantity'], listing['enhancement_level'])
-        database.remove_market_listing(listing_id)
+        lines = []
+        for order in orders:
+            item_info = database.get_item_by_id(order['item_id'])
+            name = item_info['name'] if item_info else "???"
+            display_name = f"{name} +{order['enhancement_level']}" if order['enhancement_level'] > 0 else name
+            lines.append(f"**ID:** `{order['id']}` | {order['quantity']}x {display_name} a até **{order['price']}** ouro/un.")
+        embed = discord.Embed(title="📋 Suas Ordens de Compra", description="\n".join(lines), color=discord.Color.dark_teal())
+        embed.set_footer(text="Use `!market cancel <ID>` para cancelar uma ordem.")
+        await ctx.send(embed=embed)
 
-        item_info = database.get_item_by_id(listing['item_id'])
-        await ctx.send(f"Anúncio de **{listing['quantity']}x {item_info['name']}** removido. O item voltou para seu inventário.")
+    @market.command(name="cancel", aliases=["cancelar"], help="Cancela uma ordem de compra. Uso: !market cancel <ID da ordem>")
+    async def market_cancel(self, ctx, order_id: int):
+        try:
+            order = get_market().cancel_buy_order(ctx.author.id, order_id)
+        except MarketError as e:
+            await ctx.send(str(e))
+            return
+        await ctx.send(f"Ordem de compra `{order_id}` cancelada. **{order['quantity'] * order['price']}** de ouro voltaram para você.")
+
+    @market.command(name="price", aliases=["preco", "preço"], help="Mostra o melhor preço de venda e de compra de um item. Uso: !market price <nome do item>[ +nível]")
+    async def market_price(self, ctx, *, item_name: str):
+        parts = item_name.split('+')
+        try:
+            enhancement_level = int(parts[1]) if len(parts) > 1 else 0
+        except ValueError:
+            await ctx.send("Formato inválido. Use `<nome do item> +<nível>` para itens aprimorados.")
+            return
+        item = database.get_item_by_name(parts[0].strip())
+        if not item:
+            await ctx.send(f"O item '{parts[0].strip()}' não existe.")
+            return
+
+        market = get_market()
+        ask = market.best_ask(item['id'], enhancement_level)
+        bid = market.best_bid(item['id'], enhancement_level)
+        display_name = f"{item['name']} +{enhancement_level}" if enhancement_level > 0 else item['name']
+        ask_text = f"**{ask['price']}** ouro ({ask['quantity']} un., anúncio `{ask['id']}`)" if ask else "nenhum anúncio"
+        bid_text = f"**{bid['price']}** ouro ({bid['quantity']} un.)" if bid else "nenhuma ordem"
+        await ctx.send(f"📈 **{display_name}**\nMenor preço à venda: {ask_text}\nMaior oferta de compra: {bid_text}")
 
     @market.command(name="search", help="Pesquisa por um item no mercado. Uso: !market search <nome do item>")
     async def market_search(self, ctx, *, item_name: str):
@@ -0,0 +1,149 @@
+import random
+
+from game_constants import CLASS_DETAILS
+
+# --- Fórmulas de Combate ---
+# Compartilhadas entre as batalhas do Discord e as simulações de balanceamento,
+# para que os dois lados nunca calculem dano de formas diferentes.
+ATTACK_VARIANCE_MIN = 0.8
+ATTACK_VARIANCE_MAX = 1.2
+
+
+def attack_attribute(player):
+    """Atributo usado no ataque básico: o atributo chave das classes físicas, Força para as mágicas."""
+    class_info = CLASS_DETAILS.get(player['class'], {})
+    if class_info.get('type') == 'physical':
+        return class_info.get('key_attribute', 'strength')
+    return 'strength'
+
+def player_attack_power(player, bonuses):
+    """Ataque total do jogador antes da variação aleatória."""
+    return player[attack_attribute(player)] + bonuses['attack']
+
+def player_defense_power(player, bonuses, defense_buff=0, defending=False):
+    """Defesa total do jogador contra ataques de inimigos."""
+    defense = bonuses['defense'] + (player['dexterity'] // 4) + defense_buff
+    if defending:
+        defense += player['dexterity'] // 2
+    return defense
+
+def roll_damage(attack, defense, rng=random):
+    """Dano de um ataque: o ataque varia entre 80% e 120% e a defesa é subtraída."""
+    return max(0, round(attack * rng.uniform(ATTACK_VARIANCE_MIN, ATTACK_VARIANCE_MAX)) - defense)
+
+def lifesteal_amount(damage, lifesteal_percent):
+    """Vida drenada por um ataque que causou `damage`."""
+    if not lifesteal_percent or damage <= 0:
+        return 0
+    return round(damage * (lifesteal_percent / 100))
+
+
+# --- Resolução do Ataque Automático ---
+EMBED_DESCRIPTION_LIMIT = 4096 # Limite do Discord para a descrição de um embed
+AUTOHUNT_MAX_TURNS = 5000 # Evita lutas infinitas quando nenhum dos lados consegue causar dano
+AUTOHUNT_LOG_HEAD_TURNS = 8 # Turnos iniciais mantidos no log
+AUTOHUNT_LOG_TAIL_TURNS = 8 # Turnos finais mantidos no log
+
+
+class AutohuntResult:
+    """Resultado de uma luta automática, com os turnos do início e do fim para o log."""
+
+    def __init__(self, winner, turns, player_hp, enemy_hp, damage_dealt, damage_taken, life_drained, head, tail):
+        self.winner = winner # 'player', 'enemy' ou 'fled' (empate por limite de turnos)
+        self.turns = turns
+        self.player_hp = player_hp
+        self.enemy_hp = enemy_hp
+        self.damage_dealt = damage_dealt
+        self.damage_taken = damage_taken
+        self.life_drained = life_drained
+        self.head = head # [(turno, dano causado, vida drenada ou None, hp após drenar, dano recebido ou None)]
+        self.tail = tail
+
+    def summary(self):
+        return f"Turnos: {self.turns} | Dano causado: {self.damage_dealt} | Dano recebido: {self.damage_taken}" + \
+               (f" | Vida drenada: {self.life_drained}" if self.life_drained else "")
+
+    def format_log(self, enemy_name, max_length=EMBED_DESCRIPTION_LIMIT):
+        """Monta o log da luta no formato do !autohunt, omitindo os turnos do meio se necessário."""
+        def turn_lines(entry):
+            turn, dealt, drained, hp, taken = entry
+            lines = [f"Turno {turn}: ⚔️ Você ataca o {enemy_name} e causa **{dealt}** de dano!"]
+            if drained is not None:
+                lines.append(f"Turno {turn}: 🩸 Você drena **{drained}** de vida do inimigo! (HP: {hp})")
+            if taken is not None:
+                lines.append(f"Turno {turn}: 💥 O {enemy_name} ataca e causa **{taken}** de dano em você!")
+            return lines
+
+        head_lines = [line for entry in self.head for line in turn_lines(entry)]
+        tail_lines = [line for entry in self.tail for line in turn_lines(entry)]
+        skipped = self.turns - len(self.head) - len(self.tail)
+        middle = [f"*... {skipped} turnos omitidos ...*"] if skipped > 0 else []
+        if self.winner == 'fled':
+            tail_lines.append(f"⏳ Após {self.turns} turnos sem vencedor, você recua da batalha.")
+
+        lines = head_lines + middle + tail_lines
+        log = "\n".join(lines)
+        # Se ainda passar do limite (nomes muito longos), corta o início e mantém o desfecho visível
+        while len(log) > max_length and len(head_lines) > 1:
+            head_lines.pop()
+            log = "\n".join(head_lines + ["*...*"] + tail_lines)
+        return log[:max_length]
+
+
+def resolve_autohunt(player, bonuses, enemy, player_hp, enemy_hp, max_turns=AUTOHUNT_MAX_TURNS, rng=random):
+    """
+    Resolve uma luta automática inteira de forma síncrona: o jogador ataca e, se o inimigo
+    sobreviver, o inimigo revida. Ataque, defesa e roubo de vida são calculados uma única vez.
+    """
+    attack = player_attack_power(player, bonuses)
+    defense = player_defense_power(player, bonuses)
+    enemy_attack = enemy['attack']
+    enemy_defense = enemy['defense']
+    max_hp = player['max_hp']
+    lifesteal = bonuses.get("special", {}).get("LIFESTEAL_PERCENT") or 0
+    spread = ATTACK_VARIANCE_MAX - ATTACK_VARIANCE_MIN
+    rand = rng.random
+
+    head = []
+    tail = []
+    damage_dealt = damage_taken = life_drained = 0
+    turn = 0
+    winner = 'fled'
+
+    while turn < max_turns:
+        turn += 1
+        # Mesmo cálculo de roll_damage, sem a chamada de função a cada turno
+        dealt = round(attack * (ATTACK_VARIANCE_MIN + spread * rand())) - enemy_defense
+        dealt = dealt if dealt > 0 else 0
+        enemy_hp -= dealt
+        damage_dealt += dealt
+        drained = None
+        if lifesteal and dealt > 0:
+            drained = round(dealt * (lifesteal / 100))
+            player_hp = min(max_hp, player_hp + drained)
+            life_drained += drained
+        hp_after_drain = player_hp
+
+        taken = None
+        if enemy_hp > 0:
+            taken = round(enemy_attack * (ATTACK_VARIANCE_MIN + spread * rand())) - defense
+            taken = taken if taken > 0 else 0
+            player_hp -= taken
+            damage_taken += taken
+
+        entry = (turn, dealt, drained, hp_after_drain, taken)
+        if turn <= AUTOHUNT_LOG_HEAD_TURNS:
+            head.append(entry)
+        else:
+            tail.append(entry)
+            if len(tail) > AUTOHUNT_LOG_TAIL_TURNS:
+                del tail[0]
+
+        if enemy_hp <= 0:
+            winner = 'player'
+            break
+        if player_hp <= 0:
+            winner = 'enemy'
+            break
+
+    return AutohuntResult(winner, turn, player_hp, enemy_hp, damage_dealt, damage_taken, life_drained, head, tail)
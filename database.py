@@ -1,9 +1,151 @@
 import sqlite3
+import copy
+import difflib
+import hashlib
 import json
+import queue
+import re
+import unicodedata
+import threading
+import time
 from contextlib import contextmanager
 
+from sampling import LevelIndex, PrefixIndex, RankedIndex
+
 DATABASE_NAME = "rpg_data.db"
 
+# --- Pool de Conexões ---
+# Valores padrão do pool. Use configure_pool() para alterá-los antes (ou durante) a execução do bot.
+POOL_SIZE = 5 # Número máximo de conexões abertas simultaneamente
+POOL_TIMEOUT = 10.0 # Segundos aguardando uma conexão livre antes de desistir
+HEALTH_CHECK_INTERVAL = 60.0 # Conexões ociosas por mais tempo que isso são testadas antes de serem reutilizadas
+CONNECTION_PRAGMAS = {
+    "journal_mode": "WAL", # Leitores não bloqueiam o escritor (e vice-versa)
+    "synchronous": "NORMAL", # Em WAL, só faz fsync no checkpoint, não a cada commit
+    "cache_size": -16000, # ~16 MB de cache de páginas por conexão (valor negativo = KiB)
+    "mmap_size": 134217728, # 128 MB de leitura via memória mapeada
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000, # Aguarda até 5s por um lock em vez de falhar imediatamente
+}
+
+class ConnectionPool:
+    """Mantém conexões SQLite abertas e as reutiliza entre chamadas, evitando o custo de abrir/fechar a cada operação."""
+
+    def __init__(self, database, size=POOL_SIZE, timeout=POOL_TIMEOUT, pragmas=None, health_check_interval=HEALTH_CHECK_INTERVAL):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = dict(CONNECTION_PRAGMAS if pragmas is None else pragmas)
+        self.health_check_interval = health_check_interval
+        self._idle = queue.LifoQueue() # LIFO: reutiliza a conexão mais "quente" primeiro
+        self._lock = threading.Lock()
+        self._open_connections = 0
+        self.stats = {"created": 0, "reused": 0, "waited": 0, "health_checks": 0, "discarded": 0}
+
+    def _new_connection(self):
+        conn = sqlite3.connect(self.database, timeout=self.timeout, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        self.stats["created"] += 1
+        return conn
+
+    def _is_healthy(self, conn):
+        self.stats["health_checks"] += 1
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        self.stats["discarded"] += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._open_connections -= 1
+
+    def acquire(self):
+        """Retorna uma conexão do pool, criando uma nova se houver espaço ou aguardando uma ser liberada."""
+        try:
+            conn, last_used = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._open_connections < self.size
+                if can_create:
+                    self._open_connections += 1
+            if can_create:
+                try:
+                    return self._new_connection()
+                except sqlite3.Error:
+                    with self._lock:
+                        self._open_connections -= 1
+                    raise
+            self.stats["waited"] += 1
+            try:
+                conn, last_used = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise sqlite3.OperationalError(f"Pool de conexões esgotado: nenhuma conexão livre após {self.timeout}s.")
+
+        if time.monotonic() - last_used > self.health_check_interval and not self._is_healthy(conn):
+            self._discard(conn)
+            with self._lock:
+                self._open_connections += 1
+            return self._new_connection()
+
+        self.stats["reused"] += 1
+        return conn
+
+    def release(self, conn):
+        """Devolve uma conexão ao pool, desfazendo qualquer transação que tenha ficado aberta."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        self._idle.put((conn, time.monotonic()))
+
+    def close(self):
+        """Fecha todas as conexões ociosas do pool."""
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_settings = {}
+_local = threading.local() # Guarda a conexão em uso pela thread atual (permite chamadas aninhadas)
+
+def configure_pool(**settings):
+    """Altera a configuração do pool (size, timeout, pragmas, health_check_interval). O pool atual é fechado e recriado no próximo uso."""
+    global _pool_settings
+    with _pool_lock:
+        _pool_settings = settings
+    close_pool()
+
+def get_pool():
+    """Retorna o pool de conexões do banco atual, criando-o se necessário."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.database != DATABASE_NAME:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DATABASE_NAME, **_pool_settings)
+        return _pool
+
+def close_pool():
+    """Fecha todas as conexões abertas. Deve ser chamado ao desligar o bot."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
 def connect_db():
     """Conecta ao banco de dados e retorna o objeto de conexão."""
     return sqlite3.connect(DATABASE_NAME)
@@ -11,293 +153,634 @@ def connect_db():
 @contextmanager
 def db_cursor():
     """Um gerenciador de contexto para simplificar as operações de banco de dados."""
-    conn = connect_db()
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        # Chamada aninhada: reutiliza a conexão da chamada externa, que fará o commit
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+        return
+
+    pool = get_pool()
+    conn = pool.acquire()
+    _local.conn = conn
     cursor = conn.cursor()
     try:
         yield cursor
     finally:
+        _local.conn = None
+        try:
+            conn.commit()
+        finally:
+            pool.release(conn)
+
+class TransactionRollback(Exception):
+    """Levantada dentro de transaction() para desfazer tudo sem propagar um erro."""
+
+@contextmanager
+def transaction():
+    """
+    Unidade de trabalho: todas as chamadas de database.py feitas dentro do bloco usam a mesma
+    conexão e são gravadas em um único commit, ou desfeitas juntas se ocorrer uma exceção.
+
+    A transação começa com BEGIN IMMEDIATE, reservando a escrita desde o início: as leituras
+    feitas no bloco não podem ser invalidadas por outra escrita antes do commit. Por isso o bloco
+    deve ser curto e nunca conter `await` (as corrotinas do bot compartilham a mesma thread).
+
+        with database.transaction():
+            buyer = database.get_character(user_id)
+            if buyer['gold'] < cost:
+                raise database.TransactionRollback()
+            ...
+    """
+    if getattr(_local, "conn", None) is not None:
+        # Já existe uma transação (ou db_cursor) externa: participa dela
+        yield
+        return
+
+    # Mesma ordem de travas de flush_character_stats (buffer antes do SQLite): update_character_stats
+    # dentro do bloco pega a trava do buffer, e na ordem inversa as duas threads se esperariam até o busy_timeout
+    _stat_buffer.write_lock.acquire()
+    pool = get_pool()
+    conn = pool.acquire()
+    _local.conn = conn
+    _local.after_commit = []
+    _local.after_rollback = []
+    committed = False
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        yield
         conn.commit()
-        conn.close()
-
-def populate_initial_data(cursor):
-    """Verifica e cria inimigos e itens básicos se eles não existirem no banco de dados."""
-    # Inimigos
-    # name, min_level, max_level, hp, attack, defense, xp_reward, gold_reward, image_url
-    enemies_to_add = [
-        ('Goblin', 1, 3, 30, 8, 5, 10, 10, 'https://i.imgur.com/wI411wg.png'),
-        ('Lobo', 1, 4, 45, 10, 6, 15, 10, 'https://i.imgur.com/TqBqS2Q.png'),
-        ('Orc Batedor', 3, 5, 60, 12, 8, 25, 15, 'https://i.imgur.com/s4GAS25.png'),
-        ('Esqueleto', 2, 6, 50, 11, 7, 20, 12, 'https://i.imgur.com/a2J3i2a.png'),
-        # --- Novos Inimigos (Nível 4-100) ---
-        # Nível 4-10
-        ('Hobgoblin', 4, 7, 70, 15, 10, 35, 20, 'https://i.imgur.com/U4a322b.png'),
-        ('Aranha Gigante', 5, 8, 80, 16, 11, 40, 22, 'https://i.imgur.com/v2h4367.png'),
-        ('Bandido', 6, 9, 95, 18, 12, 50, 28, 'https://i.imgur.com/u0L3d2D.png'),
-        ('Gnoll', 7, 10, 110, 20, 14, 60, 35, 'https://i.imgur.com/aO4YJbJ.png'),
-        ('Ogro Jovem', 8, 11, 150, 25, 15, 80, 45, 'https://i.imgur.com/v8GS8y8.png'),
-        # Nível 11-20
-        ('Troll', 11, 15, 220, 30, 18, 120, 60, 'https://i.imgur.com/O40a3ja.png'),
-        ('Harpia', 13, 17, 180, 35, 16, 140, 70, 'https://i.imgur.com/N3b5xpn.png'),
-        ('Minotauro', 15, 20, 300, 40, 22, 180, 90, 'https://i.imgur.com/C1fb33g.png'),
-        ('Manticora', 17, 22, 280, 45, 20, 220, 110, 'https://i.imgur.com/eWj3vE4.png'),
-        ('Basilisco', 19, 24, 350, 50, 28, 270, 130, 'https://i.imgur.com/z1IARq6.png'),
-        # Nível 21-30
-        ('Elemental Menor', 21, 26, 320, 55, 30, 300, 150, 'https://i.imgur.com/0V8A12E.png'),
-        ('Guerreiro Morto-Vivo', 23, 28, 400, 60, 35, 350, 170, 'https://i.imgur.com/y5J8IZh.png'),
-        ('Wyvern', 25, 30, 450, 68, 32, 420, 200, 'https://i.imgur.com/Q4lCg11.png'),
-        ('Ciclope', 27, 33, 550, 75, 40, 500, 240, 'https://i.imgur.com/M8G9zEE.png'),
-        ('Golem de Pedra', 29, 35, 600, 65, 55, 550, 260, 'https://i.imgur.com/pDRa2s0.png'),
-        # Nível 31-40
-        ('Gigante do Gelo', 31, 37, 700, 85, 45, 650, 300, 'https://i.imgur.com/j1v2OVo.png'),
-        ('Quimera', 34, 40, 800, 95, 50, 780, 350, 'https://i.imgur.com/Y533t0Q.png'),
-        ('Beholder Jovem', 36, 42, 750, 105, 55, 900, 400, 'https://i.imgur.com/JdY26iU.png'),
-        ('Sacerdote das Sombras', 38, 45, 650, 120, 48, 1000, 450, 'https://i.imgur.com/Bw27pYy.png'),
-        ('Dragão Verde Jovem', 40, 48, 1200, 130, 65, 1500, 600, 'https://i.imgur.com/sZ5rD6I.png'),
-        # Nível 41-50
-        ('Elemental Maior', 41, 47, 900, 140, 70, 1300, 550, 'https://i.imgur.com/9dYf0yV.png'),
-        ('Hidra', 44, 50, 1500, 150, 75, 1800, 700, 'https://i.imgur.com/TqfMh0N.png'),
-        ('Cavaleiro da Morte', 46, 53, 1300, 165, 85, 2200, 850, 'https://i.imgur.com/e5f2s9f.png'),
-        ('Gigante de Fogo', 48, 55, 1800, 180, 80, 2500, 950, 'https://i.imgur.com/I1N50yC.png'),
-        ('Lich Aprendiz', 50, 58, 1500, 200, 90, 3000, 1200, 'https://i.imgur.com/Z02p9vO.png'),
-        # Nível 51-60
-        ('Dragão Azul Adulto', 52, 60, 2500, 220, 110, 3500, 1500, 'https://i.imgur.com/i3vE5yb.png'),
-        ('Kraken Menor', 55, 63, 3000, 210, 130, 4000, 1800, 'https://i.imgur.com/rV2i27a.png'),
-        ('Vampiro Lorde', 58, 66, 2200, 250, 120, 4800, 2200, 'https://i.imgur.com/8vD6x8B.png'),
-        ('Golem de Adamantina', 60, 68, 4000, 230, 180, 5500, 2500, 'https://i.imgur.com/S2A21sA.png'),
-        # Nível 61-70
-        ('Dragão Vermelho Adulto', 62, 70, 4500, 280, 150, 6500, 3000, 'https://i.imgur.com/x1Y13A0.png'),
-        ('Anjo Caído', 65, 73, 3800, 310, 140, 7500, 3500, 'https://i.imgur.com/C9a1s3v.png'),
-        ('Arquimago Corrompido', 68, 76, 3500, 350, 130, 8800, 4000, 'https://i.imgur.com/m0xS3Y1.png'),
-        # Nível 71-80
-        ('Beholder Ancião', 72, 80, 5000, 400, 180, 10000, 5000, 'https://i.imgur.com/2h255sC.png'),
-        ('Lich', 75, 83, 4800, 450, 170, 12000, 6000, 'https://i.imgur.com/yV1s9a4.png'),
-        ('Dragão Negro Ancião', 78, 86, 7000, 480, 220, 15000, 7500, 'https://i.imgur.com/A03bJ75.png'),
-        # Nível 81-90
-        ('Avatar da Morte', 82, 90, 8000, 550, 250, 20000, 10000, 'https://i.imgur.com/D4s2G3z.png'),
-        ('Titã', 85, 93, 12000, 600, 300, 25000, 12000, 'https://i.imgur.com/O0f4s4P.png'),
-        ('Dragão de Mithril', 88, 96, 10000, 650, 350, 30000, 15000, 'https://i.imgur.com/c6o5x1A.png'),
-        # Nível 91-100
-        ('Lorde Demônio', 92, 98, 15000, 750, 400, 40000, 20000, 'https://i.imgur.com/I0b5c1M.png'),
-        ('Arcanjo Vingativo', 95, 100, 13000, 850, 380, 50000, 25000, 'https://i.imgur.com/Z7g1p1J.png'),
-        ('Tarrasque', 100, 100, 25000, 900, 500, 75000, 35000, 'https://i.imgur.com/sC3a3fT.png'),
-        ('Deus Antigo Adormecido', 100, 100, 20000, 1200, 450, 100000, 50000, 'https://i.imgur.com/Gv1s5sW.png'),
-    ]
-    # Chefes de Masmorra
-    # name, hp, attack, defense, xp_reward, gold_reward, image_url
-    boss_enemies_to_add = [
-        ('Rei Goblin', 1500, 50, 30, 1000, 500, 'https://i.imgur.com/M8G9zEE.png'),
-        ('Senhor da Cripta', 4000, 120, 60, 3500, 1500, 'https://i.imgur.com/y5J8IZh.png'),
-    ]
-    for enemy_data in enemies_to_add:
-        cursor.execute("SELECT COUNT(*) FROM enemies WHERE name = ?", (enemy_data[0],))
-        if cursor.fetchone()[0] == 0:
-            print(f"Creating missing enemy: {enemy_data[0]}")
-            cursor.execute(
-                "INSERT INTO enemies (name, min_level, max_level, hp, attack, defense, xp_reward, gold_reward, image_url) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                enemy_data
-            )
-    for boss_data in boss_enemies_to_add:
-        cursor.execute("SELECT COUNT(*) FROM boss_enemies WHERE name = ?", (boss_data[0],))
-        if cursor.fetchone()[0] == 0:
-            print(f"Creating missing boss enemy: {boss_data[0]}")
-            cursor.execute(
-                "INSERT INTO boss_enemies (name, hp, attack, defense, xp_reward, gold_reward, image_url) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                boss_data
-            )
+        committed = True
+    except TransactionRollback:
+        conn.rollback()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        callbacks = _local.after_commit if committed else _local.after_rollback
+        _local.conn = None
+        _local.after_commit = None
+        _local.after_rollback = None
+        pool.release(conn)
+        _stat_buffer.write_lock.release()
+        for callback, args in callbacks:
+            callback(*args)
+
+def in_transaction():
+    """Indica se a thread atual está dentro de um bloco transaction()."""
+    return getattr(_local, "after_commit", None) is not None
+
+def _after_commit(callback, *args):
+    """Executa `callback` agora ou, dentro de transaction(), somente depois do commit."""
+    if in_transaction():
+        _local.after_commit.append((callback, args))
+    else:
+        callback(*args)
+
+def _after_rollback(callback, *args):
+    """Dentro de transaction(), executa `callback` se a transação for desfeita. Fora dela, não faz nada."""
+    if in_transaction():
+        _local.after_rollback.append((callback, args))
+
+# --- Cache de Dados Estáticos ---
+
+class GameDataCache:
+    """
+    Mantém em memória os dados que só mudam quando um administrador edita o banco
+    ou o Narrador cria um item: inimigos, loot, habilidades, profissões, masmorras e chefes.
+    Cada recarga incrementa `version`, permitindo detectar leituras feitas sobre dados antigos.
+    """
 
-    # Itens de Loot
-    loot_to_add = [
-        # name, description, item_type, rarity, min_level_drop, effect_type, effect_value, value, equip_slot, attack_bonus, defense_bonus, effect_duration, boss_drop_id
-        ('Poção de Cura Pequena', 'Restaura 25 HP.', 'potion', 'common', 1, 'HEAL_HP', 25, 10, None, 0, 0, None, None),
-        ('Poção de Cura Média', 'Restaura 75 HP.', 'potion', 'uncommon', 5, 'HEAL_HP', 75, 50, None, 0, 0, None, None),
-        ('Poção de Mana Pequena', 'Restaura 20 MP.', 'potion', 'common', 2, 'HEAL_MP', 20, 15, None, 0, 0, None, None),
-        ('Fruto Dourado', 'Aumenta permanentemente o HP máximo em 5.', 'potion', 'rare', 8, 'INCREASE_MAX_HP', 5, 500, None, 0, 0, None, None),
-        ('Tomo do Conhecimento', 'Concede 50 de experiência.', 'potion', 'uncommon', 4, 'GAIN_XP', 50, 100, None, 0, 0, None, None),
-        ('Elixir da Rapidez', 'Aumenta permanentemente a Destreza em 1.', 'potion', 'epic', 10, 'INCREASE_DEXTERITY', 1, 1000, None, 0, 0, None, None),
-
-        ('Adaga Enferrujada', 'Uma adaga simples.', 'weapon', 'common', 1, None, None, 5, 'right_hand', 2, 0, None, None),
-        ('Adaga Envenenada', 'Uma adaga com uma lâmina coberta de veneno que tem 25% de chance de envenenar o alvo em ataques.', 'weapon', 'rare', 6, 'POISON_ON_HIT', 25, 220, 'right_hand', 7, 0, 3, None),
-        ('Machado de Guerra Orc', 'Bruto e pesado, favorece a força sobre a defesa.', 'weapon', 'uncommon', 4, None, None, 40, 'right_hand', 8, -2, None, None),
-        ('Arco Élfico', 'Leve e preciso.', 'weapon', 'uncommon', 3, None, None, 55, 'right_hand', 6, 0, None, None),
-        ('Cajado do Aprendiz', 'Focado em canalizar poder mágico.', 'weapon', 'common', 1, 'SCALE_WITH_INTELLIGENCE', None, 20, 'right_hand', 3, 1, None, None),
-        ('Martelo de Guerra Anão', 'Uma arma robusta que também oferece boa proteção.', 'weapon', 'rare', 6, None, None, 150, 'right_hand', 10, 2, None, None),
-
-        ('Pele de Lobo', 'Pode ser útil para artesanato.', 'material', 'common', 1, None, None, 3, None, 0, 0, None, None),
-        ('Espada Curta de Ferro', 'Uma espada confiável.', 'weapon', 'uncommon', 3, None, None, 20, 'right_hand', 5, 0, None, None),
-
-        ('Peitoral de Couro', 'Oferece proteção básica.', 'armor', 'common', 2, None, None, 25, 'chest', 0, 3, None, None),
-        ('Elmo de Ferro', 'Proteção sólida para a cabeça.', 'armor', 'common', 3, None, None, 30, 'helmet', 0, 2, None, None),
-        ('Calças de Malha', 'Flexíveis e resistentes.', 'armor', 'uncommon', 4, None, None, 45, 'legs', 0, 4, None, None),
-        ('Peitoral de Aço', 'Excelente proteção, mas pesado.', 'armor', 'rare', 7, None, None, 200, 'chest', -1, 10, None, None),
-        ('Botas de Couro Leve', 'Aumentam a agilidade do usuário.', 'armor', 'common', 2, None, None, 20, 'legs', 0, 1, None, None),
-
-        ('Anel do Vampiro', 'Cura o usuário em 25% do dano causado por ataques.', 'armor', 'rare', 5, 'LIFESTEAL_PERCENT', 25, 250, 'ring', 0, 0, None, None),
-        ('Anel da Avareza', 'Aumenta o ouro ganho em batalhas em 15%.', 'armor', 'uncommon', 3, 'GOLD_BONUS_PERCENT', 15, 150, 'ring', 0, 0, None, None),
-        ('Anel do Sábio', 'Aumenta a experiência ganha em 10%.', 'armor', 'uncommon', 3, 'XP_BONUS_PERCENT', 10, 150, 'ring', 0, 0, None, None),
-        ('Anel da Precisão', 'Aumenta a chance de causar dano crítico.', 'armor', 'rare', 6, 'CRIT_CHANCE_PERCENT', 10, 300, 'ring', 0, 0, None, None),
-        ('Anel da Regeneração', 'Regenera uma pequena quantidade de MP a cada turno.', 'armor', 'epic', 10, 'MP_REGEN_FLAT', 2, 500, 'ring', 0, 0, None, None),
-
-        ('Gema de Arma', 'Uma gema necessária para aprimorar armas.', 'material', 'rare', 10, None, None, 1000, None, 0, 0, None, None),
-        ('Gema de Armadura', 'Uma gema necessária para aprimorar armaduras.', 'material', 'rare', 10, None, None, 1000, None, 0, 0, None, None),
-        ('Gema de Acessório', 'Uma gema rara usada para aprimorar anéis e outros acessórios.', 'material', 'epic', 20, None, None, 2500, None, 0, 0, None, None),
-        ('Gema de Item Único', 'Uma gema mística usada para aprimorar artefatos de poder singular.', 'material', 'unique', 25, None, None, 5000, None, 0, 0, None, None),
-
-        # Loots de Chefe
-        ('Coroa do Rei Goblin', 'Uma coroa tosca, mas um troféu de valor.', 'armor', 'rare', 5, None, None, 500, 'helmet', 1, 5, None, 1), # Drop do Rei Goblin (ID 1)
-        ('Clava do Rei Goblin', 'Uma clava pesada e brutal.', 'weapon', 'rare', 5, None, None, 600, 'right_hand', 12, 0, None, 1), # Drop do Rei Goblin (ID 1)
-        ('Manto do Senhor da Cripta', 'Um manto sombrio que pulsa com energia necrótica.', 'armor', 'epic', 15, 'MP_REGEN_FLAT', 3, 2000, 'chest', 0, 8, None, 2), # Drop do Senhor da Cripta (ID 2)
-    ]
-    for item_data in loot_to_add:
-        cursor.execute("SELECT COUNT(*) FROM loot_table WHERE name = ?", (item_data[0],))
-        if cursor.fetchone()[0] == 0:
-            print(f"Criando item faltante: {item_data[0]}")
-            cursor.execute(
-                "INSERT INTO loot_table (name, description, item_type, rarity, min_level_drop, effect_type, effect_value, value, equip_slot, attack_bonus, defense_bonus, effect_duration, boss_drop_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                item_data
-            )
-    
-    # Habilidades (Skills)
-    # name, description, class_restriction, mp_cost, effect_type, base_value, scaling_stat, scaling_factor, min_level
-    skills_to_add = [
-        # Guerreiro
-        ('Golpe Poderoso', 'Um ataque devastador que consome energia.', 'Guerreiro', 10, 'DAMAGE', 15, 'strength', 1.2, 1, None),
-        ('Grito de Guerra', 'Aumenta seu ataque no próximo turno.', 'Guerreiro', 15, 'BUFF_ATTACK', 5, 'strength', 0.5, 5, 1),
-        # Ladino
-        ('Ataque Furtivo', 'Um ataque rápido e preciso que ignora parte da defesa inimiga.', 'Ladino', 12, 'DAMAGE_PIERCING', 10, 'dexterity', 1.3, 1, None),
-        ('Lançar Adaga Envenenada', 'Causa dano e envenena o alvo por 3 turnos.', 'Ladino', 18, 'DAMAGE_AND_POISON', 10, 'dexterity', 1.0, 6, 3),
-        # Feiticeiro
-        ('Bola de Fogo', 'Lança uma bola de fogo que causa dano mágico.', 'Feiticeiro', 15, 'DAMAGE', 20, 'intelligence', 1.5, 1, None),
-        ('Barreira de Gelo', 'Cria uma barreira que aumenta sua defesa no próximo turno.', 'Feiticeiro', 10, 'BUFF_DEFENSE', 10, 'intelligence', 0.3, 4, 1),
-        # Bardo
-        ('Canção Revigorante', 'Uma melodia que cura uma pequena quantidade de vida.', 'Bardo', 20, 'HEAL', 25, 'charisma', 1.0, 1, None),
-        ('Balada Desmoralizante', 'Confunde o inimigo, reduzindo sua defesa no próximo turno.', 'Bardo', 15, 'DEBUFF_DEFENSE', 5, 'charisma', 0.5, 5, 1),
-        # Clérigo
-        ('Luz Sagrada', 'Causa dano radiante em um inimigo.', 'Clérigo', 15, 'DAMAGE', 18, 'wisdom', 1.4, 1, None),
-        ('Bênção Divina', 'Cura um aliado (ou a si mesmo) com poder divino.', 'Clérigo', 25, 'HEAL', 30, 'wisdom', 1.2, 3, None),
-        # Patrulheiro
-        ('Tiro Preciso', 'Um disparo certeiro que causa dano aumentado.', 'Patrulheiro', 12, 'DAMAGE', 15, 'dexterity', 1.4, 1, None),
-        ('Armadilha de Caçador', 'Prende o inimigo, reduzindo sua defesa temporariamente.', 'Patrulheiro', 15, 'DEBUFF_DEFENSE', 8, 'dexterity', 0.4, 5, 2),
+    def __init__(self):
+        self.version = 0
+        self.loaded_at = None
+        self.enemies = {} # {id: inimigo}
+        self.enemies_by_name = {} # {nome em minúsculas: inimigo}
+        self.enemy_index = LevelIndex([], min_level=lambda e: 1) # Inimigos elegíveis por nível, com sorteio em O(1)
+        self.huntable_enemies = PrefixIndex([], key=lambda e: 0) # Inimigos ordenados por max_level, para o !autohunt
+        self.items = {} # {id: item}
+        self.items_by_name = {} # {nome em minúsculas: item}
+        self.loot_index = LevelIndex([], min_level=lambda i: 1) # Itens que podem dropar em cada nível
+        self.skills_by_class = {} # {classe: [habilidades]}
+        self.jobs = {} # {id: profissão}
+        self.dungeons = {} # {id: masmorra}
+        self.bosses = {} # {id: chefe}
+        self.boss_loot = {} # {boss_id: [itens]}
+        self.item_search = False # Índice FTS5 dos itens (loot_search) disponível neste banco
+        self.item_words = [] # Palavras dos nomes dos itens, sem acentos, para corrigir erros de digitação
+
+    @property
+    def is_loaded(self):
+        return self.loaded_at is not None
+
+    def is_stale(self, version):
+        """Retorna True se a versão informada não corresponde mais aos dados carregados."""
+        return version != self.version
+
+    def load(self, cursor):
+        """Lê todas as tabelas estáticas e reconstrói os índices."""
+        def fetch_all(query):
+            cursor.execute(query)
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+        # Os índices são montados em variáveis locais e publicados de uma vez,
+        # para que leitores em outras threads nunca vejam um índice pela metade.
+        enemies = fetch_all("SELECT * FROM enemies ORDER BY id")
+        enemies_by_name = {}
+        for enemy in enemies:
+            enemies_by_name.setdefault(enemy['name'].lower(), enemy)
+        # Ordenados por nível mínimo para que cada nível já saia na ordem usada pelo !bestiary
+        enemy_index = LevelIndex(sorted(enemies, key=lambda e: e['min_level']),
+                                 min_level=lambda e: e['min_level'], max_level=lambda e: e['max_level'])
+        huntable_enemies = PrefixIndex(sorted(enemies, key=lambda e: e['min_level']), key=lambda e: e['max_level'])
+
+        items = fetch_all("SELECT * FROM loot_table ORDER BY id")
+        items_by_name = {}
+        boss_loot = {}
+        for item in items:
+            items_by_name.setdefault(item['name'].lower(), item)
+            if item['boss_drop_id'] is not None:
+                boss_loot.setdefault(item['boss_drop_id'], []).append(item)
+        loot_index = LevelIndex(items, min_level=lambda i: i['min_level_drop'])
+
+        skills_by_class = {}
+        for skill in fetch_all("SELECT * FROM skills ORDER BY id"):
+            skills_by_class.setdefault(skill['class_restriction'], []).append(skill)
+
+        self.enemies = {e['id']: e for e in enemies}
+        self.enemies_by_name = enemies_by_name
+        self.enemy_index = enemy_index
+        self.huntable_enemies = huntable_enemies
+        self.items = {i['id']: i for i in items}
+        self.items_by_name = items_by_name
+        self.loot_index = loot_index
+        self.boss_loot = boss_loot
+        self.skills_by_class = skills_by_class
+        self.jobs = {j['id']: j for j in fetch_all("SELECT * FROM jobs ORDER BY id")}
+        self.dungeons = {d['id']: d for d in fetch_all("SELECT * FROM dungeons ORDER BY id")}
+        self.bosses = {b['id']: b for b in fetch_all("SELECT * FROM boss_enemies ORDER BY id")}
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'loot_search'")
+        self.item_search = cursor.fetchone() is not None
+        self.item_words = sorted({word for item in items for word in _search_words(item['name'])})
+
+        self.version += 1
+        self.loaded_at = time.time()
+
+    def invalidate(self):
+        """Marca os dados como desatualizados; eles serão recarregados no próximo acesso."""
+        self.loaded_at = None
+
+_game_data = GameDataCache()
+_game_data_lock = threading.RLock()
+
+def get_game_data():
+    """Retorna o cache de dados estáticos, carregando-o do banco se necessário."""
+    if not _game_data.is_loaded:
+        with _game_data_lock:
+            if not _game_data.is_loaded:
+                with db_cursor() as cursor:
+                    _game_data.load(cursor)
+    return _game_data
+
+def invalidate_game_data():
+    """Descarta o cache de dados estáticos. Chame após alterar inimigos, itens, habilidades, profissões, masmorras ou chefes."""
+    with _game_data_lock:
+        _game_data.invalidate()
+
+def reload_game_data():
+    """Recarrega imediatamente o cache de dados estáticos e retorna a nova versão."""
+    invalidate_game_data()
+    return get_game_data().version
+
+# --- Dados Iniciais ---
+# Conteúdo padrão do jogo. Editar estas listas muda o hash e faz populate_initial_data inserir o que faltar.
+
+# Inimigos
+# name, min_level, max_level, hp, attack, defense, xp_reward, gold_reward, image_url
+SEED_ENEMIES = [
+    ('Goblin', 1, 3, 30, 8, 5, 10, 10, 'https://i.imgur.com/wI411wg.png'),
+    ('Lobo', 1, 4, 45, 10, 6, 15, 10, 'https://i.imgur.com/TqBqS2Q.png'),
+    ('Orc Batedor', 3, 5, 60, 12, 8, 25, 15, 'https://i.imgur.com/s4GAS25.png'),
+    ('Esqueleto', 2, 6, 50, 11, 7, 20, 12, 'https://i.imgur.com/a2J3i2a.png'),
+    # --- Novos Inimigos (Nível 4-100) ---
+    # Nível 4-10
+    ('Hobgoblin', 4, 7, 70, 15, 10, 35, 20, 'https://i.imgur.com/U4a322b.png'),
+    ('Aranha Gigante', 5, 8, 80, 16, 11, 40, 22, 'https://i.imgur.com/v2h4367.png'),
+    ('Bandido', 6, 9, 95, 18, 12, 50, 28, 'https://i.imgur.com/u0L3d2D.png'),
+    ('Gnoll', 7, 10, 110, 20, 14, 60, 35, 'https://i.imgur.com/aO4YJbJ.png'),
+    ('Ogro Jovem', 8, 11, 150, 25, 15, 80, 45, 'https://i.imgur.com/v8GS8y8.png'),
+    # Nível 11-20
+    ('Troll', 11, 15, 220, 30, 18, 120, 60, 'https://i.imgur.com/O40a3ja.png'),
+    ('Harpia', 13, 17, 180, 35, 16, 140, 70, 'https://i.imgur.com/N3b5xpn.png'),
+    ('Minotauro', 15, 20, 300, 40, 22, 180, 90, 'https://i.imgur.com/C1fb33g.png'),
+    ('Manticora', 17, 22, 280, 45, 20, 220, 110, 'https://i.imgur.com/eWj3vE4.png'),
+    ('Basilisco', 19, 24, 350, 50, 28, 270, 130, 'https://i.imgur.com/z1IARq6.png'),
+    # Nível 21-30
+    ('Elemental Menor', 21, 26, 320, 55, 30, 300, 150, 'https://i.imgur.com/0V8A12E.png'),
+    ('Guerreiro Morto-Vivo', 23, 28, 400, 60, 35, 350, 170, 'https://i.imgur.com/y5J8IZh.png'),
+    ('Wyvern', 25, 30, 450, 68, 32, 420, 200, 'https://i.imgur.com/Q4lCg11.png'),
+    ('Ciclope', 27, 33, 550, 75, 40, 500, 240, 'https://i.imgur.com/M8G9zEE.png'),
+    ('Golem de Pedra', 29, 35, 600, 65, 55, 550, 260, 'https://i.imgur.com/pDRa2s0.png'),
+    # Nível 31-40
+    ('Gigante do Gelo', 31, 37, 700, 85, 45, 650, 300, 'https://i.imgur.com/j1v2OVo.png'),
+    ('Quimera', 34, 40, 800, 95, 50, 780, 350, 'https://i.imgur.com/Y533t0Q.png'),
+    ('Beholder Jovem', 36, 42, 750, 105, 55, 900, 400, 'https://i.imgur.com/JdY26iU.png'),
+    ('Sacerdote das Sombras', 38, 45, 650, 120, 48, 1000, 450, 'https://i.imgur.com/Bw27pYy.png'),
+    ('Dragão Verde Jovem', 40, 48, 1200, 130, 65, 1500, 600, 'https://i.imgur.com/sZ5rD6I.png'),
+    # Nível 41-50
+    ('Elemental Maior', 41, 47, 900, 140, 70, 1300, 550, 'https://i.imgur.com/9dYf0yV.png'),
+    ('Hidra', 44, 50, 1500, 150, 75, 1800, 700, 'https://i.imgur.com/TqfMh0N.png'),
+    ('Cavaleiro da Morte', 46, 53, 1300, 165, 85, 2200, 850, 'https://i.imgur.com/e5f2s9f.png'),
+    ('Gigante de Fogo', 48, 55, 1800, 180, 80, 2500, 950, 'https://i.imgur.com/I1N50yC.png'),
+    ('Lich Aprendiz', 50, 58, 1500, 200, 90, 3000, 1200, 'https://i.imgur.com/Z02p9vO.png'),
+    # Nível 51-60
+    ('Dragão Azul Adulto', 52, 60, 2500, 220, 110, 3500, 1500, 'https://i.imgur.com/i3vE5yb.png'),
+    ('Kraken Menor', 55, 63, 3000, 210, 130, 4000, 1800, 'https://i.imgur.com/rV2i27a.png'),
+    ('Vampiro Lorde', 58, 66, 2200, 250, 120, 4800, 2200, 'https://i.imgur.com/8vD6x8B.png'),
+    ('Golem de Adamantina', 60, 68, 4000, 230, 180, 5500, 2500, 'https://i.imgur.com/S2A21sA.png'),
+    # Nível 61-70
+    ('Dragão Vermelho Adulto', 62, 70, 4500, 280, 150, 6500, 3000, 'https://i.imgur.com/x1Y13A0.png'),
+    ('Anjo Caído', 65, 73, 3800, 310, 140, 7500, 3500, 'https://i.imgur.com/C9a1s3v.png'),
+    ('Arquimago Corrompido', 68, 76, 3500, 350, 130, 8800, 4000, 'https://i.imgur.com/m0xS3Y1.png'),
+    # Nível 71-80
+    ('Beholder Ancião', 72, 80, 5000, 400, 180, 10000, 5000, 'https://i.imgur.com/2h255sC.png'),
+    ('Lich', 75, 83, 4800, 450, 170, 12000, 6000, 'https://i.imgur.com/yV1s9a4.png'),
+    ('Dragão Negro Ancião', 78, 86, 7000, 480, 220, 15000, 7500, 'https://i.imgur.com/A03bJ75.png'),
+    # Nível 81-90
+    ('Avatar da Morte', 82, 90, 8000, 550, 250, 20000, 10000, 'https://i.imgur.com/D4s2G3z.png'),
+    ('Titã', 85, 93, 12000, 600, 300, 25000, 12000, 'https://i.imgur.com/O0f4s4P.png'),
+    ('Dragão de Mithril', 88, 96, 10000, 650, 350, 30000, 15000, 'https://i.imgur.com/c6o5x1A.png'),
+    # Nível 91-100
+    ('Lorde Demônio', 92, 98, 15000, 750, 400, 40000, 20000, 'https://i.imgur.com/I0b5c1M.png'),
+    ('Arcanjo Vingativo', 95, 100, 13000, 850, 380, 50000, 25000, 'https://i.imgur.com/Z7g1p1J.png'),
+    ('Tarrasque', 100, 100, 25000, 900, 500, 75000, 35000, 'https://i.imgur.com/sC3a3fT.png'),
+    ('Deus Antigo Adormecido', 100, 100, 20000, 1200, 450, 100000, 50000, 'https://i.imgur.com/Gv1s5sW.png'),
+]
+
+# Chefes de Masmorra
+# name, hp, attack, defense, xp_reward, gold_reward, image_url
+SEED_BOSS_ENEMIES = [
+    ('Rei Goblin', 1500, 50, 30, 1000, 500, 'https://i.imgur.com/M8G9zEE.png'),
+    ('Senhor da Cripta', 4000, 120, 60, 3500, 1500, 'https://i.imgur.com/y5J8IZh.png'),
+]
+
+# Itens de Loot
+SEED_LOOT = [
+    # name, description, item_type, rarity, min_level_drop, effect_type, effect_value, value, equip_slot, attack_bonus, defense_bonus, effect_duration, boss_drop_id
+    ('Poção de Cura Pequena', 'Restaura 25 HP.', 'potion', 'common', 1, 'HEAL_HP', 25, 10, None, 0, 0, None, None),
+    ('Poção de Cura Média', 'Restaura 75 HP.', 'potion', 'uncommon', 5, 'HEAL_HP', 75, 50, None, 0, 0, None, None),
+    ('Poção de Mana Pequena', 'Restaura 20 MP.', 'potion', 'common', 2, 'HEAL_MP', 20, 15, None, 0, 0, None, None),
+    ('Fruto Dourado', 'Aumenta permanentemente o HP máximo em 5.', 'potion', 'rare', 8, 'INCREASE_MAX_HP', 5, 500, None, 0, 0, None, None),
+    ('Tomo do Conhecimento', 'Concede 50 de experiência.', 'potion', 'uncommon', 4, 'GAIN_XP', 50, 100, None, 0, 0, None, None),
+    ('Elixir da Rapidez', 'Aumenta permanentemente a Destreza em 1.', 'potion', 'epic', 10, 'INCREASE_DEXTERITY', 1, 1000, None, 0, 0, None, None),
+
+    ('Adaga Enferrujada', 'Uma adaga simples.', 'weapon', 'common', 1, None, None, 5, 'right_hand', 2, 0, None, None),
+    ('Adaga Envenenada', 'Uma adaga com uma lâmina coberta de veneno que tem 25% de chance de envenenar o alvo em ataques.', 'weapon', 'rare', 6, 'POISON_ON_HIT', 25, 220, 'right_hand', 7, 0, 3, None),
+    ('Machado de Guerra Orc', 'Bruto e pesado, favorece a força sobre a defesa.', 'weapon', 'uncommon', 4, None, None, 40, 'right_hand', 8, -2, None, None),
+    ('Arco Élfico', 'Leve e preciso.', 'weapon', 'uncommon', 3, None, None, 55, 'right_hand', 6, 0, None, None),
+    ('Cajado do Aprendiz', 'Focado em canalizar poder mágico.', 'weapon', 'common', 1, 'SCALE_WITH_INTELLIGENCE', None, 20, 'right_hand', 3, 1, None, None),
+    ('Martelo de Guerra Anão', 'Uma arma robusta que também oferece boa proteção.', 'weapon', 'rare', 6, None, None, 150, 'right_hand', 10, 2, None, None),
+
+    ('Pele de Lobo', 'Pode ser útil para artesanato.', 'material', 'common', 1, None, None, 3, None, 0, 0, None, None),
+    ('Espada Curta de Ferro', 'Uma espada confiável.', 'weapon', 'uncommon', 3, None, None, 20, 'right_hand', 5, 0, None, None),
+
+    ('Peitoral de Couro', 'Oferece proteção básica.', 'armor', 'common', 2, None, None, 25, 'chest', 0, 3, None, None),
+    ('Elmo de Ferro', 'Proteção sólida para a cabeça.', 'armor', 'common', 3, None, None, 30, 'helmet', 0, 2, None, None),
+    ('Calças de Malha', 'Flexíveis e resistentes.', 'armor', 'uncommon', 4, None, None, 45, 'legs', 0, 4, None, None),
+    ('Peitoral de Aço', 'Excelente proteção, mas pesado.', 'armor', 'rare', 7, None, None, 200, 'chest', -1, 10, None, None),
+    ('Botas de Couro Leve', 'Aumentam a agilidade do usuário.', 'armor', 'common', 2, None, None, 20, 'legs', 0, 1, None, None),
+
+    ('Anel do Vampiro', 'Cura o usuário em 25% do dano causado por ataques.', 'armor', 'rare', 5, 'LIFESTEAL_PERCENT', 25, 250, 'ring', 0, 0, None, None),
+    ('Anel da Avareza', 'Aumenta o ouro ganho em batalhas em 15%.', 'armor', 'uncommon', 3, 'GOLD_BONUS_PERCENT', 15, 150, 'ring', 0, 0, None, None),
+    ('Anel do Sábio', 'Aumenta a experiência ganha em 10%.', 'armor', 'uncommon', 3, 'XP_BONUS_PERCENT', 10, 150, 'ring', 0, 0, None, None),
+    ('Anel da Precisão', 'Aumenta a chance de causar dano crítico.', 'armor', 'rare', 6, 'CRIT_CHANCE_PERCENT', 10, 300, 'ring', 0, 0, None, None),
+    ('Anel da Regeneração', 'Regenera uma pequena quantidade de MP a cada turno.', 'armor', 'epic', 10, 'MP_REGEN_FLAT', 2, 500, 'ring', 0, 0, None, None),
+
+    ('Gema de Arma', 'Uma gema necessária para aprimorar armas.', 'material', 'rare', 10, None, None, 1000, None, 0, 0, None, None),
+    ('Gema de Armadura', 'Uma gema necessária para aprimorar armaduras.', 'material', 'rare', 10, None, None, 1000, None, 0, 0, None, None),
+    ('Gema de Acessório', 'Uma gema rara usada para aprimorar anéis e outros acessórios.', 'material', 'epic', 20, None, None, 2500, None, 0, 0, None, None),
+    ('Gema de Item Único', 'Uma gema mística usada para aprimorar artefatos de poder singular.', 'material', 'unique', 25, None, None, 5000, None, 0, 0, None, None),
+
+    # Loots de Chefe
+    ('Coroa do Rei Goblin', 'Uma coroa tosca, mas um troféu de valor.', 'armor', 'rare', 5, None, None, 500, 'helmet', 1, 5, None, 1), # Drop do Rei Goblin (ID 1)
+    ('Clava do Rei Goblin', 'Uma clava pesada e brutal.', 'weapon', 'rare', 5, None, None, 600, 'right_hand', 12, 0, None, 1), # Drop do Rei Goblin (ID 1)
+    ('Manto do Senhor da Cripta', 'Um manto sombrio que pulsa com energia necrótica.', 'armor', 'epic', 15, 'MP_REGEN_FLAT', 3, 2000, 'chest', 0, 8, None, 2), # Drop do Senhor da Cripta (ID 2)
+]
+
+# Habilidades (Skills)
+# name, description, class_restriction, mp_cost, effect_type, base_value, scaling_stat, scaling_factor, min_level
+SEED_SKILLS = [
+    # Guerreiro
+    ('Golpe Poderoso', 'Um ataque devastador que consome energia.', 'Guerreiro', 10, 'DAMAGE', 15, 'strength', 1.2, 1, None),
+    ('Grito de Guerra', 'Aumenta seu ataque no próximo turno.', 'Guerreiro', 15, 'BUFF_ATTACK', 5, 'strength', 0.5, 5, 1),
+    # Ladino
+    ('Ataque Furtivo', 'Um ataque rápido e preciso que ignora parte da defesa inimiga.', 'Ladino', 12, 'DAMAGE_PIERCING', 10, 'dexterity', 1.3, 1, None),
+    ('Lançar Adaga Envenenada', 'Causa dano e envenena o alvo por 3 turnos.', 'Ladino', 18, 'DAMAGE_AND_POISON', 10, 'dexterity', 1.0, 6, 3),
+    # Feiticeiro
+    ('Bola de Fogo', 'Lança uma bola de fogo que causa dano mágico.', 'Feiticeiro', 15, 'DAMAGE', 20, 'intelligence', 1.5, 1, None),
+    ('Barreira de Gelo', 'Cria uma barreira que aumenta sua defesa no próximo turno.', 'Feiticeiro', 10, 'BUFF_DEFENSE', 10, 'intelligence', 0.3, 4, 1),
+    # Bardo
+    ('Canção Revigorante', 'Uma melodia que cura uma pequena quantidade de vida.', 'Bardo', 20, 'HEAL', 25, 'charisma', 1.0, 1, None),
+    ('Balada Desmoralizante', 'Confunde o inimigo, reduzindo sua defesa no próximo turno.', 'Bardo', 15, 'DEBUFF_DEFENSE', 5, 'charisma', 0.5, 5, 1),
+    # Clérigo
+    ('Luz Sagrada', 'Causa dano radiante em um inimigo.', 'Clérigo', 15, 'DAMAGE', 18, 'wisdom', 1.4, 1, None),
+    ('Bênção Divina', 'Cura um aliado (ou a si mesmo) com poder divino.', 'Clérigo', 25, 'HEAL', 30, 'wisdom', 1.2, 3, None),
+    # Patrulheiro
+    ('Tiro Preciso', 'Um disparo certeiro que causa dano aumentado.', 'Patrulheiro', 12, 'DAMAGE', 15, 'dexterity', 1.4, 1, None),
+    ('Armadilha de Caçador', 'Prende o inimigo, reduzindo sua defesa temporariamente.', 'Patrulheiro', 15, 'DEBUFF_DEFENSE', 8, 'dexterity', 0.4, 5, 2),
+]
+
+# Missões (Quests)
+# name, description, type ('daily', 'weekly'), objective_type ('kill'), objective_target, objective_quantity, xp_reward, gold_reward, item_reward_id, item_reward_quantity
+SEED_QUESTS = [
+    ('Caça aos Goblins', 'Elimine 5 Goblins da floresta.', 'daily', 'kill', 'Goblin', 5, 50, 25, None, None),
+    ('Extermínio de Lobos', 'Cace 10 Lobos que ameaçam os viajantes.', 'daily', 'kill', 'Lobo', 10, 80, 40, None, None),
+    ('A Ameaça Orc', 'Derrote 15 Orcs Batedores para proteger a vila.', 'weekly', 'kill', 'Orc Batedor', 15, 250, 150, 1, 1), # Recompensa: Poção de Cura Pequena
+    ('Limpeza de Cripta', 'Destrua 20 Esqueletos em uma cripta antiga.', 'weekly', 'kill', 'Esqueleto', 20, 300, 200, 2, 1), # Recompensa: Poção de Cura Média
+    ('Dia de Trabalho Duro', 'Acumule 9 horas de trabalho em sua profissão.', 'daily', 'work', 'hours', 9, 100, 250, 26, 1), # Recompensa: Gema de Arma
+]
+
+# Profissões (Jobs)
+SEED_JOBS = [
+    (1, 'Ajudante de Fazendeiro', 'Trabalho simples na fazenda local.', 1, 10),
+    (2, 'Garimpeiro Aprendiz', 'Busca por minérios nas minas abandonadas.', 10, 25),
+    (3, 'Guarda da Cidade', 'Patrulha os muros da cidade, mantendo a ordem.', 20, 50),
+    (4, 'Assistente de Alquimista', 'Ajuda a coletar ingredientes e preparar poções.', 30, 80),
+    (5, 'Caçador de Recompensas', 'Rastreia e captura criminosos para o reino.', 50, 150),
+]
+
+# Masmorras (Dungeons)
+SEED_DUNGEONS = [
+    (1, 'Caverna dos Goblins', 'Uma caverna infestada de goblins e seu rei.', 5, 1),
+    (2, 'Cripta Assombrada', 'Uma antiga cripta cheia de mortos-vivos e seu mestre.', 15, 2),
+]
+
+# (tabela, colunas, coluna que identifica a linha, dados)
+SEED_TABLES = [
+    ("enemies", ("name", "min_level", "max_level", "hp", "attack", "defense", "xp_reward", "gold_reward", "image_url"), "name", SEED_ENEMIES),
+    ("boss_enemies", ("name", "hp", "attack", "defense", "xp_reward", "gold_reward", "image_url"), "name", SEED_BOSS_ENEMIES),
+    ("loot_table", ("name", "description", "item_type", "rarity", "min_level_drop", "effect_type", "effect_value", "value", "equip_slot", "attack_bonus", "defense_bonus", "effect_duration", "boss_drop_id"), "name", SEED_LOOT),
+    ("skills", ("name", "description", "class_restriction", "mp_cost", "effect_type", "base_value", "scaling_stat", "scaling_factor", "min_level", "effect_duration"), "name", SEED_SKILLS),
+    ("quests", ("name", "description", "type", "objective_type", "objective_target", "objective_quantity", "xp_reward", "gold_reward", "item_reward_id", "item_reward_quantity"), "name", SEED_QUESTS),
+    ("jobs", ("id", "name", "description", "level_req", "gold_per_hour"), "id", SEED_JOBS),
+    ("dungeons", ("id", "name", "description", "level_req", "boss_id"), "id", SEED_DUNGEONS),
+]
+
+def seed_digest():
+    """Hash do conteúdo dos dados iniciais. Muda sempre que alguma lista SEED_* é editada."""
+    payload = json.dumps([(table, columns, key, rows) for table, columns, key, rows in SEED_TABLES], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def populate_initial_data(cursor, force=False):
+    """
+    Cria inimigos, itens, habilidades, missões, profissões e masmorras que ainda não existem no banco.
+
+    O hash dos dados iniciais fica em server_state: se nada mudou desde a última inicialização,
+    nenhuma consulta é feita. Caso contrário, todas as linhas faltantes são inseridas com
+    executemany na transação do cursor recebido. Use `force=True` para reaplicar mesmo com o
+    hash igual (ex: após apagar linhas manualmente).
+    """
+    digest = seed_digest()
+    if not force:
+        cursor.execute("SELECT value FROM server_state WHERE key = 'seed_digest'")
+        row = cursor.fetchone()
+        if row and row[0] == digest:
+            return 0
+
+    total_inserted = 0
+    for table, columns, key, rows in SEED_TABLES:
+        placeholders = ", ".join(["?"] * len(columns))
+        key_index = columns.index(key)
+        # Insere apenas as linhas cuja chave ainda não existe (nem todas as tabelas têm UNIQUE na chave)
+        cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) SELECT {placeholders} WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {key} = ?)", # nosec
+            [(*row, row[key_index]) for row in rows]
+        )
+        if cursor.rowcount > 0:
+            print(f"Creating {cursor.rowcount} missing row(s) in '{table}'.")
+            total_inserted += cursor.rowcount
+
+    cursor.execute("INSERT OR REPLACE INTO server_state (key, value) VALUES ('seed_digest', ?)", (digest,))
+    return total_inserted
+
+# --- Migrações Versionadas ---
+# Cada migração roda uma única vez, em ordem, e fica registrada na tabela schema_version.
+# Para alterar o schema, adicione uma nova função ao final de MIGRATIONS; nunca edite uma já publicada.
+
+def _migration_add_missing_columns(cursor):
+    """Adiciona colunas criadas depois da primeira versão do bot em bancos antigos."""
+    tables_to_check = {
+        "characters": [
+            ("gold", "INTEGER NOT NULL DEFAULT 0"),
+            ("pvp_wins", "INTEGER NOT NULL DEFAULT 0"),
+            ("pvp_losses", "INTEGER NOT NULL DEFAULT 0"),
+            ("unspent_attribute_points", "INTEGER NOT NULL DEFAULT 0"),
+            ("current_job_id", "INTEGER", "FOREIGN KEY (current_job_id) REFERENCES jobs(id)"),
+            ("job_started_at", "TIMESTAMP"),
+            ("last_payday", "TIMESTAMP"),
+            ("last_job_change", "TIMESTAMP"),
+            ("last_work_check_in", "TIMESTAMP"),
+        ],
+        "enemies": [
+            ("gold_reward", "INTEGER NOT NULL DEFAULT 10"),
+            ("image_url", "TEXT")
+        ],
+        "loot_table": [
+            ("effect_type", "TEXT"),
+            ("effect_value", "INTEGER"),
+            ("value", "INTEGER NOT NULL DEFAULT 0"),
+            ("equip_slot", "TEXT"),
+            ("attack_bonus", "INTEGER NOT NULL DEFAULT 0"),
+            ("defense_bonus", "INTEGER NOT NULL DEFAULT 0"),
+            ("effect_duration", "INTEGER"),
+            ("boss_drop_id", "INTEGER"),
+        ],
+        "inventory": [
+            ("unique_id", "TEXT"), # Adicionado para rastrear itens individualmente
+        ],
+        "skills": [
+            ("effect_duration", "INTEGER"),
+        ]
+    }
+
+    for table, columns in tables_to_check.items():
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing_columns = [row[1] for row in cursor.fetchall()]
+        for column_def in columns:
+            col_name, col_type = column_def[0], column_def[1]
+            if col_name not in existing_columns:
+                print(f"Applying migration: Adding column '{col_name}' to table '{table}'...")
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {col_name} {col_type}") # A FK não é adicionada via ALTER TABLE simples em SQLite
+
+def _migration_create_missing_equipment(cursor):
+    """Garante que cada personagem tenha uma entrada de equipamento."""
+    cursor.execute("""
+        INSERT OR IGNORE INTO equipment (character_user_id)
+        SELECT user_id FROM characters
+        WHERE user_id NOT IN (SELECT character_user_id FROM equipment)
+    """)
+    if cursor.rowcount:
+        print(f"Applying migration: Created equipment entries for {cursor.rowcount} characters.")
+
+def _migration_add_query_indexes(cursor):
+    """Índices para as buscas mais frequentes. Os de nome usam NOCASE para que o LIKE possa usá-los."""
+    indexes = [
+        "CREATE INDEX IF NOT EXISTS idx_inventory_owner_item ON inventory (character_user_id, item_id, enhancement_level)",
+        "CREATE INDEX IF NOT EXISTS idx_player_quests_owner_quest ON player_quests (character_user_id, quest_id)",
+        "CREATE INDEX IF NOT EXISTS idx_player_quests_quest ON player_quests (quest_id)",
+        "CREATE INDEX IF NOT EXISTS idx_quests_objective ON quests (objective_type, objective_target)",
+        "CREATE INDEX IF NOT EXISTS idx_market_listings_listed_at ON market_listings (listed_at)",
+        "CREATE INDEX IF NOT EXISTS idx_loot_table_name ON loot_table (name COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS idx_loot_table_type ON loot_table (item_type, name)",
+        "CREATE INDEX IF NOT EXISTS idx_enemies_name ON enemies (name COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS idx_characters_name ON characters (name COLLATE NOCASE)",
     ]
-    for skill_data in skills_to_add:
-        cursor.execute("SELECT COUNT(*) FROM skills WHERE name = ?", (skill_data[0],))
-        if cursor.fetchone()[0] == 0:
-            print(f"Creating missing skill: {skill_data[0]}")
-            cursor.execute(
-                "INSERT INTO skills (name, description, class_restriction, mp_cost, effect_type, base_value, scaling_stat, scaling_factor, min_level, effect_duration) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                skill_data
+    for statement in indexes:
+        cursor.execute(statement)
+
+def _migration_inventory_stacks(cursor):
+    """Marca as pilhas de poções e materiais, juntando as duplicadas, e cria o índice único que as mantém únicas."""
+    cursor.execute("PRAGMA table_info(inventory)")
+    if "stackable" not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE inventory ADD COLUMN stackable INTEGER NOT NULL DEFAULT 0")
+    stackable_items = f"SELECT id FROM loot_table WHERE item_type IN {STACKABLE_ITEM_TYPES}"
+    # A linha mais antiga de cada jogador/item vira a pilha com a soma de todas; as outras são removidas
+    cursor.execute(f"""
+        UPDATE inventory SET stackable = 1, quantity = (
+            SELECT SUM(d.quantity) FROM inventory d
+            WHERE d.character_user_id = inventory.character_user_id AND d.item_id = inventory.item_id AND d.enhancement_level = 0
+        )
+        WHERE id IN (
+            SELECT MIN(id) FROM inventory WHERE enhancement_level = 0 AND item_id IN ({stackable_items})
+            GROUP BY character_user_id, item_id
+        )
+    """) # nosec
+    cursor.execute(f"DELETE FROM inventory WHERE stackable = 0 AND enhancement_level = 0 AND item_id IN ({stackable_items})") # nosec
+    if cursor.rowcount:
+        print(f"Applying migration: Merged {cursor.rowcount} duplicated inventory stacks.")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_inventory_stack ON inventory (character_user_id, item_id) WHERE stackable = 1")
+
+def _migration_add_market_indexes(cursor):
+    """Índices por vendedor e comprador, usados ao excluir um personagem."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_market_listings_seller ON market_listings (seller_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_market_buy_orders_buyer ON market_buy_orders (buyer_id)")
+
+def _migration_add_item_search(cursor):
+    """Índice de busca textual (FTS5) sobre nome e descrição dos itens, mantido por triggers."""
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS loot_search USING fts5(
+                name, description, content = 'loot_table', content_rowid = 'id',
+                tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
             )
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"Aviso: SQLite sem suporte a FTS5 ({e}). A busca de itens usará o nome em memória.")
+        return
+    # Triggers mantêm o índice em dia com qualquer alteração na loot_table (inclusive itens criados pelo Narrador)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS loot_search_insert AFTER INSERT ON loot_table BEGIN
+            INSERT INTO loot_search (rowid, name, description) VALUES (new.id, new.name, new.description);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS loot_search_delete AFTER DELETE ON loot_table BEGIN
+            INSERT INTO loot_search (loot_search, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS loot_search_update AFTER UPDATE OF name, description ON loot_table BEGIN
+            INSERT INTO loot_search (loot_search, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO loot_search (rowid, name, description) VALUES (new.id, new.name, new.description);
+        END
+    """)
+    cursor.execute("INSERT INTO loot_search (loot_search) VALUES ('rebuild')")
 
-    # Missões (Quests)
-    # name, description, type ('daily', 'weekly'), objective_type ('kill'), objective_target, objective_quantity, xp_reward, gold_reward, item_reward_id, item_reward_quantity
-    quests_to_add = [
-        ('Caça aos Goblins', 'Elimine 5 Goblins da floresta.', 'daily', 'kill', 'Goblin', 5, 50, 25, None, None),
-        ('Extermínio de Lobos', 'Cace 10 Lobos que ameaçam os viajantes.', 'daily', 'kill', 'Lobo', 10, 80, 40, None, None),
-        ('A Ameaça Orc', 'Derrote 15 Orcs Batedores para proteger a vila.', 'weekly', 'kill', 'Orc Batedor', 15, 250, 150, 1, 1), # Recompensa: Poção de Cura Pequena
-        ('Limpeza de Cripta', 'Destrua 20 Esqueletos em uma cripta antiga.', 'weekly', 'kill', 'Esqueleto', 20, 300, 200, 2, 1), # Recompensa: Poção de Cura Média
-        ('Dia de Trabalho Duro', 'Acumule 9 horas de trabalho em sua profissão.', 'daily', 'work', 'hours', 9, 100, 250, 26, 1), # Recompensa: Gema de Arma
-    ]
-    for quest_data in quests_to_add:
-        cursor.execute("SELECT COUNT(*) FROM quests WHERE name = ?", (quest_data[0],))
-        if cursor.fetchone()[0] == 0:
-            print(f"Creating missing quest: {quest_data[0]}")
-            cursor.execute("INSERT INTO quests (name, description, type, objective_type, objective_target, objective_quantity, xp_reward, gold_reward, item_reward_id, item_reward_quantity) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", quest_data)
-
-    # Profissões (Jobs)
-    jobs_to_add = [
-        (1, 'Ajudante de Fazendeiro', 'Trabalho simples na fazenda local.', 1, 10),
-        (2, 'Garimpeiro Aprendiz', 'Busca por minérios nas minas abandonadas.', 10, 25),
-        (3, 'Guarda da Cidade', 'Patrulha os muros da cidade, mantendo a ordem.', 20, 50),
-        (4, 'Assistente de Alquimista', 'Ajuda a coletar ingredientes e preparar poções.', 30, 80),
-        (5, 'Caçador de Recompensas', 'Rastreia e captura criminosos para o reino.', 50, 150),
-    ]
-    for job_data in jobs_to_add:
-        cursor.execute("SELECT COUNT(*) FROM jobs WHERE id = ?", (job_data[0],))
-        if cursor.fetchone()[0] == 0:
-            print(f"Creating missing job: {job_data[1]}")
-            cursor.execute("INSERT INTO jobs (id, name, description, level_req, gold_per_hour) VALUES (?, ?, ?, ?, ?)", job_data)
-
-    # Masmorras (Dungeons)
-    dungeons_to_add = [
-        (1, 'Caverna dos Goblins', 'Uma caverna infestada de goblins e seu rei.', 5, 1),
-        (2, 'Cripta Assombrada', 'Uma antiga cripta cheia de mortos-vivos e seu mestre.', 15, 2),
-    ]
-    for dungeon_data in dungeons_to_add:
-        cursor.execute("SELECT COUNT(*) FROM dungeons WHERE id = ?", (dungeon_data[0],))
-        if cursor.fetchone()[0] == 0:
-            print(f"Creating missing dungeon: {dungeon_data[1]}")
-            cursor.execute("INSERT INTO dungeons (id, name, description, level_req, boss_id) VALUES (?, ?, ?, ?, ?)", dungeon_data)
+def _migration_import_narrative_history(cursor):
+    """Copia os históricos antigos (um JSON por jogador) para narrative_turns e narrative_summaries."""
+    cursor.execute("SELECT character_user_id, history_json FROM narrative_history")
+    imported = 0
+    for user_id, history_json in cursor.fetchall():
+        try:
+            history = json.loads(history_json)
+        except ValueError:
+            continue
+        summary = None
+        turns = []
+        for message in history:
+            content = message.get("content") or ""
+            if message.get("role") in ("user", "assistant"):
+                turns.append((user_id, message["role"], content, estimate_tokens(content)))
+            elif content.startswith(NARRATIVE_SUMMARY_PREFIX):
+                summary = content[len(NARRATIVE_SUMMARY_PREFIX):].strip()
+        # Os prompts de sistema antigos não são copiados: a sessão os recria a cada aventura
+        cursor.executemany("INSERT INTO narrative_turns (character_user_id, role, content, tokens) VALUES (?, ?, ?, ?)", turns)
+        if summary:
+            cursor.execute("INSERT OR REPLACE INTO narrative_summaries (character_user_id, summary, summarized_through, tokens) VALUES (?, ?, 0, ?)",
+                           (user_id, summary, estimate_tokens(summary)))
+        imported += 1
+    if imported:
+        print(f"Applying migration: Imported {imported} narrative histories into narrative_turns.")
+
+# (versão, descrição, função). A versão deve ser sempre crescente.
+MIGRATIONS = [
+    (1, "Colunas adicionadas após a primeira versão", _migration_add_missing_columns),
+    (2, "Entradas de equipamento para personagens antigos", _migration_create_missing_equipment),
+    (3, "Índices para as consultas frequentes", _migration_add_query_indexes),
+    (4, "Pilhas únicas de itens empilháveis no inventário", _migration_inventory_stacks),
+    (5, "Índices do livro de ofertas do mercado", _migration_add_market_indexes),
+    (6, "Busca textual de itens (FTS5)", _migration_add_item_search),
+    (7, "Histórico do Narrador em linhas (narrative_turns)", _migration_import_narrative_history),
+]
+
+def get_schema_version(cursor):
+    """Retorna a versão atual do schema (0 se nenhuma migração foi aplicada)."""
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return cursor.fetchone()[0]
 
 def migrate_db():
-    """Verifica e aplica migrações pendentes no banco de dados para atualizar a estrutura."""
+    """Aplica, em ordem e uma única vez, as migrações que ainda não rodaram neste banco."""
     print("Checking for database migrations...")
     with db_cursor() as cursor:
-        # --- Migração 1: Adicionar colunas se não existirem ---
-        tables_to_check = {
-            "characters": [
-                ("gold", "INTEGER NOT NULL DEFAULT 0"),
-                ("pvp_wins", "INTEGER NOT NULL DEFAULT 0"),
-                ("pvp_losses", "INTEGER NOT NULL DEFAULT 0"),
-                ("unspent_attribute_points", "INTEGER NOT NULL DEFAULT 0"),
-                ("current_job_id", "INTEGER", "FOREIGN KEY (current_job_id) REFERENCES jobs(id)"),
-                ("job_started_at", "TIMESTAMP"),
-                ("last_payday", "TIMESTAMP"),
-                ("last_job_change", "TIMESTAMP"),
-                ("last_work_check_in", "TIMESTAMP"),
-            ],
-            "enemies": [
-                ("gold_reward", "INTEGER NOT NULL DEFAULT 10"),
-                ("image_url", "TEXT")
-            ],
-            "loot_table": [
-                ("effect_type", "TEXT"),
-                ("effect_value", "INTEGER"),
-                ("value", "INTEGER NOT NULL DEFAULT 0"),
-                ("equip_slot", "TEXT"),
-                ("attack_bonus", "INTEGER NOT NULL DEFAULT 0"),
-                ("defense_bonus", "INTEGER NOT NULL DEFAULT 0"),
-                ("effect_duration", "INTEGER"),
-                ("boss_drop_id", "INTEGER"),
-            ],
-            "inventory": [
-                ("unique_id", "TEXT"), # Adicionado para rastrear itens individualmente
-            ],
-            "skills": [
-                ("effect_duration", "INTEGER"),
-            ]
-        }
-
-        for table, columns in tables_to_check.items():
-            cursor.execute(f"PRAGMA table_info({table})")
-            existing_columns = [row[1] for row in cursor.fetchall()]
-            for column_def in columns:
-                col_name, col_type = column_def[0], column_def[1]
-                if col_name not in existing_columns:
-                    print(f"Applying migration: Adding column '{col_name}' to table '{table}'...")
-                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {col_name} {col_type}") # A FK não é adicionada via ALTER TABLE simples em SQLite
-
-        # --- Migração 2: Garantir que cada personagem tenha uma entrada de equipamento ---
-        cursor.execute("SELECT user_id FROM characters")
-        all_character_ids = [row[0] for row in cursor.fetchall()]
-        
-        if all_character_ids:
-            cursor.execute("SELECT character_user_id FROM equipment")
-            equipped_character_ids = [row[0] for row in cursor.fetchall()]
-            
-            missing_equipment_entries = set(all_character_ids) - set(equipped_character_ids)
-            
-            if missing_equipment_entries:
-                print(f"Applying migration: Creating equipment entries for {len(missing_equipment_entries)} characters...")
-                for user_id in missing_equipment_entries:
-                    try:
-                        cursor.execute("INSERT INTO equipment (character_user_id) VALUES (?)", (user_id,))
-                    except sqlite3.IntegrityError:
-                        # Caso a entrada já exista (corrida de condição), ignora o erro.
-                        pass
-
-    print("Database migrations checked.")
-
-def init_db():
-    """Inicializa o banco de dados, criando as tabelas necessárias."""
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            duration_ms REAL NOT NULL
+        )
+        """)
+        current_version = get_schema_version(cursor)
+
+    applied = 0
+    for version, description, migration in MIGRATIONS:
+        if version <= current_version:
+            continue
+        start = time.perf_counter()
+        # Cada migração roda em sua própria transação junto com o seu registro
+        with db_cursor() as cursor:
+            migration(cursor)
+            duration_ms = (time.perf_counter() - start) * 1000
+            cursor.execute("INSERT INTO schema_version (version, description, duration_ms) VALUES (?, ?, ?)", (version, description, duration_ms))
+        print(f"Migration {version} applied: {description} ({duration_ms:.1f} ms)")
+        applied += 1
+
+    if applied:
+        print(f"Database migrations applied. Schema version: {MIGRATIONS[-1][0]}")
+    else:
+        print(f"Database schema is up to date (version {current_version}).")
+
+def init_db(timings=None):
+    """
+    Inicializa o banco de dados, criando as tabelas necessárias.
+    Se `timings` (um dicionário) for passado, recebe a duração em segundos de cada etapa.
+    """
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
     with db_cursor() as cursor:
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS characters (
@@ -372,6 +855,7 @@ def init_db():
             quantity INTEGER NOT NULL DEFAULT 1, -- Para itens empilháveis
             enhancement_level INTEGER NOT NULL DEFAULT 0,
             unique_id TEXT, -- UUID para itens únicos como equipamentos
+            stackable INTEGER NOT NULL DEFAULT 0, -- 1 = pilha de poção/material (uma por jogador e item)
             FOREIGN KEY (character_user_id) REFERENCES characters (user_id) ON DELETE CASCADE,
             FOREIGN KEY (item_id) REFERENCES loot_table (id)
         )
@@ -421,6 +905,19 @@ def init_db():
             FOREIGN KEY (seller_id) REFERENCES characters (user_id),
             FOREIGN KEY (item_id) REFERENCES loot_table (id)
         )
+    """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS market_buy_orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            buyer_id INTEGER NOT NULL,
+            item_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL, -- Unidades ainda não compradas
+            price INTEGER NOT NULL, -- Preço máximo por unidade; o ouro da quantidade restante fica reservado
+            enhancement_level INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (buyer_id) REFERENCES characters (user_id),
+            FOREIGN KEY (item_id) REFERENCES loot_table (id)
+        )
     """)
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS quests (
@@ -529,29 +1026,75 @@ def init_db():
             FOREIGN KEY (character_user_id) REFERENCES characters(user_id) ON DELETE CASCADE
         )
         """)
+        # Memória do Narrador: cada mensagem é uma linha nova (nada é reescrito) e o resumo cobre as antigas
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS narrative_turns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            character_user_id INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            tokens INTEGER NOT NULL, -- Estimativa (estimate_tokens)
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (character_user_id) REFERENCES characters(user_id) ON DELETE CASCADE
+        )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_narrative_turns_owner ON narrative_turns (character_user_id, id)")
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS narrative_summaries (
+            character_user_id INTEGER PRIMARY KEY,
+            summary TEXT NOT NULL,
+            summarized_through INTEGER NOT NULL, -- Último id de narrative_turns coberto pelo resumo
+            tokens INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (character_user_id) REFERENCES characters(user_id) ON DELETE CASCADE
+        )
+        """)
+
 
 
 
+    timings['create_tables'] = time.perf_counter() - start
 
     # Executa as migrações ANTES de popular os dados
+    start = time.perf_counter()
     migrate_db() 
+    timings['migrate_db'] = time.perf_counter() - start
 
+    start = time.perf_counter()
     with db_cursor() as cursor:
         populate_initial_data(cursor)
+    timings['populate_initial_data'] = time.perf_counter() - start
 
-    print(f"Database '{DATABASE_NAME}' initialized.")
+    start = time.perf_counter()
+    version = reload_game_data()
+    timings['game_data_cache'] = time.perf_counter() - start
+    print(f"Database '{DATABASE_NAME}' initialized. (dados estáticos em cache, versão {version})")
 
 def delete_character_full(user_id):
     """
     Deleta um personagem e todos os seus dados associados (inventário, equipamento, quests).
     A exclusão da tabela 'characters' aciona o ON DELETE CASCADE para 'player_quests'.
     """
+    _stat_buffer.discard(user_id)
+    _equipment_cache.invalidate(user_id)
+    _quest_progress.forget(user_id)
+    _after_commit(_leaderboards.remove, user_id)
     with db_cursor() as cursor:
         # Remove explicitamente para garantir a limpeza completa
         cursor.execute("DELETE FROM inventory WHERE character_user_id = ?", (user_id,))
         cursor.execute("DELETE FROM equipment WHERE character_user_id = ?", (user_id,))
+        cursor.execute("DELETE FROM market_listings WHERE seller_id = ?", (user_id,))
+        market_rows = cursor.rowcount
+        cursor.execute("DELETE FROM market_buy_orders WHERE buyer_id = ?", (user_id,))
+        market_rows += cursor.rowcount
+        cursor.execute("DELETE FROM narrative_turns WHERE character_user_id = ?", (user_id,))
+        cursor.execute("DELETE FROM narrative_summaries WHERE character_user_id = ?", (user_id,))
+        cursor.execute("DELETE FROM narrative_history WHERE character_user_id = ?", (user_id,))
         cursor.execute("DELETE FROM characters WHERE user_id = ?", (user_id,))
-        return cursor.rowcount > 0
+        deleted = cursor.rowcount > 0
+    if market_rows:
+        invalidate_market()
+    return deleted
 
 def create_character(user_id, guild_id, channel_id, name, race, char_class,
                      strength, constitution, dexterity, intelligence, wisdom,
@@ -568,6 +1111,8 @@ def create_character(user_id, guild_id, channel_id, name, race, char_class,
                   strength, constitution, dexterity, intelligence, wisdom, charisma,
                   hp, hp, mp, mp, image_url))
             cursor.execute("INSERT INTO equipment (character_user_id) VALUES (?)", (user_id,))
+            _after_commit(_leaderboards.add, user_id, {'name': name, 'guild_id': guild_id, 'level': 1, 'experience': 0,
+                                                       'pvp_wins': 0, 'pvp_losses': 0})
             return True
         except sqlite3.IntegrityError:
             print(f"Error: Character with user_id {user_id} already exists.")
@@ -581,7 +1126,8 @@ def get_character(user_id):
         if character_data:
             # Retorna um dicionário para facilitar o acesso aos dados
             columns = [description[0] for description in cursor.description]
-            return dict(zip(columns, character_data))
+            character = dict(zip(columns, character_data))
+            return _stat_buffer.overlay(character['user_id'], character)
     return None
 
 def get_character_by_name(name):
@@ -592,7 +1138,8 @@ def get_character_by_name(name):
         if character_data:
             # Retorna um dicionário para facilitar o acesso aos dados
             columns = [description[0] for description in cursor.description]
-            return dict(zip(columns, character_data))
+            character = dict(zip(columns, character_data))
+            return _stat_buffer.overlay(character['user_id'], character)
     return None
 
 def update_character_image(user_id, image_url):
@@ -611,125 +1158,273 @@ def update_character_guild(user_id, new_guild_id, new_channel_id):
     """Atualiza o guild_id e channel_id de um personagem durante a migração."""
     with db_cursor() as cursor:
         cursor.execute("UPDATE characters SET guild_id = ?, channel_id = ? WHERE user_id = ?", (new_guild_id, new_channel_id, user_id))
+        _after_commit(_leaderboards.update, user_id, {'guild_id': new_guild_id})
         return cursor.rowcount > 0
 
 
 def update_character_stats(user_id, updates):
     """Atualiza múltiplos status de um personagem (level, xp, atributos)."""
-    with db_cursor() as cursor:
-        set_clause = ", ".join([f"{key} = ?" for key in updates.keys()])
-        values = list(updates.values())
-        values.append(user_id)
-        
-        query = f"UPDATE characters SET {set_clause} WHERE user_id = ?" # nosec
-        
-        cursor.execute(query, tuple(values))
-        return cursor.rowcount > 0
+    with _stat_buffer.write_lock:
+        with db_cursor() as cursor:
+            set_clause = ", ".join([f"{key} = ?" for key in updates.keys()])
+            values = list(updates.values())
+            values.append(user_id)
+            
+            query = f"UPDATE characters SET {set_clause} WHERE user_id = ?" # nosec
+            
+            cursor.execute(query, tuple(values))
+            updated = cursor.rowcount > 0
+        # Valores pendentes no buffer para as mesmas colunas ficaram obsoletos
+        # (e voltam para o buffer se a transação em andamento for desfeita)
+        discarded = _stat_buffer.discard(user_id, updates.keys())
+        _after_rollback(_stat_buffer.restore, user_id, discarded)
+        if not LEADERBOARD_COLUMNS.isdisjoint(updates):
+            _after_commit(_leaderboards.update, user_id, dict(updates))
+        return updated
+
+# --- Buffer de Escrita de Status (write-behind) ---
+# Atualizações frequentes (MP a cada habilidade, recompensas de batalha) ficam em memória e são
+# gravadas juntas no fim da batalha, pela tarefa periódica do main.py ou ao desligar o bot.
+# Quanto menor o intervalo, menos progresso se perde se o processo cair sem gravar.
+STAT_BUFFER_FLUSH_INTERVAL = 30.0 # Segundos
+
+class CharacterStatBuffer:
+    """Guarda, por personagem, os valores de colunas ainda não gravados no banco."""
+
+    def __init__(self):
+        self._pending = {} # {user_id: {coluna: valor}}
+        self._lock = threading.Lock()
+        # Impede que uma gravação direta e um flush do buffer se intercalem
+        self.write_lock = threading.RLock()
+        self.stats = {"buffered": 0, "flushes": 0, "rows_written": 0}
+
+    def add(self, user_id, updates):
+        with self._lock:
+            self._pending.setdefault(user_id, {}).update(updates)
+            self.stats["buffered"] += 1
+
+    def overlay(self, user_id, character):
+        """Aplica sobre `character` os valores pendentes do personagem."""
+        with self._lock:
+            pending = self._pending.get(user_id)
+            if pending:
+                character.update(pending)
+        return character
+
+    def discard(self, user_id, keys=None):
+        """Descarta valores pendentes (todas as colunas, se `keys` for None). Retorna os valores descartados."""
+        with self._lock:
+            pending = self._pending.get(user_id)
+            if pending is None:
+                return {}
+            if keys is None:
+                return self._pending.pop(user_id)
+            discarded = {key: pending.pop(key) for key in keys if key in pending}
+            if not pending:
+                del self._pending[user_id]
+            return discarded
+
+    def restore(self, user_id, values):
+        """Devolve valores descartados, sem sobrescrever os que foram alterados depois."""
+        if not values:
+            return
+        with self._lock:
+            pending = self._pending.setdefault(user_id, {})
+            for key, value in values.items():
+                pending.setdefault(key, value)
+
+    def snapshot(self, user_id=None):
+        with self._lock:
+            if user_id is not None:
+                return {user_id: dict(self._pending[user_id])} if user_id in self._pending else {}
+            return {uid: dict(updates) for uid, updates in self._pending.items()}
+
+    def confirm(self, written):
+        """Remove do buffer os valores gravados que não foram alterados durante a gravação."""
+        with self._lock:
+            for user_id, updates in written.items():
+                pending = self._pending.get(user_id)
+                if pending is None:
+                    continue
+                for key, value in updates.items():
+                    if key in pending and pending[key] == value:
+                        del pending[key]
+                if not pending:
+                    del self._pending[user_id]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+_stat_buffer = CharacterStatBuffer()
+
+def buffer_character_stats(user_id, updates):
+    """
+    Igual a update_character_stats, mas guarda as alterações em memória.
+    get_character já devolve os novos valores; a gravação acontece em flush_character_stats.
+    """
+    _stat_buffer.add(user_id, updates)
+    if not LEADERBOARD_COLUMNS.isdisjoint(updates):
+        _leaderboards.update(user_id, updates)
+
+def flush_character_stats(user_id=None):
+    """Grava em uma única transação as alterações pendentes (de um personagem ou de todos). Retorna quantos personagens foram gravados."""
+    with _stat_buffer.write_lock:
+        pending = _stat_buffer.snapshot(user_id)
+        if not pending:
+            return 0
+        with db_cursor() as cursor:
+            for uid, updates in pending.items():
+                set_clause = ", ".join([f"{key} = ?" for key in updates.keys()])
+                cursor.execute(f"UPDATE characters SET {set_clause} WHERE user_id = ?", (*updates.values(), uid)) # nosec
+        _stat_buffer.confirm(pending)
+        _stat_buffer.stats["flushes"] += 1
+        _stat_buffer.stats["rows_written"] += len(pending)
+        return len(pending)
+
+def get_stat_buffer_stats():
+    """Retorna contadores do buffer de status e quantos personagens têm alterações pendentes."""
+    return {**_stat_buffer.stats, "pending_characters": len(_stat_buffer)}
 
 def get_random_enemy(player_level):
     """Busca um inimigo aleatório apropriado para o nível do jogador."""
-    with db_cursor() as cursor:
-        cursor.execute(
-            "SELECT * FROM enemies WHERE min_level <= ? AND max_level >= ? ORDER BY RANDOM() LIMIT 1",
-            (player_level, player_level)
-        )
-        enemy_data = cursor.fetchone()
-        if enemy_data:
-            columns = [description[0] for description in cursor.description]
-            return dict(zip(columns, enemy_data))
-    return None
+    enemy = get_game_data().enemy_index.pick(player_level)
+    return dict(enemy) if enemy else None
 
 def get_random_loot(enemy_level):
     """Sorteia um item de loot aleatório."""
-    with db_cursor() as cursor:
-        # Lógica simples de drop: 30% de chance de dropar algo
-        cursor.execute(
-            "SELECT * FROM loot_table WHERE min_level_drop <= ? ORDER BY RANDOM() LIMIT 1",
-            (enemy_level,)
-        )
-        loot_data = cursor.fetchone()
-        if loot_data:
-            columns = [description[0] for description in cursor.description]
-            return dict(zip(columns, loot_data))
-    return None
+    item = get_game_data().loot_index.pick(enemy_level)
+    return dict(item) if item else None
 
 def get_enemies_for_level(player_level):
     """Busca todos os inimigos para o nível do jogador."""
-    with db_cursor() as cursor:
-        cursor.execute("SELECT * FROM enemies WHERE min_level <= ? AND max_level >= ? ORDER BY min_level", (player_level, player_level))
-        enemy_data = cursor.fetchall()
-        columns = [description[0] for description in cursor.description]
-        return [dict(zip(columns, enemy)) for enemy in enemy_data]
+    return [dict(enemy) for enemy in get_game_data().enemy_index.entries_at(player_level)]
 
 def get_all_huntable_enemies(player_level):
     """Busca todos os inimigos que o jogador pode caçar especificamente (nível do jogador > max_level do inimigo)."""
-    with db_cursor() as cursor:
-        cursor.execute("SELECT * FROM enemies WHERE max_level < ? ORDER BY min_level", (player_level,))
-        enemy_data = cursor.fetchall()
-        columns = [description[0] for description in cursor.description]
-        return [dict(zip(columns, enemy)) for enemy in enemy_data]
+    enemies = get_game_data().huntable_enemies.below(player_level)
+    return [dict(enemy) for enemy in sorted(enemies, key=lambda e: e['min_level'])]
 
 def get_enemy_by_name(enemy_name):
     """Busca um inimigo pelo nome (case-insensitive)."""
+    enemy = get_game_data().enemies_by_name.get(enemy_name.lower())
+    return dict(enemy) if enemy else None
+
+# --- Inventário ---
+# Poções e materiais sem aprimoramento ficam em uma única linha por jogador (a "pilha", stackable = 1),
+# garantida pelo índice único idx_inventory_stack. Os demais itens ocupam uma linha por unidade.
+STACKABLE_ITEM_TYPES = ('potion', 'material')
+
+_STACK_UPSERT = """
+    INSERT INTO inventory (character_user_id, item_id, quantity, enhancement_level, stackable) VALUES (?, ?, ?, 0, 1)
+    ON CONFLICT (character_user_id, item_id) WHERE stackable = 1 DO UPDATE SET quantity = quantity + excluded.quantity
+"""
+
+def _is_stacked(item_info, enhancement_level=0):
+    return item_info['item_type'] in STACKABLE_ITEM_TYPES and enhancement_level == 0
+
+def _normalize_inventory_entries(entries):
+    """Converte (user_id, item_id[, quantidade[, aprimoramento]]) em tuplas completas, resolvendo o item pelo cache."""
+    items = get_game_data().items
+    normalized = []
+    for entry in entries:
+        # Completa os valores padrão que faltarem (quantidade 1, aprimoramento 0)
+        user_id, item_id, quantity, enhancement_level = tuple(entry) + (1, 0)[len(entry) - 2:]
+        item_info = items.get(item_id)
+        if item_info is None:
+            raise ValueError(f"Item {item_id} não existe na loot_table.")
+        if quantity > 0:
+            normalized.append((user_id, item_id, quantity, enhancement_level, _is_stacked(item_info, enhancement_level)))
+    return normalized
+
+def _add_items(cursor, entries):
+    """Lógica interna de add_items, reutilizando um cursor existente."""
+    stacks = {}
+    instances = []
+    for user_id, item_id, quantity, enhancement_level, stacked in _normalize_inventory_entries(entries):
+        if stacked:
+            stacks[(user_id, item_id)] = stacks.get((user_id, item_id), 0) + quantity
+        else:
+            instances.extend([(user_id, item_id, enhancement_level)] * quantity)
+    if stacks:
+        cursor.executemany(_STACK_UPSERT, [(user_id, item_id, quantity) for (user_id, item_id), quantity in stacks.items()])
+    if instances:
+        cursor.executemany("INSERT INTO inventory (character_user_id, item_id, quantity, enhancement_level) VALUES (?, ?, 1, ?)", instances)
+    return sum(stacks.values()) + len(instances)
+
+def add_items(entries):
+    """
+    Adiciona vários itens de uma vez, para um ou mais jogadores, em uma única transação.
+    Cada entrada é (user_id, item_id[, quantidade[, aprimoramento]]). Retorna quantas unidades foram adicionadas.
+    """
     with db_cursor() as cursor:
-        cursor.execute("SELECT * FROM enemies WHERE name LIKE ?", (enemy_name,))
-        enemy_data = cursor.fetchone()
-        if enemy_data:
-            columns = [description[0] for description in cursor.description]
-            return dict(zip(columns, enemy_data))
-    return None
+        return _add_items(cursor, entries)
 
 def _add_item_to_inventory(cursor, user_id, item_id, quantity=1, enhancement_level=0):
-    """Lógica interna para adicionar um item, reutilizando um cursor existente. Requer que o item_info seja passado."""
-    item_info = get_item_by_id_with_cursor(item_id, cursor)
-    is_stackable = item_info['item_type'] in ['potion', 'material']
-
-    if is_stackable:
-        cursor.execute("SELECT id, quantity FROM inventory WHERE character_user_id = ? AND item_id = ? AND enhancement_level = 0", (user_id, item_id))
-        existing_item = cursor.fetchone()
-        if existing_item:
-            new_quantity = existing_item[1] + quantity
-            cursor.execute("UPDATE inventory SET quantity = ? WHERE id = ?", (new_quantity, existing_item[0]))
-            return
-
-    # Para itens não empilháveis, aprimorados, ou o primeiro de um stack
-    for _ in range(quantity):
-        cursor.execute(
-            "INSERT INTO inventory (character_user_id, item_id, quantity, enhancement_level) VALUES (?, ?, 1, ?)",
-            (user_id, item_id, enhancement_level)
-        )
+    """Lógica interna para adicionar um item, reutilizando um cursor existente."""
+    _add_items(cursor, [(user_id, item_id, quantity, enhancement_level)])
 
 def add_item_to_inventory(user_id, item_id, quantity=1, enhancement_level=0):
     """Adiciona um item (ou aumenta a quantidade) ao inventário do jogador."""
+    add_items([(user_id, item_id, quantity, enhancement_level)])
+
+def _remove_items(cursor, entries):
+    """Lógica interna de remove_items. Usa um savepoint para desfazer as remoções parciais se faltar algum item."""
+    requested = {}
+    for user_id, item_id, quantity, enhancement_level, stacked in _normalize_inventory_entries(entries):
+        key = (user_id, item_id, enhancement_level, stacked)
+        requested[key] = requested.get(key, 0) + quantity
+    if not requested:
+        return True
+
+    cursor.execute("SAVEPOINT remove_items")
+    removed_ids = {}
+    try:
+        for (user_id, item_id, enhancement_level, stacked), quantity in requested.items():
+            if stacked:
+                cursor.execute(
+                    "UPDATE inventory SET quantity = quantity - ? WHERE character_user_id = ? AND item_id = ? AND stackable = 1 AND quantity >= ?",
+                    (quantity, user_id, item_id, quantity)
+                )
+                if cursor.rowcount == 0:
+                    raise LookupError
+                cursor.execute("DELETE FROM inventory WHERE character_user_id = ? AND item_id = ? AND stackable = 1 AND quantity = 0 RETURNING id", (user_id, item_id))
+                deleted = cursor.fetchall()
+            else: # Itens não empilháveis ou aprimorados: uma linha por unidade
+                cursor.execute("""
+                    DELETE FROM inventory WHERE id IN (
+                        SELECT id FROM inventory WHERE character_user_id = ? AND item_id = ? AND enhancement_level = ? AND stackable = 0 LIMIT ?
+                    ) RETURNING id
+                """, (user_id, item_id, enhancement_level, quantity))
+                deleted = cursor.fetchall()
+                if len(deleted) < quantity:
+                    raise LookupError
+            removed_ids.setdefault(user_id, set()).update(row[0] for row in deleted)
+    except LookupError:
+        cursor.execute("ROLLBACK TO remove_items")
+        cursor.execute("RELEASE remove_items")
+        return False
+    cursor.execute("RELEASE remove_items")
+    for user_id, inventory_ids in removed_ids.items():
+        if inventory_ids:
+            _invalidate_equipment(user_id, inventory_ids)
+    return True
+
+def remove_items(entries):
+    """
+    Remove vários itens de uma vez, no mesmo formato de add_items.
+    É tudo ou nada: se faltar qualquer um dos itens, nada é removido e retorna False.
+    """
     with db_cursor() as cursor:
-        item_info = get_item_by_id_with_cursor(item_id, cursor)
-        _add_item_to_inventory(cursor, user_id, item_id, quantity, enhancement_level) # A lógica de stack já está aqui
+        return _remove_items(cursor, entries)
 
 def _remove_item_from_inventory(cursor, user_id, item_id, quantity=1, enhancement_level=0):
     """Lógica interna para remover um item, reutilizando um cursor existente."""
-    item_info = get_item_by_id(item_id)
-    is_stackable = item_info['item_type'] in ['potion', 'material']
-
-    if is_stackable and enhancement_level == 0:
-        cursor.execute("SELECT id, quantity FROM inventory WHERE character_user_id = ? AND item_id = ? AND enhancement_level = 0", (user_id, item_id))
-        item = cursor.fetchone()
-        if not item or item[1] < quantity: return False
-        if item[1] > quantity:
-            cursor.execute("UPDATE inventory SET quantity = ? WHERE id = ?", (item[1] - quantity, item[0]))
-        else:
-            cursor.execute("DELETE FROM inventory WHERE id = ?", (item[0],))
-    else: # Itens não empilháveis ou aprimorados
-        cursor.execute("SELECT id FROM inventory WHERE character_user_id = ? AND item_id = ? AND enhancement_level = ? LIMIT ?", (user_id, item_id, enhancement_level, quantity))
-        items_to_delete = cursor.fetchall()
-        if len(items_to_delete) < quantity: return False
-        for item_tuple in items_to_delete:
-            cursor.execute("DELETE FROM inventory WHERE id = ?", (item_tuple[0],))
-    return True
+    return _remove_items(cursor, [(user_id, item_id, quantity, enhancement_level)])
 
 def remove_item_from_inventory(user_id, item_id, quantity=1, enhancement_level=0):
     """Remove uma quantidade de um item do inventário. Retorna True se bem-sucedido."""
-    with db_cursor() as cursor:
-        return _remove_item_from_inventory(cursor, user_id, item_id, quantity, enhancement_level)
+    return remove_items([(user_id, item_id, quantity, enhancement_level)])
  
 def get_inventory(user_id):
     """Retorna o inventário de um jogador."""
@@ -742,64 +1437,129 @@ def get_inventory(user_id):
         """, (user_id,))
         return cursor.fetchall()
 
+# --- Busca de Itens ---
+# A busca usa o índice FTS5 loot_search (nome e descrição, sem acentos): cada palavra digitada
+# vale como prefixo ("poc cura" encontra "Poção de Cura"). Sem resultado, tenta nomes parecidos
+# (erros de digitação). Se o SQLite não tiver FTS5, cai para a busca por trecho do nome no cache.
+ITEM_SEARCH_LIMIT = 10
+FUZZY_MATCH_CUTOFF = 0.75 # Semelhança mínima (0 a 1) para aceitar um nome com erro de digitação
+
+def _search_words(text):
+    """Palavras do texto em minúsculas e sem acentos, como o tokenizer do loot_search as vê."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return re.findall(r"\w+", "".join(c for c in text if not unicodedata.combining(c)))
+
+def _item_search_expression(terms, descriptions=False):
+    """Converte as palavras digitadas em uma consulta FTS5, ou None se não houver palavras."""
+    if not terms:
+        return None
+    expression = " ".join(f'"{term}"*' for term in terms)
+    return expression if descriptions else f"name : ({expression})"
+
+def _correct_search_words(terms, vocabulary):
+    """Troca cada palavra que não é prefixo de nenhuma palavra conhecida pela mais parecida. None se alguma não tiver par."""
+    corrected = []
+    for term in terms:
+        if any(word.startswith(term) for word in vocabulary):
+            corrected.append(term)
+            continue
+        close = difflib.get_close_matches(term, vocabulary, n=1, cutoff=FUZZY_MATCH_CUTOFF)
+        if not close:
+            return None
+        corrected.append(close[0])
+    return corrected
+
+def get_matching_items(query, limit=ITEM_SEARCH_LIMIT, item_ids=None, descriptions=False):
+    """
+    Retorna os itens que combinam com `query`, do mais relevante para o menos relevante.
+    Nome idêntico vem primeiro, depois nomes que começam com o texto e então a ordem do bm25.
+    `item_ids` restringe a busca (ex: itens do inventário); `descriptions` também procura nas descrições.
+    """
+    game_data = get_game_data()
+    search = query.lower().strip()
+    candidates = game_data.items if item_ids is None else {i: game_data.items[i] for i in item_ids if i in game_data.items}
+    if not search or not candidates:
+        return []
+
+    def fts_search(terms):
+        sql = "SELECT rowid FROM loot_search WHERE loot_search MATCH ?"
+        params = [_item_search_expression(terms, descriptions)]
+        if item_ids is not None:
+            sql += f" AND rowid IN ({', '.join('?' * len(candidates))})"
+            params.extend(candidates)
+        sql += " ORDER BY bm25(loot_search, 10.0, 1.0)" # O nome pesa 10x mais que a descrição
+        with db_cursor() as cursor:
+            cursor.execute(sql, params) # nosec
+            return [candidates[row[0]] for row in cursor.fetchall() if row[0] in candidates]
+
+    terms = _search_words(search)
+    if game_data.item_search and terms:
+        ranked = fts_search(terms)
+        if not ranked:
+            corrected = _correct_search_words(terms, game_data.item_words)
+            if corrected and corrected != terms:
+                ranked = fts_search(corrected)
+    else: # Sem FTS5: trecho do nome, como antes, ou o nome mais parecido
+        ranked = [item for item in candidates.values() if search in item['name'].lower()]
+        if not ranked:
+            names = {item['name'].lower(): item for item in candidates.values()}
+            ranked = [names[name] for name in difflib.get_close_matches(search, names, n=3, cutoff=FUZZY_MATCH_CUTOFF)]
+
+    # sorted é estável: dentro de cada grupo a ordem de relevância anterior é mantida
+    ranked = sorted(ranked, key=lambda item: 0 if item['name'].lower() == search else 1 if item['name'].lower().startswith(search) else 2)
+    return [dict(item) for item in (ranked[:limit] if limit else ranked)]
+
 def get_item_by_name(item_name):
-    """Busca um item na loot_table pelo nome."""
-    with db_cursor() as cursor:
-        cursor.execute("SELECT * FROM loot_table WHERE name LIKE ?", (f'%{item_name}%',))
-        item_data = cursor.fetchone()
-        if item_data:
-            columns = [description[0] for description in cursor.description]
-            return dict(zip(columns, item_data))
-    return None
+    """Busca um item na loot_table pelo nome (exato ou o resultado mais relevante da busca)."""
+    item = get_game_data().items_by_name.get(item_name.lower().strip())
+    if item is not None:
+        return dict(item)
+    matches = get_matching_items(item_name, limit=1)
+    return matches[0] if matches else None
+
+def match_inventory_items(inventory, query):
+    """
+    Filtra as linhas de get_inventory cujo item combina com `query`, ordenadas pela relevância do item.
+    Linhas do mesmo item ficam juntas, na ordem original do inventário.
+    """
+    item_ids = {row[1] for row in inventory}
+    order = {item['id']: rank for rank, item in enumerate(get_matching_items(query, limit=None, item_ids=item_ids))}
+    return sorted((row for row in inventory if row[1] in order), key=lambda row: order[row[1]])
 
 def get_item_by_id(item_id):
     """Busca um item na loot_table pelo ID."""
-    with db_cursor() as cursor:
-        cursor.execute("SELECT * FROM loot_table WHERE id = ?", (item_id,))
-        item_data = cursor.fetchone()
-        if item_data:
-            columns = [description[0] for description in cursor.description]
-            return dict(zip(columns, item_data))
-    return None
+    item = get_game_data().items.get(item_id)
+    return dict(item) if item else None
 
 def unify_stackable_items(user_id):
-    """Unifica itens empilháveis duplicados no inventário de um jogador."""
+    """
+    Junta na pilha do jogador as poções e materiais que ainda estão em linhas separadas
+    (itens cujo tipo mudou depois de entrarem no inventário). Retorna quantos tipos de item foram unificados.
+    """
     with db_cursor() as cursor:
-        # 1. Encontra todos os item_id empilháveis que o jogador possui e que estão duplicados
-        cursor.execute("""
-            SELECT item_id
-            FROM inventory
-            WHERE character_user_id = ? AND enhancement_level = 0 AND item_id IN (
-                SELECT id FROM loot_table WHERE item_type IN ('potion', 'material')
-            )
-            GROUP BY item_id
-            HAVING COUNT(id) > 1
-        """, (user_id,))
-        items_to_unify = cursor.fetchall()
-
-        if not items_to_unify:
+        # Soma as linhas soltas na pilha (criando-a se necessário) e depois as remove, sem laço por item
+        cursor.execute(f"""
+            INSERT INTO inventory (character_user_id, item_id, quantity, enhancement_level, stackable)
+            SELECT character_user_id, item_id, SUM(quantity), 0, 1 FROM inventory
+            WHERE character_user_id = ? AND enhancement_level = 0 AND stackable = 0
+              AND item_id IN (SELECT id FROM loot_table WHERE item_type IN {STACKABLE_ITEM_TYPES})
+            GROUP BY character_user_id, item_id
+            ON CONFLICT (character_user_id, item_id) WHERE stackable = 1 DO UPDATE SET quantity = quantity + excluded.quantity
+        """, (user_id,)) # nosec
+        unified = cursor.rowcount
+        if unified <= 0:
             return 0
-
-        for item_tuple in items_to_unify:
-            item_id = item_tuple[0]
-            # 2. Soma a quantidade total e deleta as entradas antigas
-            cursor.execute("SELECT SUM(quantity) FROM inventory WHERE character_user_id = ? AND item_id = ?", (user_id, item_id))
-            total_quantity = cursor.fetchone()[0]
-            cursor.execute("DELETE FROM inventory WHERE character_user_id = ? AND item_id = ?", (user_id, item_id))
-            # 3. Insere uma nova entrada unificada
-            cursor.execute("INSERT INTO inventory (character_user_id, item_id, quantity) VALUES (?, ?, ?)", (user_id, item_id, total_quantity))
-        
-        return len(items_to_unify)
+        cursor.execute(f"""
+            DELETE FROM inventory WHERE character_user_id = ? AND enhancement_level = 0 AND stackable = 0
+              AND item_id IN (SELECT id FROM loot_table WHERE item_type IN {STACKABLE_ITEM_TYPES})
+            RETURNING id
+        """, (user_id,)) # nosec
+        _invalidate_equipment(user_id, {row[0] for row in cursor.fetchall()})
+        return unified
 
 def get_item_by_id_with_cursor(item_id, cursor):
-    """Busca um item na loot_table pelo ID usando um cursor existente."""
-    cursor.execute("SELECT * FROM loot_table WHERE id = ?", (item_id,))
-    item_data = cursor.fetchone()
-    if item_data:
-        columns = [description[0] for description in cursor.description]
-        return dict(zip(columns, item_data))
-    return None
-
+    """Busca um item na loot_table pelo ID. Mantido por compatibilidade: o cursor não é mais necessário, pois o item vem do cache."""
+    return get_item_by_id(item_id)
 
 def get_shop_items(category=None, page=1, per_page=5):
     """Retorna itens da loja com filtro de categoria e paginação."""
@@ -832,70 +1592,145 @@ def count_shop_items(category=None):
         count = cursor.fetchone()[0]
         return count
 
-def get_equipped_items(user_id):
-    """Retorna os itens equipados por um jogador e seus bônus totais."""
-    with db_cursor() as cursor:
-        cursor.execute("SELECT * FROM equipment WHERE character_user_id = ?", (user_id,))
-        equipped_data = cursor.fetchone()
-        if not equipped_data:
-            return {}, {"attack": 0, "defense": 0}
-
-        columns = [description[0] for description in cursor.description]
-        equipped_dict = dict(zip(columns, equipped_data))
-
-        total_attack_bonus = 0
-        total_defense_bonus = 0
-        equipped_item_details = {}
+# Colunas da tabela equipment, na ordem em que os bônus especiais são aplicados
+EQUIPMENT_SLOTS = ["helmet_id", "chest_id", "legs_id", "right_hand_id", "left_hand_id", "ring_id"]
+ENHANCEABLE_EFFECTS = ['LIFESTEAL_PERCENT', 'GOLD_BONUS_PERCENT', 'XP_BONUS_PERCENT', 'CRIT_CHANCE_PERCENT', 'MP_REGEN_FLAT']
 
-        # Busca por bônus especiais
-        special_bonuses = {}
-        duration_bonuses = {}
+class EquipmentBonusCache:
+    """
+    Guarda por jogador o resultado de get_equipped_items (nomes exibidos e bônus totais).
+    É invalidado ao equipar, desequipar ou remover do inventário um item equipado.
+    """
 
-        for slot, inventory_id in equipped_dict.items():
-            if inventory_id and slot != 'character_user_id':
-                # Pega os detalhes do item e seu aprimoramento
-                cursor.execute("""
-                    SELECT l.name, l.attack_bonus, l.defense_bonus, l.effect_type, l.effect_value, l.effect_duration, i.enhancement_level
-                    FROM inventory i
-                    JOIN loot_table l ON i.item_id = l.id
-                    WHERE i.id = ?
-                """, (inventory_id,))
-                item_details = cursor.fetchone()
-                if item_details:
-                    name, attack, defense, effect_type, effect_value, effect_duration, enhancement = item_details
-                    
-                    # Calcula o bônus do aprimoramento (15% por nível)
-                    final_attack = round(attack * (1 + 0.15 * enhancement))
-                    final_defense = round(defense * (1 + 0.15 * enhancement))
-
-                    display_name = f"{name} +{enhancement}" if enhancement > 0 else name
-                    equipped_item_details[slot] = display_name
-                    total_attack_bonus += final_attack
-                    total_defense_bonus += final_defense
-
-                    if effect_type:
-                        # Aplica bônus de aprimoramento a efeitos especiais
-                        # Bônus de 10% por nível para efeitos especiais
-                        final_effect_value = effect_value
-                        if enhancement > 0 and effect_type in ['LIFESTEAL_PERCENT', 'GOLD_BONUS_PERCENT', 'XP_BONUS_PERCENT', 'CRIT_CHANCE_PERCENT', 'MP_REGEN_FLAT']:
-                            final_effect_value = round(effect_value * (1 + 0.10 * enhancement))
-                            # Adiciona um indicador visual ao nome do item na ficha para mostrar o bônus
-                            equipped_item_details[slot] = f"{display_name} ({final_effect_value}%)" if '%' in effect_type else f"{display_name} (+{final_effect_value})"
-
-                        special_bonuses[effect_type] = final_effect_value
-                        if effect_duration:
-                            duration_bonuses[effect_type] = effect_duration
-            else:
-                equipped_item_details[slot] = "Vazio"
-        
-        bonuses = {
-            "attack": total_attack_bonus, 
-            "defense": total_defense_bonus,
-            "special": special_bonuses,
-            "duration": duration_bonuses
-        }
+    def __init__(self):
+        self._entries = {} # {user_id: (detalhes, bônus, ids de inventário equipados)}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            self.stats["hits" if entry else "misses"] += 1
+            return entry
+
+    def put(self, user_id, entry):
+        with self._lock:
+            self._entries[user_id] = entry
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.stats["invalidations"] += 1
+
+    def invalidate_if_equipped(self, user_id, inventory_ids):
+        """Invalida o jogador apenas se algum dos itens removidos estava equipado."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and not entry[2].isdisjoint(inventory_ids):
+                del self._entries[user_id]
+                self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+_equipment_cache = EquipmentBonusCache()
+
+_EQUIPPED_ITEMS_QUERY = """
+    SELECT s.slot, s.inventory_id, i.id, l.name, l.attack_bonus, l.defense_bonus,
+           l.effect_type, l.effect_value, l.effect_duration, i.enhancement_level
+    FROM ({slots}) s
+    LEFT JOIN inventory i ON i.id = s.inventory_id
+    LEFT JOIN loot_table l ON l.id = i.item_id
+    ORDER BY s.position
+""".format(slots=" UNION ALL ".join(
+    f"SELECT '{slot}' AS slot, {slot} AS inventory_id, {position} AS position FROM equipment WHERE character_user_id = :user_id"
+    for position, slot in enumerate(EQUIPMENT_SLOTS)
+))
+
+def _load_equipped_items(cursor, user_id):
+    """Calcula os itens equipados e os bônus totais com uma única consulta."""
+    cursor.execute(_EQUIPPED_ITEMS_QUERY, {"user_id": user_id})
+    rows = cursor.fetchall()
+    if not rows:
+        return {}, {"attack": 0, "defense": 0}, frozenset()
+
+    total_attack_bonus = 0
+    total_defense_bonus = 0
+    equipped_item_details = {}
+    equipped_ids = set()
+
+    # Busca por bônus especiais
+    special_bonuses = {}
+    duration_bonuses = {}
+
+    for slot, inventory_id, found_id, name, attack, defense, effect_type, effect_value, effect_duration, enhancement in rows:
+        if not inventory_id:
+            equipped_item_details[slot] = "Vazio"
+            continue
+        equipped_ids.add(inventory_id)
+        if found_id is None:
+            continue # O item equipado não existe mais no inventário
+
+        # Calcula o bônus do aprimoramento (15% por nível)
+        final_attack = round(attack * (1 + 0.15 * enhancement))
+        final_defense = round(defense * (1 + 0.15 * enhancement))
+
+        display_name = f"{name} +{enhancement}" if enhancement > 0 else name
+        equipped_item_details[slot] = display_name
+        total_attack_bonus += final_attack
+        total_defense_bonus += final_defense
+
+        if effect_type:
+            # Aplica bônus de aprimoramento a efeitos especiais
+            # Bônus de 10% por nível para efeitos especiais
+            final_effect_value = effect_value
+            if enhancement > 0 and effect_type in ENHANCEABLE_EFFECTS:
+                final_effect_value = round(effect_value * (1 + 0.10 * enhancement))
+                # Adiciona um indicador visual ao nome do item na ficha para mostrar o bônus
+                equipped_item_details[slot] = f"{display_name} ({final_effect_value}%)" if '%' in effect_type else f"{display_name} (+{final_effect_value})"
+
+            special_bonuses[effect_type] = final_effect_value
+            if effect_duration:
+                duration_bonuses[effect_type] = effect_duration
+
+    bonuses = {
+        "attack": total_attack_bonus, 
+        "defense": total_defense_bonus,
+        "special": special_bonuses,
+        "duration": duration_bonuses
+    }
+    return equipped_item_details, bonuses, frozenset(equipped_ids)
+
+def _invalidate_equipment(user_id, inventory_ids=None):
+    """
+    Invalida o cache de equipamento do jogador (ou só se algum dos `inventory_ids` estiver equipado).
+    Dentro de transaction() invalida de novo ao final, pois outra thread pode ter lido o estado antigo antes do commit.
+    """
+    if inventory_ids is None:
+        _equipment_cache.invalidate(user_id)
+        if in_transaction():
+            _local.after_commit.append((_equipment_cache.invalidate, (user_id,)))
+        return
+    _equipment_cache.invalidate_if_equipped(user_id, inventory_ids)
+    if in_transaction():
+        _local.after_commit.append((_equipment_cache.invalidate_if_equipped, (user_id, inventory_ids)))
 
-        return equipped_item_details, bonuses
+def get_equipped_items(user_id):
+    """Retorna os itens equipados por um jogador e seus bônus totais."""
+    entry = _equipment_cache.get(user_id)
+    if entry is None:
+        with db_cursor() as cursor:
+            entry = _load_equipped_items(cursor, user_id)
+        if not in_transaction(): # Leituras de uma transação ainda não confirmada não vão para o cache
+            _equipment_cache.put(user_id, entry)
+    # Cópias, para que quem chama possa alterar os dicionários sem afetar o cache
+    details, bonuses, _ = entry
+    return dict(details), copy.deepcopy(bonuses)
+
+def get_equipment_cache_stats():
+    """Retorna acertos, falhas e invalidações do cache de bônus de equipamento."""
+    return dict(_equipment_cache.stats)
 
 def equip_item(user_id, inventory_id, slot):
     """Equipa um item em um slot específico, desequipando o anterior se houver."""
@@ -910,6 +1745,7 @@ def equip_item(user_id, inventory_id, slot):
         except sqlite3.Error as e:
             print(f"Erro ao equipar item: {e}")
             return False
+    _invalidate_equipment(user_id)
     return True
 
 def unequip_item(user_id, slot):
@@ -918,20 +1754,14 @@ def unequip_item(user_id, slot):
     with db_cursor() as cursor:
         # A query usa f-string de forma segura, pois 'slot' é validado no comando.
         cursor.execute(f"UPDATE equipment SET {slot} = NULL WHERE character_user_id = ?", (user_id,)) # nosec
-        return cursor.rowcount > 0
+        unequipped = cursor.rowcount > 0
+    _invalidate_equipment(user_id)
+    return unequipped
 
 def get_character_skills(class_name, level):
     """Retorna as habilidades disponíveis para uma classe e nível."""
-    with db_cursor() as cursor:
-        cursor.execute(
-            "SELECT * FROM skills WHERE class_restriction = ? AND min_level <= ?",
-            (class_name, level)
-        )
-        skills_data = cursor.fetchall()
-        if skills_data:
-            columns = [description[0] for description in cursor.description]
-            return [dict(zip(columns, skill)) for skill in skills_data]
-    return []
+    skills = get_game_data().skills_by_class.get(class_name, [])
+    return [dict(skill) for skill in skills if skill['min_level'] <= level]
 
 def get_available_quests(user_id, quest_type):
     """Retorna missões disponíveis (diárias/semanais) que o jogador ainda não aceitou."""
@@ -949,7 +1779,7 @@ def get_available_quests(user_id, quest_type):
         return [dict(zip(columns, quest)) for quest in quests_data]
 
 def get_player_active_quests(user_id):
-    """Retorna as missões ativas de um jogador com seu progresso."""
+    """Retorna as missões ativas de um jogador com seu progresso (incluindo o ainda não gravado)."""
     with db_cursor() as cursor:
         cursor.execute("""
             SELECT q.id, q.name, q.description, pq.progress, q.objective_quantity, q.objective_target
@@ -959,7 +1789,11 @@ def get_player_active_quests(user_id):
         """, (user_id,))
         quests_data = cursor.fetchall()
         columns = [description[0] for description in cursor.description]
-        return [dict(zip(columns, quest)) for quest in quests_data]
+        quests = [dict(zip(columns, quest)) for quest in quests_data]
+    pending = _quest_progress.pending(user_id)
+    for quest in quests:
+        quest['progress'] += pending.get(quest['id'], 0)
+    return quests
 
 def get_quest_by_id(quest_id):
     """Busca uma missão pelo seu ID."""
@@ -971,29 +1805,166 @@ def get_quest_by_id(quest_id):
             return dict(zip(columns, quest_data))
     return None
 
+# --- Índice de Objetivos de Missão ---
+# Cada vitória e cada !work informam um evento (tipo, alvo). Em vez de um UPDATE com subconsulta
+# por evento, os objetivos das missões ativas de cada jogador ficam em memória: eventos sem missão
+# correspondente custam uma busca em dicionário, e o progresso acumulado é gravado em lote por
+# flush_quest_progress (mesma tarefa periódica do buffer de status, e ao desligar o bot).
+
+class QuestProgressIndex:
+    """
+    Objetivos ativos por jogador, {user_id: {(objective_type, objective_target): [missão]}}, carregados
+    de player_quests no primeiro evento do jogador. Cada missão guarda o progresso total (gravado +
+    pendente) e o pendente, que ainda não foi gravado.
+    """
+
+    def __init__(self):
+        self._players = {}
+        self._lock = threading.Lock()
+        self.stats = {"events": 0, "misses": 0, "loads": 0, "flushes": 0, "rows_written": 0}
+
+    @staticmethod
+    def _load(user_id):
+        with db_cursor() as cursor:
+            cursor.execute("""
+                SELECT q.id, q.name, q.objective_type, q.objective_target, q.objective_quantity, pq.progress
+                FROM player_quests pq
+                JOIN quests q ON pq.quest_id = q.id
+                WHERE pq.character_user_id = ?
+            """, (user_id,))
+            rows = cursor.fetchall()
+        objectives = {}
+        for quest_id, name, objective_type, objective_target, quantity, progress in rows:
+            objectives.setdefault((objective_type, objective_target), []).append({
+                'id': quest_id, 'name': name, 'objective_quantity': quantity, 'progress': progress, 'pending': 0
+            })
+        return objectives
+
+    def record(self, user_id, objective_type, target_name, quantity):
+        """Soma `quantity` às missões do jogador com esse objetivo. Retorna as que acabaram de ser completadas."""
+        with self._lock:
+            self.stats["events"] += 1
+            objectives = self._players.get(user_id)
+        if objectives is None:
+            loaded = self._load(user_id)
+            with self._lock:
+                objectives = self._players.setdefault(user_id, loaded)
+                self.stats["loads"] += 1
+        with self._lock:
+            quests = objectives.get((objective_type, target_name))
+            if not quests:
+                self.stats["misses"] += 1
+                return []
+            completed = []
+            for quest in quests:
+                was_complete = quest['progress'] >= quest['objective_quantity']
+                quest['progress'] += quantity
+                quest['pending'] += quantity
+                if not was_complete and quest['progress'] >= quest['objective_quantity']:
+                    completed.append({'id': quest['id'], 'name': quest['name'],
+                                      'objective_quantity': quest['objective_quantity']})
+            return completed
+
+    def pending(self, user_id):
+        """{quest_id: progresso ainda não gravado} do jogador."""
+        with self._lock:
+            objectives = self._players.get(user_id, {})
+            return {quest['id']: quest['pending'] for quests in objectives.values() for quest in quests if quest['pending']}
+
+    def accept(self, user_id, quest):
+        """Adiciona uma missão recém-aceita, se os objetivos do jogador já estiverem em memória."""
+        with self._lock:
+            objectives = self._players.get(user_id)
+            if objectives is not None:
+                objectives.setdefault((quest['objective_type'], quest['objective_target']), []).append({
+                    'id': quest['id'], 'name': quest['name'], 'objective_quantity': quest['objective_quantity'],
+                    'progress': 0, 'pending': 0
+                })
+
+    def remove(self, user_id, quest_id):
+        """Esquece uma missão entregue (o progresso pendente dela deixa de importar)."""
+        with self._lock:
+            for quests in self._players.get(user_id, {}).values():
+                quests[:] = [quest for quest in quests if quest['id'] != quest_id]
+
+    def forget(self, user_id):
+        with self._lock:
+            self._players.pop(user_id, None)
+
+    def drain(self, clear=False):
+        """Retorna [(quantidade, user_id, quest_id)] pendentes e os zera. Com `clear`, esvazia o índice."""
+        with self._lock:
+            rows = []
+            for user_id, objectives in self._players.items():
+                for quests in objectives.values():
+                    for quest in quests:
+                        if quest['pending']:
+                            rows.append((quest['pending'], user_id, quest['id']))
+                            quest['pending'] = 0
+            if clear:
+                self._players.clear()
+            return rows
+
+    def restore(self, rows):
+        """Devolve ao pendente o que não pôde ser gravado."""
+        with self._lock:
+            for quantity, user_id, quest_id in rows:
+                for quests in self._players.get(user_id, {}).values():
+                    for quest in quests:
+                        if quest['id'] == quest_id:
+                            quest['pending'] += quantity
+
+_quest_progress = QuestProgressIndex()
+
+def _write_quest_progress(cursor, rows):
+    cursor.executemany("UPDATE player_quests SET progress = progress + ? WHERE character_user_id = ? AND quest_id = ?", rows)
+
 def accept_quest(user_id, quest_id):
     """Associa uma missão a um jogador."""
     with db_cursor() as cursor:
         cursor.execute("INSERT INTO player_quests (character_user_id, quest_id) VALUES (?, ?)", (user_id, quest_id))
-        return cursor.rowcount > 0
+        accepted = cursor.rowcount > 0
+        cursor.execute("SELECT id, name, objective_type, objective_target, objective_quantity FROM quests WHERE id = ?", (quest_id,))
+        quest = cursor.fetchone()
+    if accepted and quest:
+        columns = ('id', 'name', 'objective_type', 'objective_target', 'objective_quantity')
+        _after_commit(_quest_progress.accept, user_id, dict(zip(columns, quest)))
+    return accepted
 
 def update_quest_progress(user_id, objective_type, target_name, quantity=1):
-    """Atualiza o progresso de uma missão ativa."""
-    with db_cursor() as cursor:
-        # Encontra a missão ativa correspondente
-        cursor.execute("""
-            UPDATE player_quests 
-            SET progress = progress + ?
-            WHERE character_user_id = ? AND quest_id IN (
-                SELECT id FROM quests WHERE objective_type = ? AND objective_target = ?
-            )
-        """, (quantity, user_id, objective_type, target_name))
+    """
+    Soma progresso às missões ativas com esse objetivo (em memória; gravado por flush_quest_progress).
+    Retorna as missões que acabaram de ser completadas, para avisar o jogador na hora.
+    """
+    return _quest_progress.record(user_id, objective_type, target_name, quantity)
+
+def flush_quest_progress():
+    """Grava em uma única transação o progresso de missões acumulado em memória. Retorna quantas linhas foram gravadas."""
+    rows = _quest_progress.drain()
+    if not rows:
+        return 0
+    try:
+        with db_cursor() as cursor:
+            _write_quest_progress(cursor, rows)
+    except Exception:
+        _quest_progress.restore(rows)
+        raise
+    _quest_progress.stats["flushes"] += 1
+    _quest_progress.stats["rows_written"] += len(rows)
+    return len(rows)
+
+def get_quest_progress_stats():
+    """Retorna os contadores do índice de objetivos de missão."""
+    return dict(_quest_progress.stats)
 
 def complete_quest(user_id, quest_id):
     """Remove uma missão da lista de ativas do jogador."""
     with db_cursor() as cursor:
         cursor.execute("DELETE FROM player_quests WHERE character_user_id = ? AND quest_id = ?", (user_id, quest_id))
-        return cursor.rowcount > 0
+        completed = cursor.rowcount > 0
+    if completed:
+        _after_commit(_quest_progress.remove, user_id, quest_id)
+    return completed
 
 def get_server_state(key):
     """Busca um valor de estado do servidor."""
@@ -1010,6 +1981,8 @@ def set_server_state(key, value):
 def reset_player_quests_by_type(quest_type):
     """Remove o progresso de todas as missões de um certo tipo para todos os jogadores."""
     with db_cursor() as cursor:
+        # Grava o progresso pendente das outras missões e recarrega o índice sob demanda depois
+        _write_quest_progress(cursor, _quest_progress.drain(clear=True))
         cursor.execute("""
             DELETE FROM player_quests
             WHERE quest_id IN (SELECT id FROM quests WHERE type = ?)
@@ -1042,20 +2015,12 @@ def get_all_guilds():
 
 def get_all_jobs():
     """Retorna todas as profissões disponíveis."""
-    with db_cursor() as cursor:
-        cursor.execute("SELECT * FROM jobs ORDER BY level_req")
-        columns = [desc[0] for desc in cursor.description]
-        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return sorted((dict(job) for job in get_game_data().jobs.values()), key=lambda j: j['level_req'])
 
 def get_job_by_id(job_id):
     """Retorna os detalhes de uma profissão pelo ID."""
-    with db_cursor() as cursor:
-        cursor.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
-        row = cursor.fetchone()
-        if row:
-            columns = [desc[0] for desc in cursor.description]
-            return dict(zip(columns, row))
-    return None
+    job = get_game_data().jobs.get(job_id)
+    return dict(job) if job else None
 
 def set_player_job(user_id, job_id):
     """Define o emprego de um jogador e atualiza os timestamps."""
@@ -1106,8 +2071,9 @@ def get_market_listings(page=1, per_page=10, search_term=None):
         """
         params = []
         if search_term:
-            query += " WHERE l.name LIKE ?"
-            params.append(f"%{search_term}%")
+            item_ids = [item['id'] for item in get_matching_items(search_term, limit=None, descriptions=True)]
+            query += f" WHERE m.item_id IN ({', '.join('?' * len(item_ids))})"
+            params.extend(item_ids)
         
         offset = (page - 1) * per_page
         query += " ORDER BY m.listed_at DESC LIMIT ? OFFSET ?"
@@ -1122,8 +2088,9 @@ def count_market_listings(search_term=None):
         query = "SELECT COUNT(*) FROM market_listings"
         params = []
         if search_term:
-            query += " m JOIN loot_table l ON m.item_id = l.id WHERE l.name LIKE ?"
-            params.append(f"%{search_term}%")
+            item_ids = [item['id'] for item in get_matching_items(search_term, limit=None, descriptions=True)]
+            query += f" WHERE item_id IN ({', '.join('?' * len(item_ids))})"
+            params.extend(item_ids)
         
         cursor.execute(query, tuple(params))
         return cursor.fetchone()[0]
@@ -1153,21 +2120,227 @@ def remove_market_listing(listing_id):
         cursor.execute("DELETE FROM market_listings WHERE id = ?", (listing_id,))
         return cursor.rowcount > 0
 
-def get_leaderboard(sort_by='level', limit=10):
-    """Busca dados para o placar de líderes."""
+def update_market_listing_quantity(listing_id, quantity):
+    """Atualiza a quantidade restante de um anúncio parcialmente vendido, mantendo seu ID e data."""
     with db_cursor() as cursor:
-        if sort_by == 'level':
-            query = "SELECT name, level, experience FROM characters ORDER BY level DESC, experience DESC LIMIT ?"
-        elif sort_by == 'pvp':
-            # Calcula o score como (vitórias - derrotas)
-            query = "SELECT name, pvp_wins, pvp_losses, (pvp_wins - pvp_losses) as score FROM characters ORDER BY score DESC, pvp_wins DESC LIMIT ?"
-        else:
-            return []
-        
-        cursor.execute(query, (limit,))
+        cursor.execute("UPDATE market_listings SET quantity = ? WHERE id = ?", (quantity, listing_id))
+        return cursor.rowcount > 0
+
+def get_all_market_listings():
+    """Retorna todos os anúncios de vendedores existentes, para montar o livro de ofertas em memória."""
+    with db_cursor() as cursor:
+        cursor.execute("""
+            SELECT m.* FROM market_listings m
+            JOIN characters c ON m.seller_id = c.user_id
+        """)
         columns = [description[0] for description in cursor.description]
         return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
+def create_market_buy_order(buyer_id, item_id, quantity, price, enhancement_level):
+    """Cria uma ordem de compra. O ouro reservado deve ser descontado pelo chamador na mesma transação."""
+    with db_cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO market_buy_orders (buyer_id, item_id, quantity, price, enhancement_level) VALUES (?, ?, ?, ?, ?)",
+            (buyer_id, item_id, quantity, price, enhancement_level)
+        )
+        return cursor.lastrowid
+
+def get_market_buy_order_by_id(order_id):
+    """Busca uma ordem de compra pelo ID."""
+    with db_cursor() as cursor:
+        cursor.execute("SELECT * FROM market_buy_orders WHERE id = ?", (order_id,))
+        order_data = cursor.fetchone()
+        if order_data:
+            columns = [description[0] for description in cursor.description]
+            return dict(zip(columns, order_data))
+    return None
+
+def update_market_buy_order_quantity(order_id, quantity):
+    """Atualiza a quantidade restante de uma ordem de compra parcialmente atendida."""
+    with db_cursor() as cursor:
+        cursor.execute("UPDATE market_buy_orders SET quantity = ? WHERE id = ?", (quantity, order_id))
+        return cursor.rowcount > 0
+
+def remove_market_buy_order(order_id):
+    """Remove uma ordem de compra (atendida ou cancelada)."""
+    with db_cursor() as cursor:
+        cursor.execute("DELETE FROM market_buy_orders WHERE id = ?", (order_id,))
+        return cursor.rowcount > 0
+
+def get_all_market_buy_orders():
+    """Retorna todas as ordens de compra de compradores existentes."""
+    with db_cursor() as cursor:
+        cursor.execute("""
+            SELECT o.* FROM market_buy_orders o
+            JOIN characters c ON o.buyer_id = c.user_id
+        """)
+        columns = [description[0] for description in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def get_character_names(user_ids):
+    """Retorna {user_id: nome} dos personagens informados, em uma única consulta."""
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return {}
+    with db_cursor() as cursor:
+        placeholders = ", ".join("?" * len(user_ids))
+        cursor.execute(f"SELECT user_id, name FROM characters WHERE user_id IN ({placeholders})", user_ids) # nosec
+        return dict(cursor.fetchall())
+
+# O livro de ofertas em memória (market_system.py) é a única outra fonte de escrita no mercado.
+# Alterações feitas por fora dele (ex: exclusão de personagem) mudam a geração, forçando uma recarga.
+_market_generation = 0
+
+def invalidate_market():
+    """Avisa o livro de ofertas em memória que o mercado foi alterado fora dele."""
+    global _market_generation
+    _market_generation += 1
+
+def get_market_generation():
+    return _market_generation
+
+# --- Placar de Líderes ---
+# Os rankings ficam em memória e são atualizados a cada alteração de nível, XP ou PvP
+# (update_character_stats, buffer_character_stats, criação, exclusão e migração de servidor),
+# em vez de ordenar a tabela characters a cada !leaderboard.
+
+# Chave de ordenação de cada ranking: a menor chave é o primeiro colocado
+LEADERBOARD_KEYS = {
+    'level': lambda user_id, e: (-e['level'], -e['experience'], user_id),
+    'pvp': lambda user_id, e: (-(e['pvp_wins'] - e['pvp_losses']), -e['pvp_wins'], user_id),
+}
+LEADERBOARD_COLUMNS = frozenset(('level', 'experience', 'pvp_wins', 'pvp_losses'))
+
+class LeaderboardCache:
+    """
+    Um RankedIndex por ranking, global e por servidor, com a posição de cada jogador em O(log n).
+    É carregado do banco na primeira consulta; até lá, as atualizações são ignoradas
+    (a carga lê os valores já gravados e os pendentes no buffer de status).
+    """
+
+    def __init__(self):
+        self._entries = {} # {user_id: {'name', 'guild_id', 'level', 'experience', 'pvp_wins', 'pvp_losses'}}
+        self._indexes = {} # {(ranking, guild_id ou None): RankedIndex}
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def _load(self):
+        with db_cursor() as cursor:
+            cursor.execute("SELECT user_id, guild_id, name, level, experience, pvp_wins, pvp_losses FROM characters")
+            rows = cursor.fetchall()
+        pending = _stat_buffer.snapshot()
+        self._entries = {}
+        for user_id, guild_id, name, level, experience, pvp_wins, pvp_losses in rows:
+            entry = {'name': name, 'guild_id': guild_id, 'level': level, 'experience': experience,
+                     'pvp_wins': pvp_wins, 'pvp_losses': pvp_losses}
+            entry.update((key, value) for key, value in pending.get(user_id, {}).items() if key in LEADERBOARD_COLUMNS)
+            self._entries[user_id] = entry
+        self._indexes = {}
+        for board, key in LEADERBOARD_KEYS.items():
+            by_guild = {}
+            for user_id, entry in self._entries.items():
+                by_guild.setdefault(entry['guild_id'], []).append(key(user_id, entry))
+            self._indexes[(board, None)] = RankedIndex(k for keys in by_guild.values() for k in keys)
+            for guild_id, keys in by_guild.items():
+                self._indexes[(board, guild_id)] = RankedIndex(keys)
+        self._loaded = True
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._load()
+
+    def _index(self, board, guild_id):
+        index = self._indexes.get((board, guild_id))
+        if index is None:
+            index = self._indexes[(board, guild_id)] = RankedIndex()
+        return index
+
+    def _unlink(self, user_id, entry):
+        for board, key in LEADERBOARD_KEYS.items():
+            k = key(user_id, entry)
+            self._indexes[(board, None)].discard(k)
+            self._index(board, entry['guild_id']).discard(k)
+
+    def _link(self, user_id, entry):
+        for board, key in LEADERBOARD_KEYS.items():
+            k = key(user_id, entry)
+            self._indexes[(board, None)].add(k)
+            self._index(board, entry['guild_id']).add(k)
+
+    def update(self, user_id, values):
+        """Aplica novos valores (colunas de ranking, 'name' ou 'guild_id') a um jogador já ranqueado."""
+        with self._lock:
+            entry = self._entries.get(user_id) if self._loaded else None
+            if entry is None:
+                return
+            values = {key: value for key, value in values.items() if key in entry}
+            if all(entry[key] == value for key, value in values.items()):
+                return
+            self._unlink(user_id, entry)
+            entry.update(values)
+            self._link(user_id, entry)
+
+    def add(self, user_id, entry):
+        with self._lock:
+            if not self._loaded:
+                return
+            if user_id in self._entries:
+                self._unlink(user_id, self._entries[user_id])
+            self._entries[user_id] = dict(entry)
+            self._link(user_id, self._entries[user_id])
+
+    def remove(self, user_id):
+        with self._lock:
+            entry = self._entries.pop(user_id, None) if self._loaded else None
+            if entry is not None:
+                self._unlink(user_id, entry)
+
+    def top(self, board, limit, guild_id=None):
+        with self._lock:
+            self._ensure_loaded()
+            keys = self._index(board, guild_id).first(limit)
+            return [dict(self._entries[key[-1]], user_id=key[-1]) for key in keys]
+
+    def rank(self, user_id, board, guild_id=None):
+        """Retorna (posição a partir de 1, total de jogadores no ranking) ou None se o jogador não estiver nele."""
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(user_id)
+            if entry is None or (guild_id is not None and entry['guild_id'] != guild_id):
+                return None
+            index = self._index(board, guild_id)
+            return index.index(LEADERBOARD_KEYS[board](user_id, entry)) + 1, len(index)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+            self._entries = {}
+            self._indexes = {}
+
+_leaderboards = LeaderboardCache()
+
+def invalidate_leaderboards():
+    """Descarta os rankings em memória (ex.: após editar a tabela characters manualmente)."""
+    _leaderboards.invalidate()
+
+def _leaderboard_row(sort_by, entry):
+    if sort_by == 'level':
+        return {'name': entry['name'], 'level': entry['level'], 'experience': entry['experience']}
+    return {'name': entry['name'], 'pvp_wins': entry['pvp_wins'], 'pvp_losses': entry['pvp_losses'],
+            'score': entry['pvp_wins'] - entry['pvp_losses']}
+
+def get_leaderboard(sort_by='level', limit=10, guild_id=None):
+    """Busca dados para o placar de líderes (global ou de um servidor)."""
+    if sort_by not in LEADERBOARD_KEYS:
+        return []
+    return [_leaderboard_row(sort_by, entry) for entry in _leaderboards.top(sort_by, limit, guild_id)]
+
+def get_leaderboard_rank(user_id, sort_by='level', guild_id=None):
+    """Retorna (posição, total) do jogador no ranking, ou None se ele não estiver nele."""
+    if sort_by not in LEADERBOARD_KEYS:
+        return None
+    return _leaderboards.rank(user_id, sort_by, guild_id)
+
 # --- Funções de Grupo (Party) ---
 
 def create_party(leader_id):
@@ -1241,60 +2414,116 @@ def disband_party(party_id):
 
 def get_all_dungeons():
     """Retorna todas as masmorras disponíveis."""
-    with db_cursor() as cursor:
-        cursor.execute("SELECT * FROM dungeons ORDER BY level_req")
-        columns = [desc[0] for desc in cursor.description]
-        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return sorted((dict(dungeon) for dungeon in get_game_data().dungeons.values()), key=lambda d: d['level_req'])
 
 def get_dungeon_by_name(name):
     """Busca uma masmorra pelo nome."""
-    with db_cursor() as cursor:
-        cursor.execute("SELECT * FROM dungeons WHERE name LIKE ?", (f'%{name}%',))
-        dungeon_data = cursor.fetchone()
-        if dungeon_data:
-            columns = [description[0] for description in cursor.description]
-            return dict(zip(columns, dungeon_data))
-    return None
+    search = name.lower()
+    dungeon = next((d for d in get_game_data().dungeons.values() if search in d['name'].lower()), None)
+    return dict(dungeon) if dungeon else None
 
 def get_boss_by_id(boss_id):
     """Busca um chefe pelo ID."""
-    with db_cursor() as cursor:
-        cursor.execute("SELECT * FROM boss_enemies WHERE id = ?", (boss_id,))
-        boss_data = cursor.fetchone()
-        if boss_data:
-            columns = [description[0] for description in cursor.description]
-            return dict(zip(columns, boss_data))
-    return None
+    boss = get_game_data().bosses.get(boss_id)
+    return dict(boss) if boss else None
 
 def get_boss_loot(boss_id):
     """Busca todos os itens de loot associados a um chefe."""
-    with db_cursor() as cursor:
-        cursor.execute("SELECT * FROM loot_table WHERE boss_drop_id = ?", (boss_id,))
-        loot_data = cursor.fetchall()
-        if loot_data:
-            columns = [description[0] for description in cursor.description]
-            return [dict(zip(columns, loot)) for loot in loot_data]
-    return []
+    return [dict(item) for item in get_game_data().boss_loot.get(boss_id, [])]
 
 # --- Funções de Narração (Narrator) ---
 
-def get_narrative_history(user_id):
-    """Busca o histórico de narração de um jogador."""
+# --- Memória do Narrador ---
+# O histórico de cada jogador é só acrescentado (uma linha por mensagem) e as mensagens antigas são
+# substituídas no prompt por um resumo incremental. Assim o prompt de cada turno e o volume gravado
+# no banco ficam limitados, por mais longa que seja a saga do jogador.
+NARRATIVE_SUMMARY_PREFIX = "Memória da aventura até agora:"
+NARRATIVE_TURNS_LOAD_LIMIT = 200 # Mensagens mais recentes carregadas ao abrir uma sessão
+
+def estimate_tokens(text):
+    """Estimativa barata de tokens de uma mensagem: ~4 caracteres por token, mais o custo fixo da mensagem."""
+    return len(text or "") // 4 + 4
+
+def append_narrative_turn(user_id, role, content):
+    """Acrescenta uma mensagem ao histórico do Narrador. Retorna a mensagem gravada (com id e tokens)."""
+    tokens = estimate_tokens(content)
     with db_cursor() as cursor:
-        cursor.execute("SELECT history_json FROM narrative_history WHERE character_user_id = ?", (user_id,))
-        result = cursor.fetchone()
-        if result:
-            return json.loads(result[0])
-    return None
+        cursor.execute("INSERT INTO narrative_turns (character_user_id, role, content, tokens) VALUES (?, ?, ?, ?)",
+                       (user_id, role, content, tokens))
+        return {"id": cursor.lastrowid, "role": role, "content": content, "tokens": tokens}
 
-def save_narrative_history(user_id, history):
-    """Salva ou atualiza o histórico de narração de um jogador."""
+def get_narrative_memory(user_id):
+    """
+    Retorna a memória do jogador: o resumo, até onde ele vai e as mensagens posteriores a ele
+    (no máximo NARRATIVE_TURNS_LOAD_LIMIT, em ordem cronológica).
+    """
     with db_cursor() as cursor:
-        history_json = json.dumps(history)
-        cursor.execute(
-            "INSERT OR REPLACE INTO narrative_history (character_user_id, history_json) VALUES (?, ?)",
-            (user_id, history_json)
-        )
+        cursor.execute("SELECT summary, summarized_through, tokens FROM narrative_summaries WHERE character_user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        summary, summarized_through, summary_tokens = row if row else (None, 0, 0)
+        cursor.execute("""
+            SELECT id, role, content, tokens FROM narrative_turns
+            WHERE character_user_id = ? AND id > ?
+            ORDER BY id DESC LIMIT ?
+        """, (user_id, summarized_through, NARRATIVE_TURNS_LOAD_LIMIT))
+        turns = [dict(zip(("id", "role", "content", "tokens"), turn)) for turn in reversed(cursor.fetchall())]
+    return {"summary": summary, "summary_tokens": summary_tokens, "summarized_through": summarized_through, "turns": turns}
+
+def get_narrative_summary_batch(user_id, keep_tokens, limit=NARRATIVE_TURNS_LOAD_LIMIT):
+    """
+    Mensagens a incorporar ao resumo: as posteriores a ele, exceto as mais recentes que somam até
+    `keep_tokens` (que continuam como texto original). Traz no máximo `limit` mensagens, das mais antigas.
+    Retorna {summary, summarized_through, pending_tokens, turns, has_more}.
+    """
+    with db_cursor() as cursor:
+        cursor.execute("SELECT summary, summarized_through FROM narrative_summaries WHERE character_user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        summary, summarized_through = row if row else (None, 0)
+        cursor.execute("SELECT id, tokens FROM narrative_turns WHERE character_user_id = ? AND id > ? ORDER BY id",
+                       (user_id, summarized_through))
+        pending = cursor.fetchall()
+        split = len(pending)
+        kept_tokens = 0
+        while split > 0 and kept_tokens + pending[split - 1][1] <= keep_tokens:
+            split -= 1
+            kept_tokens += pending[split][1]
+        batch = pending[:min(split, limit)]
+        turns = []
+        if batch:
+            cursor.execute("""
+                SELECT id, role, content, tokens FROM narrative_turns
+                WHERE character_user_id = ? AND id > ? AND id <= ?
+                ORDER BY id
+            """, (user_id, summarized_through, batch[-1][0]))
+            turns = [dict(zip(("id", "role", "content", "tokens"), turn)) for turn in cursor.fetchall()]
+    return {"summary": summary, "summarized_through": summarized_through, "turns": turns,
+            "pending_tokens": sum(tokens for _, tokens in pending), "has_more": split > len(batch)}
+
+def get_narrative_summary_backlog(min_tokens):
+    """IDs dos jogadores cujas mensagens fora do resumo somam mais de `min_tokens` (ex.: resumos interrompidos por um reinício)."""
+    with db_cursor() as cursor:
+        cursor.execute("""
+            SELECT t.character_user_id FROM narrative_turns t
+            LEFT JOIN narrative_summaries s ON s.character_user_id = t.character_user_id
+            WHERE t.id > COALESCE(s.summarized_through, 0)
+            GROUP BY t.character_user_id
+            HAVING SUM(t.tokens) > ?
+        """, (min_tokens,))
+        return [row[0] for row in cursor.fetchall()]
+
+def save_narrative_summary(user_id, summary, summarized_through):
+    """
+    Grava o resumo que cobre as mensagens até `summarized_through`. Um resumo que não avança
+    sobre o gravado é ignorado, então repetir a mesma gravação não tem efeito. Retorna True se gravou.
+    """
+    with db_cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO narrative_summaries (character_user_id, summary, summarized_through, tokens) VALUES (?, ?, ?, ?)
+            ON CONFLICT (character_user_id) DO UPDATE SET
+                summary = excluded.summary, summarized_through = excluded.summarized_through,
+                tokens = excluded.tokens, updated_at = CURRENT_TIMESTAMP
+            WHERE excluded.summarized_through > narrative_summaries.summarized_through
+        """, (user_id, summary, summarized_through, estimate_tokens(summary)))
         return cursor.rowcount > 0
 
 def create_loot_item(item_data):
@@ -1314,11 +2543,14 @@ def create_loot_item(item_data):
         
         try:
             cursor.execute(query, values)
-            return cursor.lastrowid
+            item_id = cursor.lastrowid
         except sqlite3.Error as e:
             print(f"Erro ao criar item no banco de dados: {e}")
             return None
 
+    invalidate_game_data() # O novo item precisa aparecer nas buscas feitas pelo cache
+    return item_id
+
 
 if __name__ == "__main__":
     # Exemplo de uso e inicialização do DB
@@ -2,6 +2,9 @@ import discord
 import asyncio
 import random
 import database
+from async_database import db
+from loot_system import roll_boss_drop
+from outbox_system import get_outbox
 
 class DungeonRun:
     def __init__(self, bot_instance, party_members_chars, dungeon_info, mode='solo'):
@@ -41,7 +44,7 @@ class DungeonRun:
         }
         return descriptions.get(self.current_stage, "Estágio Desconhecido")
 
-    def generate_enemies_for_stage(self):
+    async def generate_enemies_for_stage(self):
         """Gera inimigos para um estágio de combate."""
         if self.mode == 'solo':
             num_enemies = random.randint(2, 3)
@@ -59,7 +62,7 @@ class DungeonRun:
 
         for i in range(num_enemies):
             enemy_name = random.choice(possible_enemies)
-            enemy_data = database.get_enemy_by_name(enemy_name)
+            enemy_data = await db.get_enemy_by_name(enemy_name)
             if enemy_data:
                 # Cria uma cópia para não modificar o original
                 instance = dict(enemy_data)
@@ -83,7 +86,7 @@ class DungeonRun:
 
             # Lógica de cada estágio
             if self.current_stage in [1, 3]: # Estágios de combate
-                enemies = self.generate_enemies_for_stage()
+                enemies = await self.generate_enemies_for_stage()
                 combat_won = await self.run_combat_stage(channel, enemies)
                 if not combat_won:
                     self.log.append("O grupo foi derrotado e a jornada termina.")
@@ -94,7 +97,7 @@ class DungeonRun:
                 await self.run_rest_stage(channel)
 
             elif self.current_stage == 4: # Estágio do Chefe
-                boss_data = database.get_boss_by_id(self.dungeon['boss_id'])
+                boss_data = await db.get_boss_by_id(self.dungeon['boss_id'])
                 boss_data['current_hp'] = boss_data['hp']
                 boss_data['id_in_battle'] = 'Chefe'
                 combat_won = await self.run_combat_stage(channel, [boss_data])
@@ -115,6 +118,8 @@ class DungeonRun:
 
     async def run_combat_stage(self, channel, enemies):
         """Executa um estágio de combate contra um grupo de inimigos."""
+        # Os logs de ataques são juntados pela fila do canal e saem com o próximo embed de turno
+        outbox = get_outbox(channel)
         self.log.append(f"Encontrou {len(enemies)} inimigos: {', '.join([e['name'] for e in enemies])}")
         
         # Ordem de turno: todos os jogadores, depois todos os inimigos
@@ -144,7 +149,7 @@ class DungeonRun:
                     enemy_status_str += f"`{e['id_in_battle']}`: **{e['name']}** - ❤️ HP: {e['current_hp']}\n"
                 embed.add_field(name="Inimigos", value=enemy_status_str, inline=False)
                 embed.set_footer(text=f"Ação de {player_char['name']}? `atacar <ID>`, `habilidade`, `item`.")
-                await channel.send(embed=embed)
+                await outbox.send(embed=embed)
 
                 try:
                     action_msg = await self.bot.wait_for("message", check=lambda m: m.author.id == player_id and m.channel == channel, timeout=60.0)
@@ -156,16 +161,16 @@ class DungeonRun:
                         target_id = int(target_id_str) if target_id_str != 'chefe' else 'Chefe'
                         target_enemy = next((e for e in enemies_alive if e['id_in_battle'] == target_id), None)
                         if not target_enemy:
-                            await channel.send("Alvo inválido.")
+                            outbox.log("Alvo inválido.")
                             continue
 
                         player_attack = player_state['original']['strength'] + player_state['bonuses']['attack']
                         damage = max(0, round(player_attack * random.uniform(0.8, 1.2)) - target_enemy['defense'])
                         target_enemy['current_hp'] -= damage
                         self.log.append(f"{player_char['name']} ataca {target_enemy['name']} e causa {damage} de dano.")
-                        await channel.send(f"⚔️ **{player_char['name']}** ataca **{target_enemy['name']}** e causa **{damage}** de dano!")
+                        outbox.log(f"⚔️ **{player_char['name']}** ataca **{target_enemy['name']}** e causa **{damage}** de dano!")
                         if target_enemy['current_hp'] <= 0:
-                            await channel.send(f"☠️ **{target_enemy['name']}** foi derrotado!")
+                            outbox.log(f"☠️ **{target_enemy['name']}** foi derrotado!")
                             self.total_xp_reward += target_enemy['xp_reward']
                             self.total_gold_reward += target_enemy['gold_reward']
                     
@@ -175,10 +180,10 @@ class DungeonRun:
                     elif action == "item":
                         await self._handle_item_action(channel, player_char, player_state)
                     else:
-                        await channel.send(f"Ação inválida para **{player_char['name']}**. Turno perdido. (Ações: `atacar <ID>`, `habilidade`, `item`)")
+                        outbox.log(f"Ação inválida para **{player_char['name']}**. Turno perdido. (Ações: `atacar <ID>`, `habilidade`, `item`)")
 
                 except (asyncio.TimeoutError, ValueError):
-                    await channel.send(f"**{player_char['name']}** demorou para agir e perdeu o turno.")
+                    outbox.log(f"**{player_char['name']}** demorou para agir e perdeu o turno.")
 
             # --- Turno dos Inimigos ---
             enemies_alive = [e for e in enemies if e['current_hp'] > 0]
@@ -196,21 +201,22 @@ class DungeonRun:
                 damage = max(0, round(enemy['attack'] * random.uniform(0.8, 1.2)) - player_defense)
                 target_state['hp'] -= damage
                 self.log.append(f"{enemy['name']} ataca {target_state['original']['name']} e causa {damage} de dano.")
-                await channel.send(f"💥 **{enemy['name']}** ataca **{target_state['original']['name']}** e causa **{damage}** de dano!")
+                outbox.log(f"💥 **{enemy['name']}** ataca **{target_state['original']['name']}** e causa **{damage}** de dano!")
 
                 if target_state['hp'] <= 0:
                     target_state['is_alive'] = False
                     players_alive.remove(target_player_id)
-                    await channel.send(f"☠️ **{target_state['original']['name']}** foi derrotado!")
+                    outbox.log(f"☠️ **{target_state['original']['name']}** foi derrotado!")
                     if not players_alive: break
             
             turn += 1
 
+        await outbox.flush() # As mensagens seguintes da masmorra só aparecem depois do último log
         return any(p['is_alive'] for p in self.players_state.values())
 
     async def _handle_skill_action(self, channel, player_char, player_state, enemies):
         """Lida com o uso de habilidades em combate de masmorra."""
-        skills = database.get_character_skills(player_char['class'], player_char['level'])
+        skills = await db.get_character_skills(player_char['class'], player_char['level'])
         if not skills:
             await channel.send("Você não tem habilidades para usar. Turno perdido.")
             return
@@ -279,7 +285,7 @@ class DungeonRun:
 
     async def _handle_item_action(self, channel, player_char, player_state):
         """Lida com o uso de itens em combate de masmorra."""
-        inventory = database.get_inventory(player_char['user_id'])
+        inventory = await db.get_inventory(player_char['user_id'])
         consumables = [item for item in inventory if item[5] == 'potion'] # item_type
 
         if not consumables:
@@ -303,7 +309,7 @@ class DungeonRun:
             item_to_use = consumables[choice_idx]
             _, item_id, _, name, _, _, effect_type, effect_value, _, _ = item_to_use
 
-            if database.remove_item_from_inventory(player_char['user_id'], item_id, 1):
+            if await db.remove_item_from_inventory(player_char['user_id'], item_id, 1):
                 if effect_type == 'HEAL_HP':
                     healed = min(player_state['original']['max_hp'] - player_state['hp'], effect_value)
                     player_state['hp'] += healed
@@ -314,7 +320,7 @@ class DungeonRun:
                     await channel.send(f"**{player_char['name']}** usou **{name}** e recuperou **{healed}** de MP.")
                 else:
                     await channel.send(f"O item **{name}** não pode ser usado em combate. Turno perdido.")
-                    database.add_item_to_inventory(player_char['user_id'], item_id, 1) # Devolve o item
+                    await db.add_item_to_inventory(player_char['user_id'], item_id, 1) # Devolve o item
             else:
                 await channel.send("Falha ao usar o item do inventário.")
 
@@ -362,7 +368,7 @@ class DungeonRun:
                     item_name = " ".join(parts[1:]) # Assumes prefix + command, then item name
                     
                     # Busca o item no inventário real do jogador
-                    inventory = database.get_inventory(user_id)
+                    inventory = await db.get_inventory(user_id)
                     item_to_use_data = next((item for item in inventory if item_name.lower() in item[3].lower()), None)
 
                     if not item_to_use_data or item_to_use_data[5] != 'potion':
@@ -372,7 +378,7 @@ class DungeonRun:
                     _, item_id, _, name, _, _, effect_type, effect_value, _, _ = item_to_use_data
 
                     # Remove o item do inventário real
-                    if not database.remove_item_from_inventory(user_id, item_id, 1):
+                    if not await db.remove_item_from_inventory(user_id, item_id, 1):
                         await channel.send("Falha ao usar o item.")
                         continue
 
@@ -388,7 +394,7 @@ class DungeonRun:
                     else:
                         await channel.send(f"**{name}** não tem efeito em um descanso.")
                         # Devolve o item, pois não teve efeito útil
-                        database.add_item_to_inventory(user_id, item_id, 1)
+                        await db.add_item_to_inventory(user_id, item_id, 1)
 
             except asyncio.TimeoutError:
                 await channel.send("O líder demorou para agir e o grupo continuou automaticamente.")
@@ -396,7 +402,7 @@ class DungeonRun:
 
     async def end_dungeon(self, channel):
         if self.is_complete:
-            boss = database.get_boss_by_id(self.dungeon['boss_id'])
+            boss = await db.get_boss_by_id(self.dungeon['boss_id'])
             self.total_xp_reward += boss['xp_reward']
             self.total_gold_reward += boss['gold_reward']
 
@@ -413,9 +419,8 @@ class DungeonRun:
             final_embed.add_field(name="Recompensa por Sobrevivente", value=f"✨ **{xp_reward_final}** XP\n💰 **{gold_reward_final}** Ouro")
             
             # Lógica de Loot do Chefe
-            boss_loot_pool = database.get_boss_loot(self.dungeon['boss_id'])
-            if boss_loot_pool:
-                dropped_item = random.choice(boss_loot_pool)
+            dropped_item = roll_boss_drop(self.dungeon['boss_id'])
+            if dropped_item:
                 surviving_players = [p_state for p_state in self.players_state.values() if p_state['is_alive']]
                 
                 if surviving_players:
@@ -424,7 +429,7 @@ class DungeonRun:
                     lucky_player_id = lucky_player_state['original']['user_id']
                     lucky_player_name = lucky_player_state['original']['name']
 
-                    database.add_item_to_inventory(lucky_player_id, dropped_item['id'], 1)
+                    await db.add_item_to_inventory(lucky_player_id, dropped_item['id'], 1)
                     
                     loot_message = f"🎁 O chefe dropou **{dropped_item['name']}**!\nO item foi para **{lucky_player_name}**."
                     final_embed.add_field(name="Loot do Chefe", value=loot_message, inline=False)
@@ -443,7 +448,7 @@ class DungeonRun:
                         'hp': p_state['hp'], # Salva o HP restante
                         'mp': p_state['mp'], # Salva o MP restante
                     }
-                    database.update_character_stats(user_id, updates)
+                    await db.update_character_stats(user_id, updates)
 
         else:
             # O jogador perdeu
@@ -452,7 +457,7 @@ class DungeonRun:
             
             # Penalidade para todos os membros: recupera apenas metade da vida
             for user_id, p_state in self.players_state.items():
-                database.update_character_stats(user_id, {'hp': p_state['original']['max_hp'] // 2})
+                await db.update_character_stats(user_id, {'hp': p_state['original']['max_hp'] // 2})
 
         # Limpa a instância da masmorra ativa
         for user_id in self.players_state.keys():
@@ -0,0 +1,184 @@
+import asyncio
+import itertools
+import random
+import time
+from collections import deque
+
+import openai
+
+# --- Configuração do Agendador ---
+LLM_MAX_CONCURRENT_REQUESTS = 4 # Chamadas simultâneas ao provedor, somando todas as sessões
+LLM_REQUEST_TIMEOUT = 60.0 # Segundos por tentativa (inclui ler todo o streaming)
+LLM_MAX_ATTEMPTS = 3
+LLM_RETRY_DELAY = 1.0 # Segundos; dobra a cada nova tentativa, com variação aleatória
+
+PRIORITY_INTERACTIVE = 0 # Turnos em que o jogador está esperando a resposta
+PRIORITY_BACKGROUND = 1 # Resumos e outras tarefas que podem esperar
+
+# Falhas passageiras do provedor; as demais (ex.: requisição inválida) voltam direto para quem chamou
+RETRYABLE_ERRORS = (asyncio.TimeoutError, openai.RateLimitError, openai.APITimeoutError,
+                    openai.APIConnectionError, openai.InternalServerError)
+
+
+class _Job:
+    __slots__ = ("id", "user_id", "priority", "factory", "future", "attempts", "enqueued_at", "retry_handle", "task")
+
+    def __init__(self, job_id, user_id, priority, factory, future):
+        self.id = job_id
+        self.user_id = user_id
+        self.priority = priority
+        self.factory = factory
+        self.future = future
+        self.attempts = 0
+        self.enqueued_at = time.perf_counter()
+        self.retry_handle = None
+        self.task = None # Tentativa em andamento
+
+
+class LLMScheduler:
+    """
+    Fila única para as chamadas à API de chat de todas as sessões do Narrador.
+
+    No máximo `max_concurrency` chamadas ficam em andamento. Quando uma termina, a próxima é
+    escolhida pela prioridade (turnos interativos antes de resumos) e, dentro dela, em rodízio
+    entre jogadores: quem tem várias chamadas na fila não passa na frente de quem tem uma só.
+    Cada tentativa tem um tempo limite; falhas passageiras voltam para a frente da fila do
+    jogador depois de uma espera crescente com variação aleatória, liberando a vaga enquanto isso.
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENT_REQUESTS, timeout=LLM_REQUEST_TIMEOUT,
+                 max_attempts=LLM_MAX_ATTEMPTS, retry_delay=LLM_RETRY_DELAY):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._queues = {PRIORITY_INTERACTIVE: {}, PRIORITY_BACKGROUND: {}} # {prioridade: {user_id: deque de _Job}}
+        self._turns = {PRIORITY_INTERACTIVE: deque(), PRIORITY_BACKGROUND: deque()} # Ordem do rodízio
+        self._ids = itertools.count(1)
+        self._active = 0
+        self._tasks = set() # Referências às chamadas em andamento (o asyncio só guarda referências fracas)
+        self._retry_handles = set() # Novas tentativas agendadas com call_later
+        self.counters = {"submitted": 0, "started": 0, "completed": 0, "failed": 0, "retries": 0, "timeouts": 0,
+                         "cancelled": 0, "wait_total": 0.0, "wait_max": 0.0, "max_queue_depth": 0}
+
+    async def submit(self, user_id, factory, priority=PRIORITY_INTERACTIVE):
+        """
+        Agenda `factory` (função sem argumentos que retorna uma corrotina; chamada uma vez por
+        tentativa) e espera o resultado. Repassa a exceção da última tentativa se todas falharem.
+        """
+        job = _Job(next(self._ids), user_id, priority, factory, asyncio.get_running_loop().create_future())
+        job.future.add_done_callback(lambda future: self._abandon(job))
+        self.counters["submitted"] += 1
+        self._enqueue(job)
+        self.counters["max_queue_depth"] = max(self.counters["max_queue_depth"], self.queue_depth())
+        self._pump()
+        return await job.future
+
+    def _enqueue(self, job, front=False):
+        queues = self._queues[job.priority]
+        queue = queues.get(job.user_id)
+        if queue is None:
+            queue = queues[job.user_id] = deque()
+            self._turns[job.priority].append(job.user_id)
+        if front:
+            queue.appendleft(job)
+        else:
+            queue.append(job)
+
+    def _next_job(self):
+        for priority in (PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND):
+            turns = self._turns[priority]
+            queues = self._queues[priority]
+            while turns:
+                user_id = turns.popleft()
+                queue = queues[user_id]
+                job = queue.popleft()
+                if queue:
+                    turns.append(user_id) # Volta para o fim do rodízio
+                else:
+                    del queues[user_id]
+                if job.future.done(): # Quem pediu desistiu (ex.: sessão encerrada)
+                    self.counters["cancelled"] += 1
+                    continue
+                return job
+        return None
+
+    def _pump(self):
+        while self._active < self.max_concurrency:
+            job = self._next_job()
+            if job is None:
+                return
+            self._active += 1
+            task = job.task = asyncio.create_task(self._run(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job):
+        if job.attempts == 0:
+            self.counters["started"] += 1
+            waited = time.perf_counter() - job.enqueued_at
+            self.counters["wait_total"] += waited
+            self.counters["wait_max"] = max(self.counters["wait_max"], waited)
+        job.attempts += 1
+        try:
+            result = await asyncio.wait_for(job.factory(), self.timeout)
+        except RETRYABLE_ERRORS as e:
+            if isinstance(e, asyncio.TimeoutError):
+                self.counters["timeouts"] += 1
+            if job.attempts < self.max_attempts and not job.future.done():
+                self.counters["retries"] += 1
+                delay = self.retry_delay * 2 ** (job.attempts - 1)
+                handle = asyncio.get_running_loop().call_later(delay + random.uniform(0, delay), self._retry, job)
+                self._retry_handles.add(handle)
+                job.retry_handle = handle
+            else:
+                self.counters["failed"] += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+        except Exception as e:
+            self.counters["failed"] += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self.counters["completed"] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._active -= 1
+            self._pump()
+
+    def _abandon(self, job):
+        """
+        Quem pediu desistiu (ex.: sessão encerrada): interrompe a tentativa em andamento ou a nova
+        tentativa agendada, liberando a vaga. Jobs ainda na fila são descartados em _next_job.
+        """
+        if not job.future.cancelled():
+            return
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+            self.counters["cancelled"] += 1
+        elif job.retry_handle in self._retry_handles:
+            job.retry_handle.cancel()
+            self._retry_handles.discard(job.retry_handle)
+            self.counters["cancelled"] += 1
+
+    def _retry(self, job):
+        self._retry_handles.discard(job.retry_handle)
+        self._enqueue(job, front=True)
+        self._pump()
+
+    def queue_depth(self, priority=None):
+        priorities = (priority,) if priority is not None else tuple(self._queues)
+        return sum(len(queue) for p in priorities for queue in self._queues[p].values())
+
+    def stats(self):
+        """Contadores acumulados e o estado atual da fila."""
+        started = self.counters["started"]
+        return {
+            **self.counters,
+            "active": self._active,
+            "queued_interactive": self.queue_depth(PRIORITY_INTERACTIVE),
+            "queued_background": self.queue_depth(PRIORITY_BACKGROUND),
+            "waiting_retry": len(self._retry_handles),
+            "wait_avg": self.counters["wait_total"] / started if started > 0 else 0.0,
+        }
@@ -0,0 +1,155 @@
+import random
+import threading
+
+import database
+from sampling import AliasTable, LevelIndex
+
+# --- Configuração de Drops ---
+LOOT_CHANCE = 0.3 # Chance de cada rolagem gerar um item
+LOOT_ROLLS = 1 # Rolagens por inimigo comum
+ELITE_LOOT_ROLLS = 2 # Rolagens por inimigo elite
+
+# Peso de cada raridade no sorteio. A chance de uma raridade não depende de quantos itens ela tem:
+# o peso é dividido igualmente entre os itens daquela raridade disponíveis no nível.
+RARITY_WEIGHTS = {
+    "common": 60,
+    "uncommon": 25,
+    "rare": 10,
+    "epic": 4,
+    "unique": 1,
+}
+DEFAULT_RARITY_WEIGHT = 10 # Raridades desconhecidas (ex: criadas manualmente no banco)
+
+# Inimigos elite multiplicam o peso das raridades mais altas.
+ELITE_RARITY_MULTIPLIERS = {
+    "rare": 2.0,
+    "epic": 3.0,
+    "unique": 3.0,
+}
+
+
+def is_world_drop(item):
+    """Itens de chefe só caem do próprio chefe e equipamentos únicos criados pelo Narrador pertencem a um único herói."""
+    if item['boss_drop_id'] is not None:
+        return False
+    return not (item['rarity'] == 'unique' and item['item_type'] != 'material')
+
+
+def _weighted_table(items, multipliers=None):
+    """Monta uma AliasTable em que cada raridade recebe seu peso, repartido entre seus itens."""
+    counts = {}
+    for item in items:
+        counts[item['rarity']] = counts.get(item['rarity'], 0) + 1
+    weights = []
+    for item in items:
+        rarity = item['rarity']
+        weight = RARITY_WEIGHTS.get(rarity, DEFAULT_RARITY_WEIGHT)
+        if multipliers:
+            weight *= multipliers.get(rarity, 1.0)
+        weights.append(weight / counts[rarity])
+    return AliasTable(items, weights)
+
+
+class LootEngine:
+    """
+    Tabelas de drop pré-calculadas a partir do cache de dados estáticos.
+
+    Para cada nível há uma AliasTable normal e uma elite; chefes têm suas próprias tabelas.
+    Os itens retornados são os dicionários do cache e não devem ser modificados.
+    """
+
+    def __init__(self, game_data):
+        self.version = game_data.version
+        world_items = [item for item in game_data.items.values() if is_world_drop(item)]
+        index = LevelIndex(world_items, min_level=lambda i: i['min_level_drop'])
+        self.max_indexed_level = index.max_indexed_level
+
+        # Níveis com o mesmo conjunto de itens compartilham as mesmas tabelas
+        self._tables = [None] * (self.max_indexed_level + 2)
+        self._elite_tables = [None] * (self.max_indexed_level + 2)
+        built = {}
+        for level in range(1, self.max_indexed_level + 2):
+            bucket = index.entries_at(level)
+            if not bucket:
+                continue
+            key = tuple(item['id'] for item in bucket)
+            if key not in built:
+                built[key] = (_weighted_table(bucket), _weighted_table(bucket, ELITE_RARITY_MULTIPLIERS))
+            self._tables[level], self._elite_tables[level] = built[key]
+
+        self._boss_tables = {
+            boss_id: _weighted_table(items)
+            for boss_id, items in game_data.boss_loot.items() if items
+        }
+
+    def _table(self, level, elite):
+        if level < 1:
+            return None
+        slot = min(level, self.max_indexed_level + 1)
+        return self._elite_tables[slot] if elite else self._tables[slot]
+
+    def pick(self, level, elite=False, rng=random):
+        """Sorteia um item do nível (sem rolar a chance de drop), ou None se não houver itens."""
+        table = self._table(level, elite)
+        return table.pick(rng) if table else None
+
+    def roll_drops(self, level, rolls=LOOT_ROLLS, elite=False, chance=LOOT_CHANCE, rng=random):
+        """Executa `rolls` rolagens de drop e retorna a lista de itens obtidos."""
+        table = self._table(level, elite)
+        if table is None:
+            return []
+        rand = rng.random
+        prob, alias, entries = table.prob, table.alias, table.entries
+        size = len(prob)
+        drops = []
+        for _ in range(rolls):
+            if rand() > chance:
+                continue
+            column = int(rand() * size)
+            drops.append(entries[column] if rand() < prob[column] else entries[alias[column]])
+        return drops
+
+    def roll_boss_drop(self, boss_id, rng=random):
+        """Sorteia um item da tabela exclusiva do chefe, ou None se ele não tiver loot."""
+        table = self._boss_tables.get(boss_id)
+        return table.pick(rng) if table else None
+
+    def drop_rates(self, level, elite=False):
+        """Probabilidade de cada raridade no nível, dado que um item caiu. Útil para balanceamento."""
+        table = self._table(level, elite)
+        if table is None:
+            return {}
+        # Reconstrói a massa de cada coluna a partir das tabelas de alias
+        size = len(table.prob)
+        mass = [0.0] * size
+        for column in range(size):
+            mass[column] += table.prob[column] / size
+            mass[table.alias[column]] += (1.0 - table.prob[column]) / size
+        rates = {}
+        for item, share in zip(table.entries, mass):
+            rates[item['rarity']] = rates.get(item['rarity'], 0.0) + share
+        return rates
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_loot_engine():
+    """Retorna o motor de loot, reconstruindo-o se o cache de dados estáticos mudou de versão."""
+    global _engine
+    game_data = database.get_game_data()
+    engine = _engine
+    if engine is None or game_data.is_stale(engine.version):
+        with _engine_lock:
+            if _engine is None or game_data.is_stale(_engine.version):
+                _engine = LootEngine(game_data)
+            engine = _engine
+    return engine
+
+def roll_drops(level, rolls=LOOT_ROLLS, elite=False, chance=LOOT_CHANCE, rng=random):
+    """Atalho para `get_loot_engine().roll_drops(...)`."""
+    return get_loot_engine().roll_drops(level, rolls, elite, chance, rng)
+
+def roll_boss_drop(boss_id, rng=random):
+    """Atalho para `get_loot_engine().roll_boss_drop(...)`."""
+    return get_loot_engine().roll_boss_drop(boss_id, rng)
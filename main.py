@@ -2,11 +2,13 @@ import discord
 from discord.ext import commands, tasks
 import os, sys
 import asyncio
+import time
 
 from datetime import datetime, timedelta
 import random
-from config import DISCORD_BOT_TOKEN, GENERAL_CHANNEL_NAME, OWNER_ID
+from config import DISCORD_BOT_TOKEN, OWNER_ID
 import database
+from async_database import db
 from game_constants import *
 
 
@@ -25,6 +27,8 @@ bot = commands.Bot(command_prefix="!", intents=intents)
 
 # Importa após a criação do bot para evitar importação circular
 from battle_system import PVEBattle, PVPBattle
+from broadcast_system import Broadcaster
+from outbox_system import forget_channel
 
 # --- Gerenciamento de Estado Global ---
 bot.pvp_invitations = {} # Armazena convites de duelo {desafiado_id: desafiante_id}
@@ -35,16 +39,10 @@ bot.active_dungeons = {} # Armazena masmorras ativas {user_id: dungeon_instance}
 bot.dungeon_queues = {} # Armazena as filas para masmorras {dungeon_name: [user_id]}
 bot.narrative_sessions = {} # Armazena sessões de narração ativas {user_id: session_instance}
 bot.last_battle_results = {} # Armazena o resultado da última batalha de um jogador {user_id: "resultado"}
+bot.broadcaster = Broadcaster() # Envia anúncios globais para o #geral de todos os servidores
 bot.dungeon_match_prompts = {} # Armazena os "pronto-check" {match_id: {players: {user_id: status}}}
 bot.debug_mode = False # Controla a exibição de logs de cálculo no console
 
-async def get_general_channel(guild):
-    """Encontra o canal #geral no servidor."""
-    for channel in guild.text_channels:
-        if channel.name == GENERAL_CHANNEL_NAME:
-            return channel
-    return None
-
 # --- Eventos do Bot ---
 
 def sync_guilds():
@@ -80,10 +78,31 @@ async def on_ready():
         await bot.close()
         return
 
-    database.init_db() # Garante que o DB está inicializado ao iniciar o bot
+    startup_timings = {}
+    start = time.perf_counter()
+    database.init_db(startup_timings) # Garante que o DB está inicializado ao iniciar o bot
+    startup_timings['init_db'] = time.perf_counter() - start
+
+    start = time.perf_counter()
     sync_guilds() # Sincroniza os servidores ao iniciar
+    startup_timings['sync_guilds'] = time.perf_counter() - start
+
+    start = time.perf_counter()
     await load_cogs() # Carrega todos os cogs
+    startup_timings['load_cogs'] = time.perf_counter() - start
+    print_startup_report(startup_timings)
     quest_reset_task.start() # Inicia a tarefa de reset de missões
+    if not stat_flush_task.is_running():
+        stat_flush_task.start() # Grava periodicamente o buffer de status dos personagens
+
+def print_startup_report(timings):
+    """Mostra quanto tempo cada etapa da inicialização levou."""
+    print("--- Tempo de inicialização ---")
+    for step in ['init_db', 'create_tables', 'migrate_db', 'populate_initial_data', 'game_data_cache', 'sync_guilds', 'load_cogs']:
+        if step in timings:
+            indent = "  " if step not in ('init_db', 'sync_guilds', 'load_cogs') else ""
+            print(f"{indent}{step}: {timings[step] * 1000:.1f} ms")
+    print('------')
 
 async def load_cogs():
     """Carrega todos os cogs da pasta /cogs."""
@@ -103,6 +122,21 @@ async def on_guild_remove(guild):
     """Evento disparado quando o bot é removido de um servidor."""
     print(f"Bot removido do servidor: {guild.name} (ID: {guild.id})")
     database.unregister_guild(guild.id)
+    bot.broadcaster.channels.invalidate(guild.id)
+
+@bot.event
+async def on_guild_channel_create(channel):
+    bot.broadcaster.channels.invalidate(channel.guild.id)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    bot.broadcaster.channels.invalidate(channel.guild.id)
+    forget_channel(channel.id)
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    if before.name != after.name:
+        bot.broadcaster.channels.invalidate(after.guild.id)
 
 # --- Tarefas em Segundo Plano (Tasks) ---
 
@@ -120,14 +154,10 @@ async def quest_reset_task():
         database.set_server_state('last_daily_reset', today_str)
         print("Reset de missões diárias concluído.")
         
-        # Notifica o canal geral de cada servidor
-        for guild in bot.guilds:
-            general_channel = await get_general_channel(guild)
-            if general_channel:
-                try:
-                    await general_channel.send("☀️ **Novas missões diárias estão disponíveis!** Use `!quest list` para vê-las.")
-                except discord.Forbidden:
-                    print(f"Não foi possível enviar a mensagem de reset no servidor '{guild.name}'.")
+        # Notifica o canal geral de cada servidor em segundo plano, sem travar a tarefa
+        bot.broadcaster.announce_in_background(
+            bot.guilds, "☀️ **Novas missões diárias estão disponíveis!** Use `!quest list` para vê-las.", label="reset diário"
+        )
 
     # --- Reset Semanal (Toda Segunda-feira) ---
     last_weekly_reset_str = database.get_server_state('last_weekly_reset')
@@ -141,6 +171,30 @@ async def quest_reset_task():
         print("Reset de missões semanais concluído.")
         # Você pode adicionar uma notificação para o reset semanal aqui também se desejar.
 
+@tasks.loop(seconds=database.STAT_BUFFER_FLUSH_INTERVAL)
+async def stat_flush_task():
+    """Grava no banco as alterações de status e o progresso de missões que ainda estão apenas em memória."""
+    # Uma exceção não tratada encerraria o loop de vez; o que falhar continua pendente e vai na próxima rodada
+    try:
+        await db.flush_character_stats()
+    except Exception as e:
+        print(f"Erro ao gravar o buffer de status dos personagens: {e}")
+    try:
+        await db.flush_quest_progress()
+    except Exception as e:
+        print(f"Erro ao gravar o progresso de missões: {e}")
+
+def flush_on_exit():
+    """Grava o que estiver pendente antes de o processo terminar."""
+    # Espera as consultas ainda na fila do db-writer/db-reader, para o flush não se intercalar com elas
+    db.shutdown()
+    flushed = database.flush_character_stats()
+    if flushed:
+        print(f"{flushed} personagem(ns) com alterações pendentes gravados antes de encerrar.")
+    flushed = database.flush_quest_progress()
+    if flushed:
+        print(f"{flushed} missão(ões) com progresso pendente gravadas antes de encerrar.")
+    database.close_pool()
 
 
 @bot.event
@@ -158,4 +212,6 @@ if __name__ == "__main__":
     try:
         asyncio.run(bot.run(DISCORD_BOT_TOKEN))
     except discord.errors.LoginFailure:
-        print("ERRO: Token do bot inválido. Verifique o arquivo 'config.py'.")
\ No newline at end of file
+        print("ERRO: Token do bot inválido. Verifique o arquivo 'config.py'.")
+    finally:
+        flush_on_exit()
\ No newline at end of file
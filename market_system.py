@@ -0,0 +1,375 @@
+import bisect
+import heapq
+import itertools
+import threading
+
+import database
+
+# --- Configuração do Mercado ---
+LISTINGS_PER_PAGE = 10
+
+
+class MarketError(Exception):
+    """Operação recusada pelo mercado. A mensagem pode ser mostrada diretamente ao jogador."""
+
+
+class OrderBook:
+    """
+    Ofertas de um mesmo item (item_id, aprimoramento) em prioridade de preço e tempo.
+
+    As chaves ficam em uma lista ordenada: a melhor oferta é a primeira e inserções/remoções
+    localizam a posição por busca binária (O(log n)), mas a lista ainda desloca os elementos
+    seguintes (O(n), um memmove rápido para livros de um item com alguns milhares de ofertas).
+    A lista é mantida, e não um heap, porque __iter__ percorre o livro em ordem para a paginação.
+    Para ofertas de compra o preço entra negativo, assim a primeira é sempre a que paga mais.
+    IDs crescem com o tempo e desempatam pelo mais antigo.
+    """
+
+    def __init__(self, descending=False):
+        self.descending = descending
+        self._keys = [] # [(preço, id)]
+
+    def _key(self, entry):
+        return (-entry['price'] if self.descending else entry['price'], entry['id'])
+
+    def add(self, entry):
+        bisect.insort(self._keys, self._key(entry))
+
+    def remove(self, entry):
+        key = self._key(entry)
+        index = bisect.bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            del self._keys[index]
+
+    def __iter__(self):
+        """IDs das ofertas, da melhor para a pior."""
+        return (entry_id for _, entry_id in self._keys)
+
+    def best_id(self):
+        return self._keys[0][1] if self._keys else None
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class MarketEngine:
+    """
+    Livro de ofertas do mercado em memória, com a tabela market_listings (vendas) e
+    market_buy_orders (compras) como fonte da verdade.
+
+    Cada operação grava no banco em uma única transação e só então atualiza a memória,
+    sob um lock, para que os dois nunca divirjam. Vendas e ordens de compra se cruzam
+    automaticamente: o negócio sai sempre pelo preço da oferta que já estava no livro.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.stats = {"listings": 0, "fills": 0, "units_traded": 0, "reloads": 0}
+        self._load()
+
+    def _load(self):
+        self.database_name = database.DATABASE_NAME
+        self.generation = database.get_market_generation()
+        self._listings = {} # {id: anúncio}
+        self._orders = {} # {id: ordem de compra}
+        self._asks = {} # {(item_id, aprimoramento): OrderBook}
+        self._bids = {} # {(item_id, aprimoramento): OrderBook}
+        self._recent = [] # IDs dos anúncios em ordem crescente (= ordem de criação)
+        self._recent_by_item = {} # {item_id: [IDs em ordem crescente]}
+
+        for listing in database.get_all_market_listings():
+            self._add_listing(listing)
+        for order in database.get_all_market_buy_orders():
+            self._add_order(order)
+
+    # --- Estrutura em memória ---
+
+    def _add_listing(self, listing):
+        self._listings[listing['id']] = listing
+        self._asks.setdefault((listing['item_id'], listing['enhancement_level']), OrderBook()).add(listing)
+        bisect.insort(self._recent, listing['id'])
+        bisect.insort(self._recent_by_item.setdefault(listing['item_id'], []), listing['id'])
+
+    def _drop_listing(self, listing_id):
+        listing = self._listings.pop(listing_id)
+        key = (listing['item_id'], listing['enhancement_level'])
+        self._asks[key].remove(listing)
+        if not self._asks[key]:
+            del self._asks[key]
+        for ids in (self._recent, self._recent_by_item[listing['item_id']]):
+            del ids[bisect.bisect_left(ids, listing_id)]
+        if not self._recent_by_item[listing['item_id']]:
+            del self._recent_by_item[listing['item_id']]
+
+    def _add_order(self, order):
+        self._orders[order['id']] = order
+        self._bids.setdefault((order['item_id'], order['enhancement_level']), OrderBook(descending=True)).add(order)
+
+    def _drop_order(self, order_id):
+        order = self._orders.pop(order_id)
+        key = (order['item_id'], order['enhancement_level'])
+        self._bids[key].remove(order)
+        if not self._bids[key]:
+            del self._bids[key]
+
+    # --- Consultas ---
+
+    def get_listing(self, listing_id):
+        with self._lock:
+            self._ensure_current()
+            listing = self._listings.get(listing_id)
+            return dict(listing) if listing else None
+
+    def best_ask(self, item_id, enhancement_level=0):
+        """Anúncio mais barato (e mais antigo entre os de mesmo preço) do item, ou None."""
+        with self._lock:
+            self._ensure_current()
+            book = self._asks.get((item_id, enhancement_level))
+            return dict(self._listings[book.best_id()]) if book else None
+
+    def best_bid(self, item_id, enhancement_level=0):
+        """Ordem de compra que paga mais pelo item, ou None."""
+        with self._lock:
+            self._ensure_current()
+            book = self._bids.get((item_id, enhancement_level))
+            return dict(self._orders[book.best_id()]) if book else None
+
+    def _matching_item_ids(self, search_term):
+        items = database.get_matching_items(search_term, limit=None, item_ids=self._recent_by_item, descriptions=True)
+        return [item['id'] for item in items]
+
+    def count_listings(self, search_term=None):
+        with self._lock:
+            self._ensure_current()
+            if not search_term:
+                return len(self._recent)
+            return sum(len(self._recent_by_item[item_id]) for item_id in self._matching_item_ids(search_term))
+
+    def get_listings(self, page=1, per_page=LISTINGS_PER_PAGE, search_term=None):
+        """
+        Uma página de anúncios, dos mais recentes para os mais antigos, no mesmo formato de
+        database.get_market_listings: (id, quantidade, preço, aprimoramento, nome do item, vendedor).
+        """
+        offset = (page - 1) * per_page
+        with self._lock:
+            self._ensure_current()
+            if not search_term:
+                end = len(self._recent) - offset
+                ids = self._recent[max(0, end - per_page):max(0, end)][::-1]
+            else:
+                # Junta as listas (já ordenadas) de cada item encontrado, da mais recente para a mais antiga
+                lists = [reversed(self._recent_by_item[item_id]) for item_id in self._matching_item_ids(search_term)]
+                ids = list(itertools.islice(heapq.merge(*lists, reverse=True), offset, offset + per_page))
+            listings = [dict(self._listings[listing_id]) for listing_id in ids]
+
+        items = database.get_game_data().items
+        names = database.get_character_names(listing['seller_id'] for listing in listings)
+        return [
+            (listing['id'], listing['quantity'], listing['price'], listing['enhancement_level'],
+             items[listing['item_id']]['name'] if listing['item_id'] in items else "???",
+             names.get(listing['seller_id'], "Desconhecido"))
+            for listing in listings
+        ]
+
+    def get_player_orders(self, user_id):
+        with self._lock:
+            self._ensure_current()
+            return [dict(order) for order in self._orders.values() if order['buyer_id'] == user_id]
+
+    # --- Operações ---
+
+    def _ensure_current(self):
+        """Recarrega do banco se o mercado foi alterado fora do livro de ofertas."""
+        if database.get_market_generation() != self.generation or database.DATABASE_NAME != self.database_name:
+            self._load()
+            self.stats["reloads"] += 1
+
+    def list_item(self, seller_id, item_id, quantity, price, enhancement_level=0):
+        """
+        Anuncia itens do inventário do vendedor. As ordens de compra que pagam pelo menos `price`
+        são atendidas na hora, pelo preço delas; o restante fica anunciado.
+        Retorna (ID do anúncio ou None se tudo foi vendido, lista de negócios).
+        """
+        if quantity <= 0 or price <= 0:
+            raise MarketError("Quantidade e preço precisam ser maiores que zero.")
+        with self._lock:
+            self._ensure_current()
+            book = self._bids.get((item_id, enhancement_level))
+            matches = []
+            remaining = quantity
+            for order_id in (book or []):
+                order = self._orders[order_id]
+                if remaining == 0 or order['price'] < price:
+                    break
+                if order['buyer_id'] == seller_id:
+                    continue # Não negocia consigo mesmo
+                filled = min(remaining, order['quantity'])
+                matches.append((order, filled))
+                remaining -= filled
+
+            new_listing = None
+            with database.transaction():
+                if not database.remove_item_from_inventory(seller_id, item_id, quantity, enhancement_level):
+                    raise MarketError("Você não tem essa quantidade do item para vender.")
+                earned = 0
+                for order, filled in matches:
+                    # O ouro do comprador já estava reservado na ordem
+                    database.add_item_to_inventory(order['buyer_id'], item_id, filled, enhancement_level)
+                    if filled == order['quantity']:
+                        database.remove_market_buy_order(order['id'])
+                    else:
+                        database.update_market_buy_order_quantity(order['id'], order['quantity'] - filled)
+                    earned += filled * order['price']
+                if earned:
+                    seller = database.get_character(seller_id)
+                    database.update_character_stats(seller_id, {'gold': seller['gold'] + earned})
+                if remaining:
+                    listing_id = database.create_market_listing(seller_id, item_id, remaining, price, enhancement_level)
+                    new_listing = database.get_market_listing_by_id(listing_id)
+
+            trades = []
+            for order, filled in matches:
+                self._fill_order(order['id'], filled)
+                trades.append({"buyer_id": order['buyer_id'], "seller_id": seller_id, "quantity": filled, "price": order['price']})
+            if new_listing:
+                self._add_listing(new_listing)
+                self.stats["listings"] += 1
+            return (new_listing['id'] if new_listing else None), trades
+
+    def buy_listing(self, buyer_id, listing_id, quantity=1):
+        """Compra `quantity` unidades de um anúncio específico. Retorna o negócio realizado."""
+        with self._lock:
+            self._ensure_current()
+            listing = self._listings.get(listing_id)
+            if not listing:
+                raise MarketError("Anúncio não encontrado.")
+            if listing['seller_id'] == buyer_id:
+                raise MarketError("Você não pode comprar seus próprios itens.")
+            if quantity <= 0 or quantity > listing['quantity']:
+                raise MarketError(f"Este anúncio tem apenas {listing['quantity']} unidade(s) disponível(is).")
+
+            total_cost = listing['price'] * quantity
+            with database.transaction():
+                buyer = database.get_character(buyer_id)
+                if buyer['gold'] < total_cost:
+                    raise MarketError(f"Você não tem ouro suficiente. Custo total: {total_cost} ouro.")
+                self._settle(listing, buyer_id, quantity, listing['price'])
+                database.update_character_stats(buyer_id, {'gold': buyer['gold'] - total_cost})
+
+            self._fill_listing(listing_id, quantity)
+            return {"buyer_id": buyer_id, "seller_id": listing['seller_id'], "quantity": quantity, "price": listing['price']}
+
+    def place_buy_order(self, buyer_id, item_id, quantity, max_price, enhancement_level=0):
+        """
+        Compra até `quantity` unidades pagando no máximo `max_price` cada, começando pelos anúncios
+        mais baratos. O que não puder ser comprado agora vira uma ordem de compra com o ouro reservado.
+        Retorna (ID da ordem ou None se tudo foi comprado, lista de negócios).
+        """
+        if quantity <= 0 or max_price <= 0:
+            raise MarketError("Quantidade e preço precisam ser maiores que zero.")
+        with self._lock:
+            self._ensure_current()
+            book = self._asks.get((item_id, enhancement_level))
+            matches = []
+            remaining = quantity
+            for listing_id in (book or []):
+                listing = self._listings[listing_id]
+                if remaining == 0 or listing['price'] > max_price:
+                    break
+                if listing['seller_id'] == buyer_id:
+                    continue
+                filled = min(remaining, listing['quantity'])
+                matches.append((listing, filled))
+                remaining -= filled
+
+            cost = sum(listing['price'] * filled for listing, filled in matches) + remaining * max_price
+            new_order = None
+            with database.transaction():
+                buyer = database.get_character(buyer_id)
+                if buyer['gold'] < cost:
+                    raise MarketError(f"Você não tem ouro suficiente. São necessários {cost} de ouro (compras imediatas + reserva da ordem).")
+                for listing, filled in matches:
+                    self._settle(listing, buyer_id, filled, listing['price'])
+                database.update_character_stats(buyer_id, {'gold': buyer['gold'] - cost})
+                if remaining:
+                    order_id = database.create_market_buy_order(buyer_id, item_id, remaining, max_price, enhancement_level)
+                    new_order = database.get_market_buy_order_by_id(order_id)
+
+            trades = []
+            for listing, filled in matches:
+                self._fill_listing(listing['id'], filled)
+                trades.append({"buyer_id": buyer_id, "seller_id": listing['seller_id'], "quantity": filled, "price": listing['price']})
+            if new_order:
+                self._add_order(new_order)
+            return (new_order['id'] if new_order else None), trades
+
+    def cancel_listing(self, seller_id, listing_id):
+        """Retira um anúncio do mercado e devolve os itens ao vendedor. Retorna o anúncio removido."""
+        with self._lock:
+            self._ensure_current()
+            listing = self._listings.get(listing_id)
+            if not listing or listing['seller_id'] != seller_id:
+                raise MarketError("Anúncio não encontrado ou você não é o vendedor.")
+            with database.transaction():
+                database.remove_market_listing(listing_id)
+                database.add_item_to_inventory(seller_id, listing['item_id'], listing['quantity'], listing['enhancement_level'])
+            self._drop_listing(listing_id)
+            return dict(listing)
+
+    def cancel_buy_order(self, buyer_id, order_id):
+        """Cancela uma ordem de compra e devolve o ouro reservado. Retorna a ordem removida."""
+        with self._lock:
+            self._ensure_current()
+            order = self._orders.get(order_id)
+            if not order or order['buyer_id'] != buyer_id:
+                raise MarketError("Ordem de compra não encontrada ou ela não é sua.")
+            with database.transaction():
+                database.remove_market_buy_order(order_id)
+                buyer = database.get_character(buyer_id)
+                database.update_character_stats(buyer_id, {'gold': buyer['gold'] + order['quantity'] * order['price']})
+            self._drop_order(order_id)
+            return dict(order)
+
+    # --- Auxiliares (chamados com o lock) ---
+
+    def _settle(self, listing, buyer_id, quantity, price):
+        """Dentro da transação: entrega os itens, paga o vendedor e atualiza o anúncio no banco."""
+        seller = database.get_character(listing['seller_id'])
+        database.update_character_stats(listing['seller_id'], {'gold': seller['gold'] + price * quantity})
+        database.add_item_to_inventory(buyer_id, listing['item_id'], quantity, listing['enhancement_level'])
+        if quantity == listing['quantity']:
+            database.remove_market_listing(listing['id'])
+        else:
+            database.update_market_listing_quantity(listing['id'], listing['quantity'] - quantity)
+
+    def _fill_listing(self, listing_id, quantity):
+        """Após o commit: desconta a quantidade vendida do anúncio (a posição no livro não muda)."""
+        listing = self._listings[listing_id]
+        if quantity >= listing['quantity']:
+            self._drop_listing(listing_id)
+        else:
+            listing['quantity'] -= quantity
+        self.stats["fills"] += 1
+        self.stats["units_traded"] += quantity
+
+    def _fill_order(self, order_id, quantity):
+        order = self._orders[order_id]
+        if quantity >= order['quantity']:
+            self._drop_order(order_id)
+        else:
+            order['quantity'] -= quantity
+        self.stats["fills"] += 1
+        self.stats["units_traded"] += quantity
+
+
+_market = None
+_market_lock = threading.Lock()
+
+def get_market():
+    """Retorna o livro de ofertas, carregando-o do banco no primeiro uso."""
+    global _market
+    if _market is None:
+        with _market_lock:
+            if _market is None:
+                _market = MarketEngine()
+    return _market
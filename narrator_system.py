@@ -3,15 +3,372 @@ import discord
 import json
 import asyncio
 import re
-from openai import AsyncOpenAI
+import time
+from openai import AsyncOpenAI, BadRequestError
 
 import database
+from async_database import db
 from config import OPENAI_API_KEY, OPENAI_MODEL, OPENAI_BASE_URL
 from battle_system import PVEBattle
+from llm_scheduler import LLMScheduler, PRIORITY_BACKGROUND
 
 # Inicializa o cliente da OpenAI
 # Certifique-se de que a variável de ambiente ou a chave em config.py está definida
-client = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
+# As novas tentativas ficam a cargo do agendador, que libera a vaga enquanto espera
+client = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, max_retries=0)
+# Todas as chamadas passam pelo agendador: limite global, rodízio entre jogadores e prioridade para turnos
+scheduler = LLMScheduler()
+
+# --- Saída Estruturada ---
+# Com NARRATOR_STRUCTURED_OUTPUT, cada turno é uma única chamada que devolve JSON com a narração e as
+# ações tipadas. Se o provedor não suportar json_schema ou a resposta vier inválida, o turno usa o
+# caminho antigo (narração e depois uma segunda chamada só para as tags).
+NARRATOR_STRUCTURED_OUTPUT = True
+ACTION_TYPES = ("BATTLE", "REWARD", "CREATE_ITEM", "END")
+ITEM_TYPES = ("weapon", "armor")
+ITEM_SLOTS = ("helmet", "chest", "legs", "right_hand", "left_hand", "ring")
+
+NARRATOR_RESPONSE_SCHEMA = {
+    "name": "narrator_turn",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "narration": {"type": "string"},
+            "actions": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "type": {"type": "string", "enum": list(ACTION_TYPES)},
+                        "enemy": {"type": ["string", "null"]},
+                        "xp": {"type": ["integer", "null"]},
+                        "gold": {"type": ["integer", "null"]},
+                        "item": {"anyOf": [{"type": "null"}, {
+                            "type": "object",
+                            "properties": {
+                                "name": {"type": "string"},
+                                "description": {"type": "string"},
+                                "type": {"type": "string", "enum": list(ITEM_TYPES)},
+                                "slot": {"type": "string", "enum": list(ITEM_SLOTS)},
+                                "attack": {"type": "integer"},
+                                "defense": {"type": "integer"},
+                            },
+                            "required": ["name", "description", "type", "slot", "attack", "defense"],
+                            "additionalProperties": False,
+                        }]},
+                    },
+                    "required": ["type", "enemy", "xp", "gold", "item"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["narration", "actions"],
+        "additionalProperties": False,
+    },
+}
+
+STRUCTURED_PROMPT = """
+Responda SOMENTE com JSON no formato pedido: `narration` traz o texto para o jogador, sem nenhuma tag entre colchetes,
+e `actions` traz as ações do turno (lista vazia se não houver nenhuma). Em cada ação, preencha apenas os campos do seu tipo
+e use null nos demais: BATTLE usa `enemy`; REWARD usa `xp` e/ou `gold`; CREATE_ITEM usa `item`; END não usa nenhum.
+"""
+
+# --- Streaming ---
+# Com NARRATOR_STREAMING, a narração aparece assim que a primeira frase chega e a mesma mensagem
+# é editada conforme o restante é gerado. O Discord permite cerca de 5 edições a cada 5 segundos
+# por canal, então as edições respeitam um intervalo mínimo. As tags só são lidas do texto final.
+NARRATOR_STREAMING = True
+STREAM_EDIT_INTERVAL = 1.2 # Segundos entre edições da mesma mensagem
+STREAM_FIRST_MESSAGE_CHARS = 150 # Sem frase completa, publica assim que tiver este tanto de texto
+DISCORD_MESSAGE_LIMIT = 2000
+
+# --- Memória ---
+# O prompt de cada turno (prompt do sistema, resumo, instruções da sessão e as mensagens mais recentes)
+# cabe em NARRATOR_HISTORY_TOKEN_BUDGET: as mensagens ficam com o que sobra depois das partes fixas.
+# Quando as mensagens fora do resumo passam do orçamento, as mais antigas são resumidas em segundo plano
+# (veja SummaryWorker), mantendo as últimas NARRATOR_RECENT_TOKENS como texto original.
+NARRATOR_HISTORY_TOKEN_BUDGET = 3000
+NARRATOR_RECENT_TOKENS = 1500
+NARRATOR_SUMMARY_MODEL = OPENAI_MODEL # Pode ser um modelo mais barato que o da narração
+SUMMARY_BATCH_SIZE = 8 # Jogadores resumidos por lote
+SUMMARY_BATCH_DELAY = 2.0 # Segundos esperando outros pedidos antes de processar um lote
+SUMMARY_MAX_ATTEMPTS = 5
+SUMMARY_RETRY_DELAY = 30.0 # Segundos; dobra a cada nova tentativa
+
+# Contadores de todas as sessões, para comparar o custo dos modos
+narrator_stats = {"turns": 0, "structured_turns": 0, "text_turns": 0, "fallback_turns": 0, "streamed_turns": 0,
+                  "api_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_total": 0.0,
+                  "first_text_total": 0.0}
+
+
+class NarratorFormatError(Exception):
+    """A resposta estruturada da IA não pôde ser lida ou validada."""
+
+
+def _clean_tag_value(value):
+    """Remove o que quebraria a sintaxe das tags (aspas e colchetes)."""
+    return re.sub(r'["\[\]]', '', str(value)).strip()
+
+
+def _action_to_tag(action):
+    """Valida uma ação tipada e a converte para a tag equivalente, ou retorna None se for inválida."""
+    if not isinstance(action, dict) or action.get("type") not in ACTION_TYPES:
+        return None
+    action_type = action["type"]
+    if action_type == "BATTLE":
+        enemy = _clean_tag_value(action.get("enemy") or "")
+        return f"BATTLE:{enemy}" if enemy else None
+    if action_type == "REWARD":
+        rewards = [f"{key.upper()}={action[key]}" for key in ("xp", "gold")
+                   if isinstance(action.get(key), int) and not isinstance(action.get(key), bool) and action[key] > 0]
+        return f"REWARD:{','.join(rewards)}" if rewards else None
+    if action_type == "CREATE_ITEM":
+        item = action.get("item")
+        if not isinstance(item, dict) or not _clean_tag_value(item.get("name", "")):
+            return None
+        if item.get("type") not in ITEM_TYPES or item.get("slot") not in ITEM_SLOTS:
+            return None
+        stats = [item.get("attack", 0), item.get("defense", 0)]
+        if not all(isinstance(v, int) and not isinstance(v, bool) and v >= 0 for v in stats):
+            return None
+        return (f'CREATE_ITEM:name="{_clean_tag_value(item["name"])}",description="{_clean_tag_value(item.get("description", ""))}",'
+                f'type="{item["type"]}",slot="{item["slot"]}",attack="{stats[0]}",defense="{stats[1]}",rarity="unique"')
+    return "END"
+
+
+def _rejects_parameter(error, *params):
+    """
+    Indica se o erro 400 é o provedor recusando um dos parâmetros (ex.: response_format sem suporte),
+    e não um problema só desta requisição (contexto longo demais, filtro de conteúdo...).
+    """
+    if getattr(error, "param", None) in params:
+        return True
+    message = str(getattr(error, "message", error)).lower()
+    return any(param in message for param in params)
+
+
+def _partial_narration(content):
+    """Lê o valor de "narration" de um JSON ainda incompleto (o campo vem primeiro no esquema)."""
+    match = re.search(r'"narration"\s*:\s*"', content)
+    if not match:
+        return ""
+    chars = []
+    i = match.end()
+    while i < len(content):
+        char = content[i]
+        if char == '"':
+            break
+        if char == '\\':
+            if i + 1 >= len(content):
+                break # Escape cortado no meio; espera o próximo pedaço
+            escaped = content[i + 1]
+            if escaped == 'u':
+                if i + 6 > len(content):
+                    break
+                try:
+                    chars.append(chr(int(content[i + 2:i + 6], 16)))
+                except ValueError:
+                    pass
+                i += 6
+                continue
+            chars.append({'n': '\n', 't': '\t', 'r': ''}.get(escaped, escaped))
+            i += 2
+            continue
+        chars.append(char)
+        i += 1
+    return "".join(chars)
+
+
+def _visible_text(text):
+    """Texto livre sem as tags completas e sem uma tag que ainda está sendo escrita no final."""
+    text = re.sub(r'\[.*?\]', '', text)
+    open_tag = text.rfind('[')
+    return text[:open_tag] if open_tag != -1 else text
+
+
+class StreamingMessage:
+    """Mostra um texto que ainda está sendo gerado, editando a mesma mensagem em intervalos controlados."""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.message = None
+        self.shown = ""
+        self.first_shown_at = None
+        self._last_edit = 0.0
+
+    def _ready_to_post(self, text):
+        return len(text) >= STREAM_FIRST_MESSAGE_CHARS or re.search(r'[.!?…]\s', text) is not None
+
+    async def update(self, text):
+        text = text.strip()[:DISCORD_MESSAGE_LIMIT]
+        if not text or text == self.shown:
+            return
+        now = time.monotonic()
+        if self.message is None:
+            if not self._ready_to_post(text):
+                return
+            self.message = await self.channel.send(text)
+            self.first_shown_at = time.perf_counter()
+        elif now - self._last_edit >= STREAM_EDIT_INTERVAL:
+            await self.message.edit(content=text)
+        else:
+            return
+        self.shown = text
+        self._last_edit = now
+
+    async def finish(self, text):
+        """Mostra o texto final completo (em mais mensagens, se passar do limite do Discord)."""
+        text = text.strip()
+        if not text:
+            return
+        head, rest = text[:DISCORD_MESSAGE_LIMIT], text[DISCORD_MESSAGE_LIMIT:]
+        if self.message is None:
+            self.message = await self.channel.send(head)
+            self.first_shown_at = time.perf_counter()
+        elif head != self.shown:
+            await self.message.edit(content=head)
+        self.shown = head
+        while rest:
+            await self.channel.send(rest[:DISCORD_MESSAGE_LIMIT])
+            rest = rest[DISCORD_MESSAGE_LIMIT:]
+
+
+def parse_structured_response(content):
+    """Converte a resposta JSON em texto no formato antigo (narração seguida das tags), já validado."""
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError) as e:
+        raise NarratorFormatError(f"JSON inválido: {e}")
+    if not isinstance(data, dict) or not isinstance(data.get("narration"), str) or not isinstance(data.get("actions", []), list):
+        raise NarratorFormatError("campos 'narration' e 'actions' ausentes ou com tipo errado")
+    narration = re.sub(r'\[.*?\]', '', data["narration"]).strip()
+    tags = []
+    for action in data.get("actions", []):
+        tag = _action_to_tag(action)
+        if tag is None:
+            print(f"Ação inválida descartada da resposta do Mestre: {action}")
+        else:
+            tags.append(f"[{tag}]")
+    if not narration and not tags:
+        raise NarratorFormatError("resposta vazia")
+    return " ".join([narration] + tags).strip()
+
+class SummaryWorker:
+    """
+    Fila de resumos do histórico do Narrador, fora do caminho dos turnos.
+
+    As mensagens já estão gravadas quando um resumo é pedido, então o trabalho parte sempre do banco:
+    pedidos repetidos do mesmo jogador viram um só, os pedidos que chegam juntos são processados em
+    lotes de até SUMMARY_BATCH_SIZE jogadores e cada resumo é gravado com save_narrative_summary, que
+    ignora resumos que não avançam sobre o gravado. Falhas voltam para a fila com espera crescente.
+    Um resumo perdido num reinício é refeito: ao iniciar, enqueue_backlog() procura no banco os
+    jogadores com mensagens demais fora do resumo.
+    """
+
+    def __init__(self, batch_size=SUMMARY_BATCH_SIZE, batch_delay=SUMMARY_BATCH_DELAY,
+                 max_attempts=SUMMARY_MAX_ATTEMPTS, retry_delay=SUMMARY_RETRY_DELAY):
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.sessions = {} # {user_id: NarrativeSession} que recebem o resumo novo assim que ele é gravado
+        self._queue = {} # {user_id: tentativas já feitas}, em ordem de chegada
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._busy = False
+        self._retry_handles = {} # {user_id: call_later das novas tentativas agendadas}
+        self.counters = {"requested": 0, "summarized": 0, "skipped": 0, "retries": 0, "failed": 0, "batches": 0}
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def request(self, user_id, attempts=0):
+        """Pede um resumo do histórico do jogador. Não espera por ele."""
+        if user_id not in self._queue:
+            self.counters["requested"] += 1
+            self._queue[user_id] = attempts
+        self.start()
+        self._wakeup.set()
+
+    async def enqueue_backlog(self):
+        """Enfileira os jogadores que ficaram com mensagens demais fora do resumo (ex.: bot reiniciado no meio de um resumo)."""
+        user_ids = await db.get_narrative_summary_backlog(NARRATOR_HISTORY_TOKEN_BUDGET)
+        for user_id in user_ids:
+            self.request(user_id)
+        if user_ids:
+            print(f"{len(user_ids)} histórico(s) do Narrador aguardando resumo foram enfileirados.")
+        return len(user_ids)
+
+    def is_idle(self):
+        return not self._queue and not self._busy and not self._retry_handles
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await asyncio.sleep(self.batch_delay) # Junta os pedidos que chegarem logo em seguida
+            while self._queue:
+                batch = list(self._queue.items())[:self.batch_size]
+                for user_id, _ in batch:
+                    del self._queue[user_id]
+                self.counters["batches"] += 1
+                self._busy = True
+                try:
+                    await asyncio.gather(*(self._summarize(user_id, attempts) for user_id, attempts in batch))
+                finally:
+                    self._busy = False
+
+    async def _summarize(self, user_id, attempts):
+        try:
+            batch = await db.get_narrative_summary_batch(user_id, NARRATOR_RECENT_TOKENS)
+            if batch['pending_tokens'] <= NARRATOR_HISTORY_TOKEN_BUDGET or not batch['turns']:
+                self.counters["skipped"] += 1 # Já resumido por um pedido anterior
+                return
+            summary_prompt = "Resuma a conversa a seguir em um parágrafo conciso, capturando os eventos e decisões mais importantes do jogador. Este resumo será usado como memória para continuar a aventura."
+            if batch['summary']:
+                summary_prompt += f" Integre ao resumo anterior: {batch['summary']}"
+            conversation = [{"role": t['role'], "content": t['content']} for t in batch['turns']]
+
+            response = await scheduler.submit(user_id, lambda: client.chat.completions.create(
+                model=NARRATOR_SUMMARY_MODEL,
+                messages=[
+                    {"role": "system", "content": summary_prompt},
+                    {"role": "user", "content": json.dumps(conversation, ensure_ascii=False)}
+                ],
+                temperature=0.3
+            ), priority=PRIORITY_BACKGROUND)
+            summary = response.choices[0].message.content
+            summarized_through = batch['turns'][-1]['id']
+            if await db.save_narrative_summary(user_id, summary, summarized_through):
+                self.counters["summarized"] += 1
+                session = self.sessions.get(user_id)
+                if session:
+                    session.apply_summary(summary, summarized_through)
+            if batch['has_more']:
+                self.request(user_id) # Histórico longo demais para um lote; continua no próximo
+        except Exception as e:
+            attempts += 1
+            if attempts < self.max_attempts:
+                self.counters["retries"] += 1
+                delay = self.retry_delay * 2 ** (attempts - 1)
+                self._retry_handles[user_id] = asyncio.get_running_loop().call_later(delay, self._retry, user_id, attempts)
+            else:
+                # As mensagens continuam gravadas; o resumo é tentado de novo no próximo pedido ou reinício
+                self.counters["failed"] += 1
+                print(f"Falha ao resumir o histórico do jogador {user_id}: {e}")
+
+    def _retry(self, user_id, attempts):
+        self._retry_handles.pop(user_id, None)
+        self.request(user_id, attempts)
+
+    def stats(self):
+        return {**self.counters, "queued": len(self._queue), "waiting_retry": len(self._retry_handles)}
+
+
+summarizer = SummaryWorker()
+
 
 class NarrativeSession:
     def __init__(self, bot_instance, player_char):
@@ -20,26 +377,31 @@ class NarrativeSession:
         self.user_id = player_char['user_id']
         self.is_complete = False
         self.pending_enemy = None
-        self.history = database.get_narrative_history(self.user_id)
+        self.turn_stats = [] # Latência e tokens de cada turno (veja _finish_turn)
+        self.notes = [] # Instruções de sistema desta sessão, que não vão para o histórico gravado
 
-        if not self.history:
-            self.history = []
-            self._initialize_prompt()
-        else:
+        memory = database.get_narrative_memory(self.user_id)
+        self.summary = memory['summary']
+        self.summarized_through = memory['summarized_through']
+        self.turns = memory['turns'] # Mensagens ainda não cobertas pelo resumo, em ordem cronológica
+
+        self.recent_event = None
+        if self.summary or self.turns:
             # Verifica se há um resultado de batalha recente não processado
             last_battle_result = self.bot.last_battle_results.pop(self.user_id, None)
             
             continue_prompt = f"A aventura de {self.player['name']} continua."
             
             if last_battle_result:
-                # Adiciona o evento recente ao contexto da IA
-                continue_prompt += f" Evento recente importante: {last_battle_result}. Leve isso em consideração ao iniciar a narração."
+                # O evento vai para o histórico gravado (em _run_loop), para ser lembrado nas próximas sessões
+                self.recent_event = f"Evento recente importante: {last_battle_result}."
+                continue_prompt += " Leve em consideração o evento recente ao iniciar a narração."
             
             continue_prompt += " Lembre-se de tudo que aconteceu antes e prossiga a jornada."
 
-            self.history.append({"role": "system", "content": continue_prompt})
+            self.notes.append({"role": "system", "content": continue_prompt})
 
-    def _initialize_prompt(self):
+    def _system_prompt(self):
         """Define o comportamento inicial do Mestre de Jogo (IA)."""
         system_prompt = f"""
         Você é o Mestre de Jogo do 'TextHeroes', um RPG de texto no Discord.
@@ -67,36 +429,204 @@ class NarrativeSession:
 
         Comece a aventura agora.
         """
-        self.history.append({"role": "system", "content": system_prompt})
+        return {"role": "system", "content": system_prompt}
 
-    async def _summarize_history(self):
-        """Resume o histórico se ele ficar muito longo para economizar tokens."""
-        # Um resumo é acionado quando o histórico tem mais de 10 trocas (20 mensagens)
-        if len(self.history) > 20:
-            print(f"Resumindo histórico para o jogador {self.user_id}...")
-            summary_prompt = "Resuma a conversa a seguir em um parágrafo conciso, capturando os eventos e decisões mais importantes do jogador. Este resumo será usado como memória para continuar a aventura."
-            
-            # Pega o histórico antigo, excluindo a última interação do sistema
-            history_to_summarize = self.history[:-1]
+    @property
+    def history(self):
+        """
+        Mensagens enviadas à IA: prompt do sistema, resumo, instruções da sessão e as mensagens
+        mais recentes. Tudo junto cabe em NARRATOR_HISTORY_TOKEN_BUDGET (a última mensagem sempre entra).
+        """
+        messages = [self._system_prompt()]
+        if self.summary:
+            messages.append({"role": "system", "content": f"{database.NARRATIVE_SUMMARY_PREFIX} {self.summary}"})
+        messages.extend(self.notes)
+        budget = NARRATOR_HISTORY_TOKEN_BUDGET - sum(database.estimate_tokens(m['content']) for m in messages)
+        recent = []
+        for turn in reversed(self.turns):
+            if recent and turn['tokens'] > budget:
+                break
+            recent.append({"role": turn['role'], "content": turn['content']})
+            budget -= turn['tokens']
+        messages.extend(reversed(recent))
+        return messages
+
+    async def add_turn(self, role, content):
+        """Grava uma mensagem no histórico (só acrescenta) e pede um resumo se as antigas passarem do orçamento."""
+        turn = await db.append_narrative_turn(self.user_id, role, content)
+        self.turns.append(turn)
+        if sum(t['tokens'] for t in self.turns) > NARRATOR_HISTORY_TOKEN_BUDGET:
+            summarizer.request(self.user_id)
+
+    def apply_summary(self, summary, summarized_through):
+        """Troca as mensagens já cobertas pelo resumo novo (chamado pelo SummaryWorker)."""
+        self.summary = summary
+        self.summarized_through = summarized_through
+        self.turns = [t for t in self.turns if t['id'] > summarized_through]
+
+    def _new_turn(self):
+        return {"mode": None, "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "started": time.perf_counter()}
+
+    async def _complete(self, turn, **kwargs):
+        """Chama a API de chat e soma chamadas e tokens ao turno."""
+        response = await scheduler.submit(self.user_id, lambda: client.chat.completions.create(**kwargs))
+        if turn is not None:
+            turn["calls"] += 1
+            usage = getattr(response, "usage", None)
+            if usage:
+                turn["prompt_tokens"] += usage.prompt_tokens or 0
+                turn["completion_tokens"] += usage.completion_tokens or 0
+        return response
+
+    async def _stream(self, turn, on_text, **kwargs):
+        """Chama a API em modo streaming, repassando o texto acumulado a `on_text`. Retorna o texto completo."""
+        async def attempt():
+            # Uma nova tentativa recomeça o texto do zero (a mensagem em exibição é sobrescrita)
+            stream = await client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **kwargs)
+            content = ""
+            usage = None
+            async for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    content += chunk.choices[0].delta.content
+                    await on_text(content)
+            return content, usage
+
+        content, usage = await scheduler.submit(self.user_id, attempt)
+        turn["calls"] += 1
+        if usage:
+            turn["prompt_tokens"] += usage.prompt_tokens or 0
+            turn["completion_tokens"] += usage.completion_tokens or 0
+        return content
+
+    def _finish_turn(self, turn):
+        """Registra a latência e o consumo do turno nos contadores da sessão e globais."""
+        started = turn.pop("started")
+        turn["latency"] = time.perf_counter() - started
+        first_shown_at = turn.pop("first_shown_at", None)
+        turn["first_text"] = (first_shown_at - started) if first_shown_at else turn["latency"]
+        self.turn_stats.append(turn)
+        narrator_stats["turns"] += 1
+        narrator_stats[f"{turn['mode']}_turns"] += 1
+        narrator_stats["streamed_turns"] += 1 if turn.get("streamed") else 0
+        narrator_stats["api_calls"] += turn["calls"]
+        narrator_stats["prompt_tokens"] += turn["prompt_tokens"]
+        narrator_stats["completion_tokens"] += turn["completion_tokens"]
+        narrator_stats["latency_total"] += turn["latency"]
+        narrator_stats["first_text_total"] += turn["first_text"]
+        if getattr(self.bot, "debug_mode", False):
+            print(f"[Narrador] {self.user_id}: turno {turn['mode']}{' (streaming)' if turn.get('streamed') else ''} "
+                  f"em {turn['latency']:.2f}s (primeiro texto em {turn['first_text']:.2f}s), "
+                  f"{turn['calls']} chamada(s), {turn['prompt_tokens']}+{turn['completion_tokens']} tokens, "
+                  f"fila da IA: {scheduler.queue_depth()}")
+
+    async def get_structured_response(self, turn=None):
+        """Obtém narração e ações em uma única chamada com saída estruturada (json_schema)."""
+        global NARRATOR_STRUCTURED_OUTPUT
+        try:
+            response = await self._complete(
+                turn,
+                model=OPENAI_MODEL,
+                messages=self.history + [{"role": "system", "content": STRUCTURED_PROMPT}],
+                temperature=0.7,
+                max_tokens=600, # A narração (400) mais o JSON das ações
+                response_format={"type": "json_schema", "json_schema": NARRATOR_RESPONSE_SCHEMA}
+            )
+        except BadRequestError as e:
+            if _rejects_parameter(e, "response_format", "json_schema"):
+                # O provedor em OPENAI_BASE_URL não aceita json_schema: não adianta tentar nos próximos turnos
+                NARRATOR_STRUCTURED_OUTPUT = False
+                raise NarratorFormatError(f"saída estruturada não suportada: {e}")
+            raise NarratorFormatError(f"requisição recusada: {e}") # Só este turno usa o modo antigo
+        return parse_structured_response(response.choices[0].message.content)
+
+    async def get_streamed_response(self, turn, view):
+        """
+        Gera o turno em streaming, mostrando a narração em `view` (StreamingMessage) enquanto ela chega.
+        Com saída estruturada, a narração é lida do JSON parcial; sem ela, do texto livre sem as tags.
+        """
+        global NARRATOR_STRUCTURED_OUTPUT, NARRATOR_STREAMING
+        structured = NARRATOR_STRUCTURED_OUTPUT
+        if structured:
+            extract = _partial_narration
+            kwargs = dict(messages=self.history + [{"role": "system", "content": STRUCTURED_PROMPT}], max_tokens=600,
+                          response_format={"type": "json_schema", "json_schema": NARRATOR_RESPONSE_SCHEMA})
+        else:
+            extract = _visible_text
+            kwargs = dict(messages=self.history, max_tokens=400)
+        try:
+            content = await self._stream(turn, lambda text: view.update(extract(text)),
+                                         model=OPENAI_MODEL, temperature=0.7, **kwargs)
+        except BadRequestError as e:
+            # Só desliga o modo se o provedor recusou o parâmetro; outros erros 400 valem apenas para este turno
+            if _rejects_parameter(e, "response_format", "json_schema"):
+                NARRATOR_STRUCTURED_OUTPUT = False
+                raise NarratorFormatError(f"saída estruturada não suportada: {e}")
+            if _rejects_parameter(e, "stream", "stream_options"):
+                NARRATOR_STREAMING = False
+                raise NarratorFormatError(f"streaming não suportado: {e}")
+            raise NarratorFormatError(f"requisição recusada: {e}")
+
+        if structured:
+            try:
+                response = parse_structured_response(content)
+            except NarratorFormatError:
+                # O JSON veio quebrado depois da narração: aproveita o texto, sem ações
+                response = extract(content).strip()
+                if not response and not view.message:
+                    raise
+        else:
+            response = content
+        narration, _ = self.parse_actions(response)
+        await view.finish(narration)
+        turn["mode"] = "structured" if structured else "text"
+        turn["streamed"] = True
+        turn["first_shown_at"] = view.first_shown_at
+        return response
+
+    async def next_turn(self, with_tag_pass=True, channel=None):
+        """
+        Gera a próxima resposta do Mestre (narração seguida das tags de ação).
+        Retorna (resposta, narração já mostrada em `channel`).
 
+        Com `channel` e NARRATOR_STREAMING, a narração é mostrada enquanto é gerada. Senão tenta
+        a chamada estruturada; se ela falhar, usa a narração livre e, com `with_tag_pass`, uma
+        segunda chamada só para as tags.
+        """
+        turn = self._new_turn()
+        response = None
+        shown = False
+        view = None
+        if channel is not None and NARRATOR_STREAMING:
+            view = StreamingMessage(channel)
             try:
-                response = await client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": summary_prompt},
-                        {"role": "user", "content": json.dumps(history_to_summarize)}
-                    ],
-                    temperature=0.3
-                )
-                summary = response.choices[0].message.content
-                # Substitui o histórico antigo pelo prompt inicial + resumo
-                self._initialize_prompt() # Recria o prompt do sistema
-                self.history.append({"role": "system", "content": f"Memória da aventura até agora: {summary}"})
-                print(f"Histórico para {self.user_id} resumido com sucesso.")
+                response = await self.get_streamed_response(turn, view)
+                shown = True
             except Exception as e:
-                print(f"Falha ao resumir o histórico: {e}")
-
-    async def get_ai_response(self, custom_prompt=None):
+                print(f"Streaming do Mestre falhou, usando a resposta completa: {e}")
+        if response is None and NARRATOR_STRUCTURED_OUTPUT:
+            try:
+                response = await self.get_structured_response(turn)
+                turn["mode"] = "structured"
+            except Exception as e:
+                print(f"Resposta estruturada do Mestre falhou, usando o modo antigo: {e}")
+        if response is None:
+            turn["mode"] = "fallback"
+            narration_only = await self.get_ai_response(turn=turn)
+            tags_only = await self.get_action_tags_for_narration(narration_only, turn=turn) if with_tag_pass else ""
+            response = f"{narration_only.strip()} {tags_only.strip()}".strip()
+        if not shown and view is not None and view.message is not None:
+            # O streaming falhou depois de mostrar parte do texto: a mesma mensagem recebe a narração completa
+            narration, _ = self.parse_actions(response)
+            if narration:
+                await view.finish(narration)
+                shown = True
+            else:
+                await view.message.delete()
+        self._finish_turn(turn)
+        return response, shown
+
+    async def get_ai_response(self, custom_prompt=None, turn=None):
         """Envia o histórico para a API da OpenAI e obtém a próxima narração."""
         messages_to_send = self.history
         if custom_prompt:
@@ -104,7 +634,8 @@ class NarrativeSession:
             messages_to_send = self.history + [{"role": "system", "content": custom_prompt}]
 
         try:
-            response = await client.chat.completions.create(
+            response = await self._complete(
+                turn,
                 model=OPENAI_MODEL, # Usa o modelo do arquivo de configuração
                 messages=messages_to_send,
                 temperature=0.7,
@@ -115,7 +646,7 @@ class NarrativeSession:
             print(f"Erro na API da OpenAI: {e}")
             return "O Mestre parece confuso e não consegue continuar a história. A aventura termina abruptamente. [END]"
 
-    async def get_action_tags_for_narration(self, narration):
+    async def get_action_tags_for_narration(self, narration, turn=None):
         """Pede à IA para gerar apenas as tags de ação com base na narração fornecida."""
         tag_prompt = f"""
         Baseado na seguinte narração que você acabou de criar:
@@ -128,7 +659,8 @@ class NarrativeSession:
         """
         try:
             # Chamada de API mais leve, sem o histórico completo, para focar na geração da tag.
-            response = await client.chat.completions.create(
+            response = await self._complete(
+                turn,
                 model=OPENAI_MODEL,
                 messages=[{"role": "system", "content": tag_prompt}],
                 temperature=0.2, # Menos criatividade, mais precisão na formatação da tag
@@ -151,7 +683,7 @@ class NarrativeSession:
         
         if action_type.upper() == 'BATTLE':
             enemy_name = params
-            enemy = database.get_enemy_by_name(enemy_name)
+            enemy = await db.get_enemy_by_name(enemy_name)
             if not enemy:
                 await ctx.send(f"(O Mestre tentou invocar um '{enemy_name}', mas a criatura não existe neste mundo. A aventura continua...)")
                 return True
@@ -176,8 +708,8 @@ class NarrativeSession:
                 reward_msgs.append(f"💰 **{gold}** Ouro")
 
             if updates:
-                database.update_character_stats(self.player['user_id'], updates)
-                self.player = database.get_character(self.user_id) # Atualiza o estado do jogador
+                await db.update_character_stats(self.player['user_id'], updates)
+                self.player = await db.get_character(self.user_id) # Atualiza o estado do jogador
                 await ctx.send(f"🎁 **Recompensa recebida:** {', '.join(reward_msgs)}!")
         
         elif action_type.upper() == 'CREATE_ITEM':
@@ -196,9 +728,9 @@ class NarrativeSession:
                 if 'slot' in item_params: item_params['equip_slot'] = item_params.pop('slot')
                 if 'type' in item_params: item_params['item_type'] = item_params.pop('type')
 
-                item_id = database.create_loot_item(item_params)
+                item_id = await db.create_loot_item(item_params)
                 if item_id:
-                    database.add_item_to_inventory(self.user_id, item_id, 1)
+                    await db.add_item_to_inventory(self.user_id, item_id, 1)
                     await ctx.send(f"✨ **Artefato Conquistado!** ✨\nVocê obteve **{item_params['name']}** e o guardou em seu inventário.")
                 else:
                     await ctx.send("(O Mestre tentou forjar um item, mas a magia falhou.)")
@@ -216,21 +748,32 @@ class NarrativeSession:
 
     async def run(self, ctx):
         """Loop principal da sessão de narração."""
-        # Garante que a sessão seja salva no final
+        # Cada mensagem já foi gravada durante a sessão e os resumos ficam com o SummaryWorker;
+        # no final só resta o relatório
+        summarizer.sessions[self.user_id] = self
         try:
             await self._run_loop(ctx)
         finally:
-            await self._summarize_history()
-            database.save_narrative_history(self.user_id, self.history)
-            print(f"Histórico de narração para {self.user_id} foi salvo.")
+            if summarizer.sessions.get(self.user_id) is self:
+                del summarizer.sessions[self.user_id]
+            if self.turn_stats:
+                turns = len(self.turn_stats)
+                print(f"Narração de {self.user_id}: {turns} turno(s), latência média "
+                      f"{sum(t['latency'] for t in self.turn_stats) / turns:.2f}s, "
+                      f"{sum(t['calls'] for t in self.turn_stats)} chamada(s), "
+                      f"{sum(t['prompt_tokens'] + t['completion_tokens'] for t in self.turn_stats)} tokens.")
 
     async def _run_loop(self, ctx):
-        # Primeira mensagem da IA
-        ai_message = await self.get_ai_response()
-        self.history.append({"role": "assistant", "content": ai_message})
+        if self.recent_event:
+            await self.add_turn("system", self.recent_event)
+
+        # Primeira mensagem da IA (no modo antigo, as tags já vêm no próprio texto)
+        async with ctx.typing():
+            ai_message, shown = await self.next_turn(with_tag_pass=False, channel=ctx)
+        await self.add_turn("assistant", ai_message)
         narration, actions = self.parse_actions(ai_message)
         
-        if narration:
+        if narration and not shown:
             await ctx.send(narration)
 
         for action in actions:
@@ -256,21 +799,16 @@ class NarrativeSession:
                     break
 
                 self.pending_enemy = None # Qualquer outra ação cancela o combate iminente
-                self.history.append({"role": "user", "content": player_msg.content})
+                await self.add_turn("user", player_msg.content)
 
                 async with ctx.typing():
-                    # Etapa 1: Gerar a narração
-                    narration_only = await self.get_ai_response()
-                    
-                    # Etapa 2: Gerar as tags com base na narração
-                    tags_only = await self.get_action_tags_for_narration(narration_only)
+                    # Narração e tags em uma chamada (ou duas, no modo antigo), mostrada enquanto é gerada
+                    full_ai_response, shown = await self.next_turn(channel=ctx)
                 
-                # Combina a narração e as tags para manter o histórico consistente
-                full_ai_response = f"{narration_only.strip()} {tags_only.strip()}"
-                self.history.append({"role": "assistant", "content": full_ai_response})
+                await self.add_turn("assistant", full_ai_response)
                 narration, actions = self.parse_actions(full_ai_response)
 
-                if narration:
+                if narration and not shown:
                     await ctx.send(narration)
                 
                 should_continue = True
@@ -0,0 +1,124 @@
+import asyncio
+import weakref
+from collections import deque
+
+from broadcast_system import RateLimiter
+
+# --- Configuração da Fila de Mensagens ---
+OUTBOX_WINDOW = 0.5 # Segundos esperando mais linhas de log antes de enviá-las juntas
+# O Discord permite cerca de 5 mensagens a cada 5 segundos por canal
+CHANNEL_RATE_LIMIT = 5
+CHANNEL_RATE_PERIOD = 5.0
+DISCORD_MESSAGE_LIMIT = 2000
+
+# {channel_id: ChannelOutbox}; a fila some sozinha quando nenhuma batalha nem envio pendente a usa mais
+_outboxes = weakref.WeakValueDictionary()
+_sending = set() # Referências às tarefas de envio em andamento (mantêm viva a fila enquanto há o que enviar)
+
+
+class ChannelOutbox:
+    """
+    Fila de saída de um canal: junta as linhas de log de combate em poucas mensagens.
+
+    log() só acrescenta a linha e volta na hora; as linhas que chegarem dentro de OUTBOX_WINDOW
+    vão juntas em uma mensagem (dividida em várias se passar do limite de caracteres). send()
+    envia uma mensagem (ex.: o embed do turno) logo em seguida às linhas pendentes, aproveitando
+    a mesma chamada quando couber, e espera a entrega. Tudo sai na ordem em que foi pedido, e
+    os envios respeitam o limite de mensagens por canal do Discord.
+    """
+
+    def __init__(self, channel, window=OUTBOX_WINDOW):
+        self.channel = channel
+        self.window = window
+        self._limiter = RateLimiter(CHANNEL_RATE_LIMIT, per=CHANNEL_RATE_PERIOD)
+        self._items = deque() # (conteúdo, embed, future); linhas de log não têm future
+        self._urgent = asyncio.Event() # Há alguém esperando: não espera a janela
+        self._task = None
+
+    def log(self, *lines):
+        """Acrescenta linhas de texto à próxima mensagem do canal."""
+        for line in lines:
+            if line:
+                self._items.append((line, None, None))
+        self._start()
+
+    async def send(self, content=None, embed=None):
+        """Envia as linhas pendentes e depois esta mensagem. Retorna a mensagem enviada."""
+        future = asyncio.get_running_loop().create_future()
+        self._items.append((content, embed, future))
+        self._urgent.set()
+        self._start()
+        return await future
+
+    async def flush(self):
+        """Espera até que tudo o que foi pedido antes tenha sido enviado."""
+        await self.send()
+
+    def _start(self):
+        if self._items and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+            _sending.add(self._task)
+            self._task.add_done_callback(_sending.discard)
+
+    async def _run(self):
+        while self._items:
+            if not self._urgent.is_set():
+                try:
+                    await asyncio.wait_for(self._urgent.wait(), self.window)
+                except asyncio.TimeoutError:
+                    pass
+            self._urgent.clear()
+            while self._items:
+                await self._send_next()
+        self._urgent.clear()
+
+    async def _send_next(self):
+        lines = []
+        size = 0
+        while self._items and self._items[0][2] is None:
+            line = self._items[0][0]
+            if lines and size + len(line) + 1 > DISCORD_MESSAGE_LIMIT:
+                break
+            self._items.popleft()
+            lines.append(line)
+            size += len(line) + 1
+
+        future = None
+        embed = None
+        if self._items and self._items[0][2] is not None:
+            content, embed, future = self._items[0]
+            merged = "\n".join(lines + ([content] if content else []))
+            if len(merged) <= DISCORD_MESSAGE_LIMIT or not lines:
+                self._items.popleft()
+                lines = [merged] if merged else []
+            else:
+                future = embed = None # Vai sozinha na próxima chamada
+
+        if not lines and embed is None:
+            if future and not future.done():
+                future.set_result(None) # flush() sem nada pendente
+            return
+
+        await self._limiter.acquire()
+        try:
+            message = await self.channel.send("\n".join(lines) or None, embed=embed)
+        except Exception as e:
+            if future is None:
+                print(f"Não foi possível enviar o log de combate no canal {self.channel}: {e}")
+            elif not future.done():
+                future.set_exception(e)
+        else:
+            if future and not future.done():
+                future.set_result(message)
+
+
+def get_outbox(channel):
+    """Fila de saída do canal (a mesma para todas as batalhas que usam o canal)."""
+    outbox = _outboxes.get(channel.id)
+    if outbox is None:
+        outbox = _outboxes[channel.id] = ChannelOutbox(channel)
+    return outbox
+
+def forget_channel(channel_id):
+    """Descarta a fila de um canal apagado (chamado pelo evento on_guild_channel_delete do main.py)."""
+    _outboxes.pop(channel_id, None)
@@ -0,0 +1,242 @@
+import bisect
+import random
+
+# Níveis cobertos pelo índice pré-calculado (o teto sobe se algum dado passar disso).
+# Acima do teto, apenas entradas sem nível máximo são elegíveis.
+MAX_INDEXED_LEVEL = 100
+
+
+class AliasTable:
+    """
+    Sorteio ponderado em O(1) pelo método de alias de Vose.
+
+    A tabela é montada uma única vez em O(n); cada sorteio usa apenas um número
+    aleatório para escolher a coluna e outro para decidir entre ela e seu alias.
+    """
+
+    def __init__(self, entries, weights=None):
+        self.entries = list(entries)
+        if not self.entries:
+            raise ValueError("AliasTable precisa de pelo menos uma entrada.")
+        if weights is None:
+            weights = [1.0] * len(self.entries)
+        else:
+            weights = [float(w) for w in weights]
+        if len(weights) != len(self.entries) or any(w < 0 for w in weights):
+            raise ValueError("Os pesos devem ser não negativos e um por entrada.")
+        total = sum(weights)
+        if total <= 0:
+            raise ValueError("A soma dos pesos deve ser positiva.")
+
+        n = len(self.entries)
+        self.total_weight = total
+        self.prob = [0.0] * n
+        self.alias = [0] * n
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = (scaled[l] + scaled[s]) - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # O que sobrar tem probabilidade 1 (diferenças de arredondamento)
+        for i in large + small:
+            self.prob[i] = 1.0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def pick_index(self, rng=random):
+        column = int(rng.random() * len(self.prob))
+        return column if rng.random() < self.prob[column] else self.alias[column]
+
+    def pick(self, rng=random):
+        """Sorteia uma entrada respeitando os pesos."""
+        return self.entries[self.pick_index(rng)]
+
+
+class LevelIndex:
+    """
+    Índice pré-calculado por nível (1..MAX_INDEXED_LEVEL ou mais) das entradas elegíveis,
+    com uma AliasTable por nível para sorteios ponderados em O(1).
+
+    Cada entrada é elegível entre `min_level` e `max_level` (inclusive);
+    `max_level=None` significa sem limite superior.
+    Níveis consecutivos com o mesmo conjunto de entradas compartilham a mesma tabela.
+    """
+
+    def __init__(self, entries, min_level, max_level=None, weight=None, max_indexed_level=MAX_INDEXED_LEVEL):
+        entries = list(entries)
+        # O teto cresce se algum dado ultrapassar o padrão, para que nenhum nível fique de fora.
+        for entry in entries:
+            max_indexed_level = max(max_indexed_level, min_level(entry))
+            if max_level and max_level(entry) is not None:
+                max_indexed_level = max(max_indexed_level, max_level(entry))
+        self.max_indexed_level = max_indexed_level
+        self._by_level = [[] for _ in range(max_indexed_level + 2)] # índice 0 sem uso; último = acima do teto
+        self._tables = [None] * (max_indexed_level + 2)
+
+        for entry in entries:
+            low = max(min_level(entry), 1)
+            high = max_level(entry) if max_level else None
+            if high is None:
+                last = max_indexed_level + 1
+            else:
+                last = min(high, max_indexed_level)
+            for level in range(low, last + 1):
+                self._by_level[level].append(entry)
+
+        previous_key, previous_table = None, None
+        for level in range(1, max_indexed_level + 2):
+            bucket = self._by_level[level]
+            if not bucket:
+                previous_key, previous_table = None, None
+                continue
+            key = tuple(id(e) for e in bucket)
+            if key != previous_key:
+                previous_table = AliasTable(bucket, [weight(e) for e in bucket] if weight else None)
+                previous_key = key
+            self._tables[level] = previous_table
+
+    def _slot(self, level):
+        if level < 1:
+            return None
+        return min(level, self.max_indexed_level + 1)
+
+    def entries_at(self, level):
+        """Retorna a lista (compartilhada, não modificar) de entradas elegíveis no nível."""
+        slot = self._slot(level)
+        return self._by_level[slot] if slot is not None else []
+
+    def pick(self, level, rng=random):
+        """Sorteia uma entrada elegível no nível, ou None se não houver nenhuma."""
+        slot = self._slot(level)
+        table = self._tables[slot] if slot is not None else None
+        return table.pick(rng) if table else None
+
+
+class PrefixIndex:
+    """Entradas ordenadas por uma chave, para buscar em O(log n) todas com chave < limite."""
+
+    def __init__(self, entries, key):
+        self.entries = sorted(entries, key=key)
+        self.keys = [key(e) for e in self.entries]
+
+    def below(self, limit):
+        return self.entries[:bisect.bisect_left(self.keys, limit)]
+
+
+class RankedIndex:
+    """
+    Conjunto ordenado de chaves com posição em O(log n), para rankings atualizados aos poucos.
+
+    As chaves ficam em blocos ordenados de até 2 * LOAD elementos; `_maxes` guarda a última
+    chave de cada bloco (para achar o bloco por busca binária) e uma árvore de Fenwick soma os
+    tamanhos dos blocos (para calcular a posição sem percorrê-los). Inserir ou remover desloca
+    no máximo um bloco; a árvore só é reconstruída quando um bloco é dividido ou esvaziado.
+    """
+
+    LOAD = 256
+
+    def __init__(self, keys=()):
+        ordered = sorted(keys)
+        self._chunks = [ordered[i:i + self.LOAD] for i in range(0, len(ordered), self.LOAD)]
+        self._maxes = [chunk[-1] for chunk in self._chunks]
+        self._tree = None
+        self._len = len(ordered)
+
+    def __len__(self):
+        return self._len
+
+    def _build_tree(self):
+        tree = [len(chunk) for chunk in self._chunks]
+        for i in range(len(tree)):
+            parent = i | (i + 1)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, position, delta):
+        if self._tree is None:
+            return
+        while position < len(self._tree):
+            self._tree[position] += delta
+            position |= position + 1
+
+    def _count_before(self, chunk_index):
+        """Quantidade de chaves nos blocos anteriores a `chunk_index`."""
+        if self._tree is None:
+            self._build_tree()
+        total = 0
+        while chunk_index > 0:
+            total += self._tree[chunk_index - 1]
+            chunk_index &= chunk_index - 1
+        return total
+
+    def add(self, key):
+        if not self._chunks:
+            self._chunks.append([key])
+            self._maxes.append(key)
+            self._tree = None
+        else:
+            i = bisect.bisect_left(self._maxes, key)
+            if i == len(self._maxes):
+                i -= 1
+                self._chunks[i].append(key)
+                self._maxes[i] = key
+            else:
+                bisect.insort(self._chunks[i], key)
+            chunk = self._chunks[i]
+            if len(chunk) > 2 * self.LOAD:
+                self._chunks[i:i + 1] = [chunk[:self.LOAD], chunk[self.LOAD:]]
+                self._maxes[i:i + 1] = [chunk[self.LOAD - 1], chunk[-1]]
+                self._tree = None
+            else:
+                self._tree_add(i, 1)
+        self._len += 1
+
+    def discard(self, key):
+        """Remove `key`, se presente. Retorna True se removeu."""
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return False
+        chunk = self._chunks[i]
+        j = bisect.bisect_left(chunk, key)
+        if chunk[j] != key:
+            return False
+        del chunk[j]
+        self._len -= 1
+        if not chunk:
+            del self._chunks[i]
+            del self._maxes[i]
+            self._tree = None
+        else:
+            self._maxes[i] = chunk[-1]
+            self._tree_add(i, -1)
+        return True
+
+    def index(self, key):
+        """Posição (a partir de 0) de `key` na ordem crescente. Levanta ValueError se ausente."""
+        i = bisect.bisect_left(self._maxes, key)
+        if i < len(self._maxes):
+            j = bisect.bisect_left(self._chunks[i], key)
+            if self._chunks[i][j] == key:
+                return self._count_before(i) + j
+        raise ValueError(f"{key!r} não está no índice.")
+
+    def first(self, count, offset=0):
+        """As `count` menores chaves a partir da posição `offset`."""
+        result = []
+        for chunk in self._chunks:
+            if offset >= len(chunk):
+                offset -= len(chunk)
+                continue
+            result.extend(chunk[offset:offset + count - len(result)])
+            offset = 0
+            if len(result) >= count:
+                break
+        return result
@@ -0,0 +1,237 @@
+"""
+Simulador de batalhas PvE sem Discord, para balanceamento.
+
+Reproduz o ataque automático do `!autohunt` (jogador ataca, inimigo revida) usando as
+fórmulas de combat_engine.py, mas resolve milhares de lutas de uma vez com arrays NumPy.
+Para cada par personagem/inimigo informa a taxa de vitória, os turnos até a vitória
+e o HP restante do jogador.
+
+Precisa do NumPy (já listado no requirements.txt: pip install -r requirements.txt).
+
+Uso:
+    python tools/battle_simulator.py                      # todos os inimigos, nos níveis em que aparecem
+    python tools/battle_simulator.py --all-levels         # todos os inimigos em todos os níveis 1..100
+    python tools/battle_simulator.py --enemy Troll --level 14 --fights 20000
+    python tools/battle_simulator.py --class Feiticeiro --attack-bonus 10 --elite --csv saida.csv
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+try:
+    import numpy as np
+except ImportError:
+    sys.exit("O simulador precisa do NumPy. Instale com: pip install -r requirements.txt")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import combat_engine
+import database
+from game_constants import CLASS_DETAILS, RACE_MODIFIERS
+
+MAX_LEVEL = 100
+DEFAULT_FIGHTS = 5000
+ELITE_MULTIPLIER = 1.75 # Mesmo multiplicador aplicado em cogs/gameplay.py
+
+
+def build_character(level, char_class="Guerreiro", race="Humano"):
+    """
+    Monta um personagem típico do nível informado.
+
+    Atributos iniciais: 15 no atributo chave, 14 de Constituição, 12 de Destreza e o resto
+    distribuído; a cada 5 níveis os 4 pontos ganhos vão metade para o atributo chave e
+    metade para Constituição. HP segue a criação de personagem e o level up de battle_system.py.
+    """
+    key_attribute = CLASS_DETAILS[char_class]["key_attribute"]
+    attributes = {"strength": 10, "constitution": 14, "dexterity": 12, "intelligence": 10, "wisdom": 10, "charisma": 11}
+    attributes[key_attribute] = 15
+    for attr, modifier in RACE_MODIFIERS.get(race, {}).items():
+        attributes[attr] += modifier
+
+    max_hp = 50 + attributes["constitution"] * 5
+    for new_level in range(2, level + 1):
+        if new_level % 5 == 0:
+            attributes[key_attribute] += 2
+            attributes["constitution"] += 2
+        max_hp += 10 + attributes["constitution"] // 4
+
+    return {"name": f"{char_class} {race}", "class": char_class, "race": race, "level": level,
+            "max_hp": max_hp, "hp": max_hp, **attributes}
+
+
+class SimulationResult:
+    """Resultado de N lutas entre o mesmo personagem e o mesmo inimigo."""
+
+    def __init__(self, outcome, turns, hp_left):
+        self.outcome = outcome # 1 = vitória, -1 = derrota, 0 = empate (AUTOHUNT_MAX_TURNS, como no autohunt)
+        self.turns = turns
+        self.hp_left = hp_left
+
+    @property
+    def fights(self):
+        return len(self.outcome)
+
+    @property
+    def win_rate(self):
+        return float(np.mean(self.outcome == 1))
+
+    def summary(self):
+        wins = self.outcome == 1
+        won_turns = self.turns[wins]
+        won_hp = self.hp_left[wins]
+        def pct(values, q):
+            return float(np.percentile(values, q)) if len(values) else float("nan")
+        return {
+            "win_rate": self.win_rate,
+            "draw_rate": float(np.mean(self.outcome == 0)),
+            "turns_mean": float(won_turns.mean()) if len(won_turns) else float("nan"),
+            "turns_p50": pct(won_turns, 50),
+            "turns_p90": pct(won_turns, 90),
+            "hp_left_mean": float(won_hp.mean()) if len(won_hp) else float("nan"),
+            "hp_left_p10": pct(won_hp, 10),
+            "hp_left_p50": pct(won_hp, 50),
+        }
+
+
+def simulate(player, enemy, bonuses=None, fights=DEFAULT_FIGHTS, max_turns=combat_engine.AUTOHUNT_MAX_TURNS, rng=None):
+    """
+    Simula `fights` lutas do ataque automático em paralelo.
+
+    A cada turno o jogador ataca (com roubo de vida, se houver) e, se o inimigo sobreviver,
+    o inimigo revida. Apenas as lutas ainda em andamento são processadas em cada turno.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    bonuses = bonuses or {"attack": 0, "defense": 0, "special": {}}
+    attack = combat_engine.player_attack_power(player, bonuses)
+    defense = combat_engine.player_defense_power(player, bonuses)
+    lifesteal = bonuses.get("special", {}).get("LIFESTEAL_PERCENT", 0) / 100
+    low, high = combat_engine.ATTACK_VARIANCE_MIN, combat_engine.ATTACK_VARIANCE_MAX
+
+    outcome = np.zeros(fights, dtype=np.int8)
+    turns = np.full(fights, max_turns, dtype=np.int32)
+    hp_left = np.zeros(fights, dtype=np.int64)
+
+    active = np.arange(fights)
+    player_hp = np.full(fights, player["hp"], dtype=np.int64)
+    enemy_hp = np.full(fights, enemy["hp"], dtype=np.int64)
+
+    for turn in range(1, max_turns + 1):
+        if not len(active):
+            break
+        # np.rint arredonda para o par mais próximo, como o round() do Python
+        damage = np.maximum(0, np.rint(attack * rng.uniform(low, high, len(active))).astype(np.int64) - enemy["defense"])
+        enemy_hp -= damage
+        if lifesteal:
+            player_hp = np.minimum(player["max_hp"], player_hp + np.rint(damage * lifesteal).astype(np.int64))
+
+        won = enemy_hp <= 0
+        if won.any():
+            ids = active[won]
+            outcome[ids] = 1
+            turns[ids] = turn
+            hp_left[ids] = player_hp[won]
+
+        alive = ~won
+        active, player_hp, enemy_hp = active[alive], player_hp[alive], enemy_hp[alive]
+        if not len(active):
+            break
+
+        player_hp -= np.maximum(0, np.rint(enemy["attack"] * rng.uniform(low, high, len(active))).astype(np.int64) - defense)
+        lost = player_hp <= 0
+        if lost.any():
+            ids = active[lost]
+            outcome[ids] = -1
+            turns[ids] = turn
+
+        alive = ~lost
+        active, player_hp, enemy_hp = active[alive], player_hp[alive], enemy_hp[alive]
+
+    return SimulationResult(outcome, turns, hp_left)
+
+
+def make_elite(enemy):
+    """Aplica os multiplicadores de inimigo elite."""
+    elite = dict(enemy)
+    for stat in ("hp", "attack", "defense"):
+        elite[stat] = round(elite[stat] * ELITE_MULTIPLIER)
+    return elite
+
+
+def load_enemies(db_path):
+    """Lê os inimigos do banco informado ou, se nenhum for dado, de um banco temporário recém-populado."""
+    if db_path:
+        database.DATABASE_NAME = db_path
+    else:
+        database.DATABASE_NAME = os.path.join(tempfile.mkdtemp(prefix="battle_sim_"), "sim.db")
+        with redirect_stdout(open(os.devnull, "w")):
+            database.init_db()
+    enemies = sorted(database.get_game_data().enemies.values(), key=lambda e: (e["min_level"], e["id"]))
+    database.close_pool()
+    return enemies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador de batalhas PvE para balanceamento.")
+    parser.add_argument("--db", help="Banco de dados a usar (padrão: banco temporário com os dados iniciais)")
+    parser.add_argument("--enemy", help="Simula apenas este inimigo")
+    parser.add_argument("--level", type=int, help="Simula apenas este nível de personagem")
+    parser.add_argument("--all-levels", action="store_true", help="Simula cada inimigo em todos os níveis 1..100")
+    parser.add_argument("--class", dest="char_class", default="Guerreiro", choices=list(CLASS_DETAILS))
+    parser.add_argument("--race", default="Humano", choices=list(RACE_MODIFIERS))
+    parser.add_argument("--attack-bonus", type=int, default=0)
+    parser.add_argument("--defense-bonus", type=int, default=0)
+    parser.add_argument("--lifesteal", type=int, default=0, help="Porcentagem de roubo de vida")
+    parser.add_argument("--elite", action="store_true")
+    parser.add_argument("--fights", type=int, default=DEFAULT_FIGHTS)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--csv", help="Salva todos os resultados neste arquivo CSV")
+    args = parser.parse_args()
+
+    enemies = load_enemies(args.db)
+    if args.enemy:
+        enemies = [e for e in enemies if e["name"].lower() == args.enemy.lower()]
+        if not enemies:
+            sys.exit(f"Inimigo '{args.enemy}' não encontrado.")
+
+    bonuses = {"attack": args.attack_bonus, "defense": args.defense_bonus,
+               "special": {"LIFESTEAL_PERCENT": args.lifesteal} if args.lifesteal else {}}
+    rng = np.random.default_rng(args.seed)
+    characters = {}
+    rows = []
+
+    start = time.perf_counter()
+    for enemy in enemies:
+        if args.level:
+            levels = [args.level]
+        elif args.all_levels:
+            levels = range(1, MAX_LEVEL + 1)
+        else:
+            levels = range(enemy["min_level"], min(enemy["max_level"], MAX_LEVEL) + 1)
+        opponent = make_elite(enemy) if args.elite else enemy
+        for level in levels:
+            if level not in characters:
+                characters[level] = build_character(level, args.char_class, args.race)
+            result = simulate(characters[level], opponent, bonuses, args.fights, rng=rng)
+            rows.append({"enemy": enemy["name"], "level": level, **result.summary()})
+    elapsed = time.perf_counter() - start
+
+    print(f"{'Inimigo':<24} {'Nív':>3} {'Vitória':>8} {'Turnos':>7} {'p90':>5} {'HP rest.':>9} {'HP p10':>7}")
+    for row in rows:
+        print(f"{row['enemy']:<24} {row['level']:>3} {row['win_rate']:>8.1%} {row['turns_mean']:>7.1f} "
+              f"{row['turns_p90']:>5.0f} {row['hp_left_mean']:>9.0f} {row['hp_left_p10']:>7.0f}")
+    total_fights = len(rows) * args.fights
+    print(f"\n{len(rows)} confrontos, {total_fights:,} lutas em {elapsed:.2f}s ({total_fights / elapsed:,.0f} lutas/s)")
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Resultados salvos em {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark da camada de banco de dados.
+
+Compara quantos "comandos" por segundo o bot consegue processar abrindo uma conexão
+por chamada (comportamento antigo) contra o pool de conexões persistentes.
+Cada comando simula a sequência de chamadas de uma vitória no `!hunt`.
+
+Uso: python tools/bench_database.py [--commands 2000] [--players 50]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+
+
+@contextmanager
+def legacy_db_cursor():
+    """Reproduz o db_cursor antigo: uma conexão nova, commit e close a cada chamada."""
+    conn = sqlite3.connect(database.DATABASE_NAME)
+    cursor = conn.cursor()
+    try:
+        yield cursor
+    finally:
+        conn.commit()
+        conn.close()
+
+
+def seed_players(count):
+    """Cria personagens de teste com alguns itens no inventário."""
+    for user_id in range(1, count + 1):
+        database.create_character(user_id, 1, None, f"Bench {user_id}", "Humano", "Guerreiro",
+                                  14, 12, 10, 8, 8, 8, 110, 36)
+        database.add_item_to_inventory(user_id, 1, 5)
+        database.accept_quest(user_id, 1)
+
+
+def simulate_hunt_win(user_id):
+    """Executa as mesmas chamadas ao banco que uma vitória no !hunt."""
+    player = database.get_character(user_id)
+    database.get_equipped_items(user_id)
+    enemy = database.get_random_enemy(player['level'])
+    database.update_character_stats(user_id, {"experience": player['experience'] + 1, "gold": player['gold'] + enemy['gold_reward']})
+    loot = database.get_random_loot(player['level'])
+    if loot:
+        database.add_item_to_inventory(user_id, loot['id'])
+    database.get_character(user_id)
+    database.update_quest_progress(user_id, 'kill', enemy['name'])
+
+
+def run_mode(label, cursor_factory, commands, players):
+    """Cria um banco novo, popula e mede a vazão de comandos no modo informado."""
+    original_cursor = database.db_cursor
+    original_name = database.DATABASE_NAME
+    tmp_dir = tempfile.mkdtemp(prefix="bench_db_")
+    database.DATABASE_NAME = os.path.join(tmp_dir, "bench.db")
+    if cursor_factory is not None:
+        database.db_cursor = cursor_factory
+    try:
+        with redirect_stdout(open(os.devnull, "w")): # Silencia os logs de criação do banco
+            database.init_db()
+            seed_players(players)
+        rng = random.Random(42)
+        start = time.perf_counter()
+        for _ in range(commands):
+            simulate_hunt_win(rng.randint(1, players))
+        elapsed = time.perf_counter() - start
+    finally:
+        database.db_cursor = original_cursor
+        database.close_pool()
+        database.DATABASE_NAME = original_name
+    rate = commands / elapsed
+    print(f"{label:<28} {commands} comandos em {elapsed:.2f}s -> {rate:,.0f} comandos/s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pool de conexões SQLite.")
+    parser.add_argument("--commands", type=int, default=2000)
+    parser.add_argument("--players", type=int, default=50)
+    args = parser.parse_args()
+
+    legacy = run_mode("Conexão por chamada (antes)", legacy_db_cursor, args.commands, args.players)
+    pooled = run_mode("Pool persistente (depois)", None, args.commands, args.players)
+    print(f"Ganho: {pooled / legacy:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
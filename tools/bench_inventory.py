@@ -0,0 +1,109 @@
+"""
+Benchmark das operações de inventário em massa.
+
+Compara a forma antiga (uma chamada add_item_to_inventory por item, com um INSERT por unidade
+dos itens não empilháveis) com add_items(), que grava tudo em uma transação com executemany
+e UPSERT nas pilhas. Dois cenários, cada um em tamanhos crescentes:
+    loot    - recompensa de masmorra: cada jogador recebe vários itens diferentes
+    compra  - um jogador compra N unidades de uma arma (não empilhável) e N poções
+
+Se add_items escala com o número de linhas, as linhas/s ficam estáveis entre os tamanhos.
+
+Uso: python tools/bench_inventory.py [--sizes 100 1000 10000] [--players 50]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+
+
+def legacy_add_item(user_id, item_id, quantity=1, enhancement_level=0):
+    """Reproduz o add_item_to_inventory antigo: SELECT na pilha e um INSERT por unidade."""
+    with database.db_cursor() as cursor:
+        item_info = database.get_item_by_id(item_id)
+        if item_info['item_type'] in database.STACKABLE_ITEM_TYPES and enhancement_level == 0:
+            cursor.execute("SELECT id, quantity FROM inventory WHERE character_user_id = ? AND item_id = ? AND stackable = 1", (user_id, item_id))
+            existing_item = cursor.fetchone()
+            if existing_item:
+                cursor.execute("UPDATE inventory SET quantity = ? WHERE id = ?", (existing_item[1] + quantity, existing_item[0]))
+            else:
+                cursor.execute("INSERT INTO inventory (character_user_id, item_id, quantity, stackable) VALUES (?, ?, ?, 1)", (user_id, item_id, quantity))
+            return
+        for _ in range(quantity):
+            cursor.execute("INSERT INTO inventory (character_user_id, item_id, quantity, enhancement_level) VALUES (?, ?, 1, ?)",
+                           (user_id, item_id, enhancement_level))
+
+
+def fresh_database(players):
+    database.close_pool()
+    database.DATABASE_NAME = os.path.join(tempfile.mkdtemp(prefix="bench_inv_"), "bench.db")
+    with redirect_stdout(open(os.devnull, "w")):
+        database.init_db()
+        for user_id in range(1, players + 1):
+            database.create_character(user_id, 1, None, f"Bench {user_id}", "Humano", "Guerreiro",
+                                      14, 12, 10, 8, 8, 8, 110, 36)
+
+
+def loot_grants(size, players, rng):
+    """`size` itens sorteados entre todos os itens do jogo, distribuídos entre os jogadores."""
+    item_ids = list(database.get_game_data().items)
+    return [(rng.randint(1, players), rng.choice(item_ids), 1) for _ in range(size)]
+
+
+def purchase_grants(size):
+    """Um jogador compra `size` armas e `size` poções."""
+    items = database.get_game_data().items.values()
+    weapon = next(item for item in items if item['item_type'] == 'weapon')
+    potion = next(item for item in items if item['item_type'] == 'potion')
+    return [(1, weapon['id'], size), (1, potion['id'], size)]
+
+
+def count_rows():
+    with database.db_cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM inventory")
+        return cursor.fetchone()[0]
+
+
+def measure(label, size, grants, players, bulk):
+    fresh_database(players)
+    start = time.perf_counter()
+    if bulk:
+        database.add_items(grants)
+    else:
+        for grant in grants:
+            legacy_add_item(*grant)
+    elapsed = time.perf_counter() - start
+    rows = count_rows()
+    mode = "add_items" if bulk else "um por item"
+    print(f"{label:<7} {size:>7} {mode:<12} {rows:>7} linhas em {elapsed * 1000:>9.1f} ms -> {rows / elapsed:>12,.0f} linhas/s")
+    return rows / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das operações de inventário em massa.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--players", type=int, default=50)
+    args = parser.parse_args()
+    original_name = database.DATABASE_NAME
+
+    try:
+        for label in ("loot", "compra"):
+            for size in args.sizes:
+                fresh_database(args.players)
+                grants = loot_grants(size, args.players, random.Random(size)) if label == "loot" else purchase_grants(size)
+                legacy = measure(label, size, grants, args.players, bulk=False)
+                bulk = measure(label, size, grants, args.players, bulk=True)
+                print(f"{'':<7} {'':>7} {'ganho':<12} {bulk / legacy:>6.1f}x\n")
+    finally:
+        database.close_pool()
+        database.DATABASE_NAME = original_name
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark do placar de líderes.
+
+Cria N personagens sintéticos distribuídos entre vários servidores e compara a consulta
+SQL antiga (ordena a tabela characters inteira a cada !leaderboard) com os rankings em
+memória de database.py: top 10 global e por servidor, posição de um jogador e o custo de
+manter o ranking atualizado a cada alteração de XP ou resultado de PvP.
+
+Uso: python tools/bench_leaderboard.py [--characters 100000] [--guilds 50] [--queries 200]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+
+
+def seed_characters(count, guilds, rng):
+    """Insere os personagens direto na tabela, com nível, XP e PvP variados."""
+    rows = []
+    for user_id in range(1, count + 1):
+        level = rng.randint(1, 60)
+        wins = rng.randint(0, 200)
+        rows.append((user_id, rng.randint(1, guilds), f"Herói {user_id}", "Humano", "Guerreiro",
+                     14, 12, 10, 8, 8, 8, 110, 110, 36, 36,
+                     level, rng.randint(0, level * 100), wins, rng.randint(0, 200)))
+    with database.db_cursor() as cursor:
+        cursor.executemany("""
+            INSERT INTO characters (user_id, guild_id, name, race, class,
+                                    strength, constitution, dexterity, intelligence, wisdom, charisma,
+                                    hp, max_hp, mp, max_mp, level, experience, pvp_wins, pvp_losses)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+
+
+def legacy_leaderboard(sort_by, limit=10, guild_id=None):
+    """Reproduz o get_leaderboard antigo (com um filtro opcional por servidor)."""
+    where = "WHERE guild_id = ?" if guild_id is not None else ""
+    params = (guild_id, limit) if guild_id is not None else (limit,)
+    with database.db_cursor() as cursor:
+        if sort_by == 'level':
+            query = f"SELECT name, level, experience FROM characters {where} ORDER BY level DESC, experience DESC LIMIT ?"
+        else:
+            query = f"SELECT name, pvp_wins, pvp_losses, (pvp_wins - pvp_losses) as score FROM characters {where} ORDER BY score DESC, pvp_wins DESC LIMIT ?"
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+
+def legacy_rank(user_id, guild_id=None):
+    """Posição de um jogador no ranking de nível: conta quantos estão à frente dele."""
+    with database.db_cursor() as cursor:
+        cursor.execute(f"""
+            SELECT COUNT(*) + 1 FROM characters c, (SELECT level, experience FROM characters WHERE user_id = ?) me
+            WHERE (c.level > me.level OR (c.level = me.level AND c.experience > me.experience))
+            {'AND c.guild_id = ?' if guild_id is not None else ''}
+        """, (user_id, guild_id) if guild_id is not None else (user_id,))
+        return cursor.fetchone()[0]
+
+
+def timed(label, calls, func):
+    start = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<42} {calls:>6} chamadas em {elapsed * 1000:>8.1f} ms -> {elapsed / calls * 1e6:>9.1f} µs/chamada")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do placar de líderes.")
+    parser.add_argument("--characters", type=int, default=100000)
+    parser.add_argument("--guilds", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    database.DATABASE_NAME = os.path.join(tempfile.mkdtemp(prefix="bench_leaderboard_"), "bench.db")
+    try:
+        with redirect_stdout(open(os.devnull, "w")):
+            database.init_db()
+        seed_characters(args.characters, args.guilds, rng)
+
+        start = time.perf_counter()
+        database.get_leaderboard('level')
+        print(f"Rankings carregados: {args.characters} personagens em {(time.perf_counter() - start) * 1000:.1f} ms\n")
+
+        users = [rng.randint(1, args.characters) for _ in range(args.queries)]
+        guilds = [rng.randint(1, args.guilds) for _ in range(args.queries)]
+        timed("SQL: top 10 nível (global)", args.queries, lambda i: legacy_leaderboard('level'))
+        timed("Memória: top 10 nível (global)", args.queries, lambda i: database.get_leaderboard('level'))
+        timed("SQL: top 10 PvP (global)", args.queries, lambda i: legacy_leaderboard('pvp'))
+        timed("Memória: top 10 PvP (global)", args.queries, lambda i: database.get_leaderboard('pvp'))
+        timed("SQL: top 10 PvP (servidor)", args.queries, lambda i: legacy_leaderboard('pvp', 10, guilds[i]))
+        timed("Memória: top 10 PvP (servidor)", args.queries, lambda i: database.get_leaderboard('pvp', 10, guilds[i]))
+        timed("SQL: posição do jogador (global)", args.queries, lambda i: legacy_rank(users[i]))
+        timed("Memória: posição do jogador (global)", args.queries, lambda i: database.get_leaderboard_rank(users[i]))
+
+        updates = args.queries * 50
+        timed("Memória: XP ganho (buffer + ranking)", updates,
+              lambda i: database.buffer_character_stats(users[i % len(users)], {'experience': 100000 + i}))
+        timed("Memória: resultado de PvP (ranking)", updates,
+              lambda i: database._leaderboards.update(users[i % len(users)], {'pvp_wins': 1000 + i}))
+
+        # Confere se o ranking mantido aos poucos bate com uma ordenação completa da tabela
+        database.flush_character_stats()
+        expected = [(level, experience) for _, level, experience in legacy_leaderboard('level', 100)]
+        current = [(row['level'], row['experience']) for row in database.get_leaderboard('level', 100)]
+        print(f"\nTop 100 igual ao da consulta SQL: {'sim' if expected == current else 'NÃO'}")
+    finally:
+        database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
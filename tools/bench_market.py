@@ -0,0 +1,78 @@
+"""
+Benchmark do mercado: paginação e melhor preço.
+
+Compara as consultas SQL antigas (get_market_listings / count_market_listings, que ordenam
+a tabela a cada página) com o livro de ofertas em memória de market_system.py.
+
+Uso: python tools/bench_market.py [--listings 5000] [--pages 500]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+from market_system import MarketEngine
+
+
+def seed_market(listings, sellers, rng):
+    item_ids = list(database.get_game_data().items)
+    for user_id in range(1, sellers + 1):
+        database.create_character(user_id, 1, None, f"Vendedor {user_id}", "Humano", "Guerreiro",
+                                  14, 12, 10, 8, 8, 8, 110, 36)
+    with database.transaction():
+        for _ in range(listings):
+            database.create_market_listing(rng.randint(1, sellers), rng.choice(item_ids), rng.randint(1, 5),
+                                           rng.randint(1, 500), 0)
+
+
+def timed(label, calls, func):
+    start = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {calls} chamadas em {elapsed * 1000:>8.1f} ms -> {elapsed / calls * 1e6:>9.1f} µs/chamada")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do mercado de jogadores.")
+    parser.add_argument("--listings", type=int, default=5000)
+    parser.add_argument("--sellers", type=int, default=200)
+    parser.add_argument("--pages", type=int, default=500)
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    database.DATABASE_NAME = os.path.join(tempfile.mkdtemp(prefix="bench_market_"), "bench.db")
+    try:
+        with redirect_stdout(open(os.devnull, "w")):
+            database.init_db()
+        seed_market(args.listings, args.sellers, rng)
+
+        start = time.perf_counter()
+        engine = MarketEngine()
+        print(f"Livro de ofertas carregado: {args.listings} anúncios em {(time.perf_counter() - start) * 1000:.1f} ms\n")
+
+        total_pages = max(1, args.listings // 10)
+        pages = [rng.randint(1, total_pages) for _ in range(args.pages)]
+        timed("SQL: contagem + página", args.pages,
+              lambda i: (database.count_market_listings(), database.get_market_listings(pages[i], 10)))
+        timed("Memória: contagem + página", args.pages,
+              lambda i: (engine.count_listings(), engine.get_listings(pages[i], 10)))
+        timed("SQL: busca 'poção' + página", args.pages,
+              lambda i: (database.count_market_listings("poção"), database.get_market_listings(1, 10, "poção")))
+        timed("Memória: busca 'poção' + página", args.pages,
+              lambda i: (engine.count_listings("poção"), engine.get_listings(1, 10, "poção")))
+
+        item_ids = list(database.get_game_data().items)
+        timed("Memória: melhor preço de um item", args.pages * 10,
+              lambda i: engine.best_ask(item_ids[i % len(item_ids)]))
+    finally:
+        database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Teste de carga do Narrador contra o servidor de teste (tools/mock_llm_server.py).
+
+Cria personagens em um banco temporário e roda N sessões de NarrativeSession ao mesmo tempo,
+com um canal e mensagens de jogador simulados. Ao final mostra os percentis de latência dos
+turnos (total e até o primeiro texto aparecer), tokens, chamadas, o estado da fila da IA,
+mensagens enviadas/editadas no "Discord" e as gravações feitas no banco.
+
+Por padrão sobe o servidor de teste no próprio processo; com --base-url usa um servidor já em execução.
+
+Uso: python tools/load_test_narrator.py [--sessions 20] [--turns 6] [--think 1.0]
+                                        [--latency 0.4] [--token-delay 0.01] [--error-rate 0.02]
+                                        [--concurrency 4] [--no-stream] [--no-structured]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager, redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from openai import AsyncOpenAI
+
+import database
+from async_database import db, READ_PREFIXES
+import narrator_system
+from mock_llm_server import MockLLM, start_server
+
+PLAYER_ACTIONS = [
+    "Sigo pela trilha com cuidado.", "Examino os símbolos na parede.", "Pergunto ao mercador o que aconteceu.",
+    "Acendo uma tocha e entro na caverna.", "Procuro por armadilhas antes de avançar.", "Descanso um pouco e sigo viagem.",
+]
+
+
+class FakeMessage:
+    def __init__(self, channel, content, author_id=None):
+        self.channel = channel
+        self.content = content
+        self.author = type("Author", (), {"id": author_id})()
+
+    async def edit(self, content=None, **kwargs):
+        self.channel.counters["edits"] += 1
+        self.content = content
+
+
+class FakeChannel:
+    """Faz o papel do ctx e do canal: conta as mensagens enviadas e editadas."""
+
+    def __init__(self, counters):
+        self.counters = counters
+        self.channel = self
+
+    async def send(self, content=None, **kwargs):
+        self.counters["sends"] += 1
+        return FakeMessage(self, content)
+
+    @asynccontextmanager
+    async def typing(self):
+        yield
+
+
+class FakeBot:
+    """Responde ao wait_for da sessão com ações roteirizadas; depois delas, encerra por tempo esgotado."""
+
+    def __init__(self, user_id, channel, turns, think, rng):
+        self.user_id = user_id
+        self.channel = channel
+        self.remaining = turns
+        self.think = think
+        self.rng = rng
+        self.debug_mode = False
+        self.last_battle_results = {}
+        self.active_pve_battles = {}
+
+    async def wait_for(self, event, check=None, timeout=None):
+        if self.remaining <= 0:
+            raise asyncio.TimeoutError()
+        self.remaining -= 1
+        await asyncio.sleep(self.rng.uniform(0, 2 * self.think))
+        return FakeMessage(self.channel, self.rng.choice(PLAYER_ACTIONS), self.user_id)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+async def run(args):
+    runner = None
+    base_url = args.base_url
+    llm = None
+    if not base_url:
+        llm = MockLLM(args.latency, args.jitter, args.token_delay, args.error_rate, args.rate_limit_rate, seed=args.seed)
+        runner = await start_server(llm, port=args.port)
+        base_url = f"http://127.0.0.1:{args.port}/v1"
+
+    narrator_system.client = AsyncOpenAI(api_key="mock", base_url=base_url, max_retries=0)
+    narrator_system.scheduler.max_concurrency = args.concurrency
+    narrator_system.NARRATOR_STREAMING = not args.no_stream
+    narrator_system.NARRATOR_STRUCTURED_OUTPUT = not args.no_structured
+    narrator_system.summarizer.retry_delay = 1.0 # Não deixa o teste esperando dezenas de segundos por uma nova tentativa
+
+    rng = random.Random(args.seed)
+    counters = {"sends": 0, "edits": 0}
+    sessions = []
+    for user_id in range(1, args.sessions + 1):
+        channel = FakeChannel(counters)
+        bot = FakeBot(user_id, channel, args.turns, args.think, rng)
+        session = narrator_system.NarrativeSession(bot, database.get_character(user_id))
+        sessions.append((session, channel))
+
+    start = time.perf_counter()
+    with redirect_stdout(open(os.devnull, "w")):
+        await asyncio.gather(*(session.run(channel) for session, channel in sessions), return_exceptions=True)
+        while not narrator_system.summarizer.is_idle(): # Espera os resumos pedidos durante as sessões
+            await asyncio.sleep(0.1)
+    elapsed = time.perf_counter() - start
+    if runner:
+        await runner.cleanup()
+
+    turns = [turn for session, _ in sessions for turn in session.turn_stats]
+    latencies = [turn["latency"] for turn in turns]
+    first_text = [turn["first_text"] for turn in turns]
+    print(f"{args.sessions} sessões, {len(turns)} turnos do Mestre em {elapsed:.1f}s "
+          f"(streaming {'não' if args.no_stream else 'sim'}, estruturado {'não' if args.no_structured else 'sim'}, "
+          f"{args.concurrency} chamadas simultâneas)\n")
+    print(f"{'':<22} {'p50':>8} {'p90':>8} {'p99':>8} {'máx':>8}")
+    for label, values in (("Turno completo (s)", latencies), ("Primeiro texto (s)", first_text)):
+        print(f"{label:<22} {percentile(values, 0.5):>8.2f} {percentile(values, 0.9):>8.2f} "
+              f"{percentile(values, 0.99):>8.2f} {max(values, default=0):>8.2f}")
+
+    modes = {}
+    for turn in turns:
+        modes[turn["mode"]] = modes.get(turn["mode"], 0) + 1
+    print(f"\nModos: {', '.join(f'{mode}={count}' for mode, count in sorted(modes.items()))}")
+    print(f"Chamadas à IA: {sum(t['calls'] for t in turns)} | Tokens: {sum(t['prompt_tokens'] for t in turns)} de prompt, "
+          f"{sum(t['completion_tokens'] for t in turns)} gerados "
+          f"({sum(t['prompt_tokens'] for t in turns) / max(1, len(turns)):.0f} de prompt por turno)")
+    queue = narrator_system.scheduler.stats()
+    print(f"Fila da IA: espera média {queue['wait_avg']:.2f}s (máx. {queue['wait_max']:.2f}s), maior fila {queue['max_queue_depth']}, "
+          f"{queue['retries']} nova(s) tentativa(s), {queue['failed']} falha(s), {queue['timeouts']} tempo(s) esgotado(s)")
+    summaries = narrator_system.summarizer.stats()
+    print(f"Resumos: {summaries['summarized']} gravados em {summaries['batches']} lote(s), {summaries['skipped']} dispensado(s), "
+          f"{summaries['retries']} nova(s) tentativa(s), {summaries['failed']} falha(s)")
+    if llm:
+        print(f"Servidor de teste: {llm.stats['requests']} requisições ({llm.stats['streamed']} em streaming), "
+              f"{llm.stats['errors']} erro(s) 500, {llm.stats['rate_limited']} 429, até {llm.stats['max_in_flight']} simultâneas")
+    print(f"Discord: {counters['sends']} mensagens enviadas, {counters['edits']} edições")
+
+    writes = {name: stats.calls for name, stats in db.stats.items() if not name.startswith(READ_PREFIXES)}
+    with database.db_cursor() as cursor:
+        cursor.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(content)), 0) FROM narrative_turns")
+        rows, size = cursor.fetchone()
+        cursor.execute("SELECT COUNT(*) FROM narrative_summaries")
+        summaries = cursor.fetchone()[0]
+    print(f"Banco: {sum(writes.values())} gravações ({', '.join(f'{k}={v}' for k, v in sorted(writes.items()))}); "
+          f"{rows} mensagens ({size / 1024:.0f} KiB) e {summaries} resumo(s) em narrative_turns/narrative_summaries")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do Narrador com o servidor de teste.")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=6, help="mensagens de cada jogador")
+    parser.add_argument("--think", type=float, default=1.0, help="tempo médio (s) que o jogador leva para responder")
+    parser.add_argument("--concurrency", type=int, default=narrator_system.scheduler.max_concurrency)
+    parser.add_argument("--no-stream", action="store_true")
+    parser.add_argument("--no-structured", action="store_true")
+    parser.add_argument("--base-url", help="usa um servidor já em execução em vez de subir um")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--latency", type=float, default=0.4)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    database.DATABASE_NAME = os.path.join(tempfile.mkdtemp(prefix="load_narrator_"), "load.db")
+    try:
+        with redirect_stdout(open(os.devnull, "w")):
+            database.init_db()
+            for user_id in range(1, args.sessions + 1):
+                database.create_character(user_id, 1, 100 + user_id, f"Aventureiro {user_id}", "Humano", "Guerreiro",
+                                          14, 12, 10, 8, 8, 8, 110, 36)
+        asyncio.run(run(args))
+    finally:
+        db.shutdown()
+        database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Servidor local que imita a API de chat da OpenAI, para testar o Narrador sem gastar cota.
+
+Atende POST /v1/chat/completions com e sem streaming (SSE). As respostas são narrações sorteadas
+com tags de ação ([BATTLE:...], [REWARD:...], [CREATE_ITEM:...], [END]); com response_format
+json_schema, devolve o JSON estruturado do Narrador. Resumos e o pedido só de tags também são
+reconhecidos. Latência até o primeiro token, atraso por token e taxa de erros (429/500) são
+configuráveis. GET /stats mostra os contadores.
+
+Para usar com o bot, aponte OPENAI_BASE_URL do config.py para http://127.0.0.1:8765/v1.
+
+Uso: python tools/mock_llm_server.py [--port 8765] [--latency 0.4] [--token-delay 0.01]
+                                     [--error-rate 0.02] [--rate-limit-rate 0.02] [--script respostas.json]
+    --script  arquivo JSON com uma lista de respostas (texto com tags), usadas em ordem e em ciclo
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+
+from aiohttp import web
+
+SCENES = [
+    "A trilha se estreita entre árvores retorcidas e o vento traz um cheiro de fumaça.",
+    "Você chega a uma ponte de pedra coberta de musgo; do outro lado, uma tocha tremula.",
+    "Um mercador ferido pede ajuda, apontando para as sombras de uma caverna próxima.",
+    "O chão da cripta range sob seus pés e ossos antigos se espalham pelo corredor.",
+    "Uma névoa espessa cobre o pântano, e algo se move logo abaixo da superfície.",
+    "No alto da colina, as ruínas de uma torre guardam símbolos que brilham fracamente.",
+]
+ENEMIES = ["Goblin", "Lobo", "Esqueleto", "Orc Batedor"]
+ITEM_NAMES = ["Lâmina do Crepúsculo", "Escudo de Casca de Carvalho", "Anel da Névoa", "Elmo do Vigia"]
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+class MockLLM:
+    """Gera as respostas e simula latência e erros."""
+
+    def __init__(self, latency=0.4, jitter=0.2, token_delay=0.01, error_rate=0.0, rate_limit_rate=0.0,
+                 script=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.script = itertools.cycle(script) if script else None
+        self.rng = random.Random(seed)
+        self.ids = itertools.count(1)
+        self.stats = {"requests": 0, "streamed": 0, "errors": 0, "rate_limited": 0,
+                      "prompt_tokens": 0, "completion_tokens": 0, "in_flight": 0, "max_in_flight": 0}
+
+    def _random_actions(self):
+        actions = []
+        roll = self.rng.random()
+        if roll < 0.2:
+            actions.append({"type": "BATTLE", "enemy": self.rng.choice(ENEMIES), "xp": None, "gold": None, "item": None})
+        elif roll < 0.4:
+            actions.append({"type": "REWARD", "enemy": None, "xp": self.rng.randint(10, 80), "gold": self.rng.randint(5, 40), "item": None})
+        elif roll < 0.45:
+            actions.append({"type": "CREATE_ITEM", "enemy": None, "xp": None, "gold": None, "item": {
+                "name": f"{self.rng.choice(ITEM_NAMES)} {next(self.ids)}", "description": "Forjado pela lenda.",
+                "type": "weapon", "slot": "right_hand", "attack": self.rng.randint(1, 8), "defense": 0}})
+        if self.rng.random() < 0.08:
+            actions.append({"type": "END", "enemy": None, "xp": None, "gold": None, "item": None})
+        return actions
+
+    @staticmethod
+    def _tag(action):
+        if action["type"] == "BATTLE":
+            return f"[BATTLE:{action['enemy']}]"
+        if action["type"] == "REWARD":
+            return f"[REWARD:XP={action['xp']},GOLD={action['gold']}]"
+        if action["type"] == "CREATE_ITEM":
+            item = action["item"]
+            return (f'[CREATE_ITEM:name="{item["name"]}",description="{item["description"]}",type="{item["type"]}",'
+                    f'slot="{item["slot"]}",attack="{item["attack"]}",defense="{item["defense"]}",rarity="unique"]')
+        return "[END]"
+
+    def _narration(self):
+        return " ".join(self.rng.sample(SCENES, 2)) + " O que você faz?"
+
+    def reply(self, body):
+        """Conteúdo da resposta para o corpo da requisição."""
+        messages = body.get("messages", [])
+        text = " ".join(str(m.get("content", "")) for m in messages)
+        if "Resuma a conversa" in text:
+            return "O herói atravessou florestas e criptas, enfrentou criaturas e guardou segredos antigos."
+        if "Gere APENAS as tags" in text:
+            return " ".join(self._tag(action) for action in self._random_actions())
+        if self.script:
+            scripted = next(self.script)
+            if body.get("response_format", {}).get("type") == "json_schema":
+                # Converte o texto roteirizado para o formato estruturado
+                return json.dumps({"narration": scripted.split("[")[0].strip(), "actions": []}, ensure_ascii=False)
+            return scripted
+        actions = self._random_actions()
+        if body.get("response_format", {}).get("type") == "json_schema":
+            return json.dumps({"narration": self._narration(), "actions": actions}, ensure_ascii=False)
+        return " ".join([self._narration()] + [self._tag(action) for action in actions])
+
+    def failure(self):
+        """Sorteia uma falha simulada: (status, mensagem) ou None."""
+        roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            self.stats["rate_limited"] += 1
+            return 429, "Rate limit reached (simulado)."
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.stats["errors"] += 1
+            return 500, "Internal server error (simulado)."
+        return None
+
+    def first_token_delay(self):
+        return max(0.0, self.rng.gauss(self.latency, self.jitter))
+
+
+def _usage(prompt_tokens, completion_tokens):
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+async def chat_completions(request):
+    llm = request.app["llm"]
+    body = await request.json()
+    llm.stats["requests"] += 1
+    llm.stats["in_flight"] += 1
+    llm.stats["max_in_flight"] = max(llm.stats["max_in_flight"], llm.stats["in_flight"])
+    try:
+        await asyncio.sleep(llm.first_token_delay())
+        failure = llm.failure()
+        if failure:
+            status, message = failure
+            return web.json_response({"error": {"message": message, "type": "mock_error", "code": status}}, status=status)
+
+        content = llm.reply(body)
+        prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in body.get("messages", []))
+        completion_tokens = estimate_tokens(content)
+        llm.stats["prompt_tokens"] += prompt_tokens
+        llm.stats["completion_tokens"] += completion_tokens
+        completion_id = f"chatcmpl-mock-{next(llm.ids)}"
+        created = int(time.time())
+        model = body.get("model", "mock")
+
+        if not body.get("stream"):
+            await asyncio.sleep(llm.token_delay * completion_tokens)
+            return web.json_response({
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": _usage(prompt_tokens, completion_tokens),
+            })
+
+        llm.stats["streamed"] += 1
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        async def send(choices, usage=None):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": choices}
+            if usage is not None:
+                chunk["usage"] = usage
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+
+        await send([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        for i in range(0, len(content), 4): # ~1 token a cada 4 caracteres
+            await send([{"index": 0, "delta": {"content": content[i:i + 4]}, "finish_reason": None}])
+            await asyncio.sleep(llm.token_delay)
+        await send([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if body.get("stream_options", {}).get("include_usage"):
+            await send([], usage=_usage(prompt_tokens, completion_tokens))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+    finally:
+        llm.stats["in_flight"] -= 1
+
+
+async def stats(request):
+    return web.json_response(request.app["llm"].stats)
+
+
+def create_app(llm):
+    app = web.Application()
+    app["llm"] = llm
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+async def start_server(llm, host="127.0.0.1", port=8765):
+    """Inicia o servidor no event loop atual. Retorna o runner (use `await runner.cleanup()` para parar)."""
+    runner = web.AppRunner(create_app(llm))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita a API de chat da OpenAI.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.4, help="segundos até o primeiro token (média)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="desvio padrão da latência")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="segundos por token")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fração de respostas 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fração de respostas 429")
+    parser.add_argument("--script", help="arquivo JSON com uma lista de respostas")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script, encoding="utf-8") as f:
+            script = json.load(f)
+    llm = MockLLM(args.latency, args.jitter, args.token_delay, args.error_rate, args.rate_limit_rate, script, args.seed)
+    print(f"Servidor de teste em http://{args.host}:{args.port}/v1 (Ctrl+C para sair)")
+    web.run_app(create_app(llm), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Auditoria de planos de consulta do database.py.
+
+Cria um banco temporário, executa um roteiro que chama as funções públicas de database.py,
+captura cada SQL executado (com os parâmetros já substituídos) e roda EXPLAIN QUERY PLAN
+em cada um. Funções cujas consultas fazem varredura completa de uma tabela são sinalizadas.
+
+Uso: python tools/query_plan_audit.py [--players 200] [--strict] [--verbose]
+    --strict   termina com código 1 se alguma varredura completa inesperada for encontrada
+    --verbose  mostra o SQL e o plano de cada consulta sinalizada
+"""
+import argparse
+import functools
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+
+SQL_PREFIXES = ("SELECT", "UPDATE", "DELETE", "INSERT", "WITH")
+
+# Varreduras esperadas: a tabela inteira precisa ser lida ou é pequena e estática.
+EXPECTED_FULL_SCANS = {
+    "get_leaderboard": "a primeira consulta carrega todos os personagens nos rankings em memória",
+    "get_all_guilds": "lista todos os servidores",
+    "get_shop_items": "loot_table é pequena e filtrada por valor",
+    "count_shop_items": "loot_table é pequena e filtrada por valor",
+    "reset_player_quests_by_type": "quests é pequena e filtrada por tipo",
+    "get_available_quests": "quests é pequena e filtrada por tipo",
+    "count_market_listings": "sem índice por item; o bot conta pelo livro de ofertas em memória (market_system.py)",
+    "get_all_market_listings": "carrega o mercado inteiro no livro de ofertas em memória",
+    "get_all_market_buy_orders": "carrega o mercado inteiro no livro de ofertas em memória",
+    "get_narrative_summary_backlog": "roda uma vez ao iniciar o bot, para retomar os resumos pendentes",
+}
+
+_local = threading.local()
+captured = {} # {função: {sql}}
+
+
+def track(name, func):
+    """Registra qual função pública do database.py está em execução (a mais externa)."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        outermost = getattr(_local, "function", None) is None
+        if outermost:
+            _local.function = name
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if outermost:
+                _local.function = None
+    return wrapper
+
+
+def trace(sql):
+    function = getattr(_local, "function", None)
+    # Consultas internas do FTS5 às suas tabelas de apoio ('main'.'loot_search_...') não são nossas
+    if function and sql.lstrip().upper().startswith(SQL_PREFIXES) and "'main'." not in sql:
+        captured.setdefault(function, set()).add(sql.strip())
+
+
+def install_tracing():
+    original_new_connection = database.ConnectionPool._new_connection
+
+    def new_connection(pool):
+        conn = original_new_connection(pool)
+        conn.set_trace_callback(trace)
+        return conn
+
+    database.ConnectionPool._new_connection = new_connection
+    for name in dir(database):
+        value = getattr(database, name)
+        if callable(value) and not name.startswith("_") and getattr(value, "__module__", None) == "database" \
+                and not isinstance(value, type):
+            setattr(database, name, track(name, value))
+
+
+def run_scenario(players):
+    """Chama as funções públicas do database.py com dados realistas."""
+    for user_id in range(1, players + 1):
+        database.create_character(user_id, 1, 100 + user_id, f"Herói {user_id}", "Humano", "Guerreiro",
+                                  14, 12, 10, 8, 8, 8, 110, 36)
+        database.add_item_to_inventory(user_id, 1, 3)
+        database.add_item_to_inventory(user_id, 7, 1)
+    db = database
+    uid = 1
+    db.register_guild(1, "Servidor")
+    db.get_all_guilds()
+    db.get_character(uid)
+    db.get_character_by_name("herói 2")
+    db.update_character_image(uid, "https://example.com/a.png")
+    db.update_character_channel(uid, 555)
+    db.update_character_guild(uid, 1, 556)
+    db.update_character_stats(uid, {"gold": 500})
+    db.buffer_character_stats(uid, {"mp": 10})
+    db.flush_character_stats(uid)
+    db.get_random_enemy(5)
+    db.get_random_loot(5)
+    db.get_enemies_for_level(5)
+    db.get_all_huntable_enemies(20)
+    db.get_enemy_by_name("goblin")
+    inventory = db.get_inventory(uid)
+    db.get_item_by_name("Poção")
+    db.get_matching_items("pocao cura", descriptions=True)
+    db.get_matching_items("espdaa")
+    db.get_item_by_id(1)
+    db.add_item_to_inventory(uid, 1, 2)
+    db.remove_item_from_inventory(uid, 1, 1)
+    db.unify_stackable_items(uid)
+    db.add_items([(uid, 1, 2), (uid, 7), (2, 1, 1)])
+    db.remove_items([(uid, 1, 1), (uid, 7, 1)])
+    db.get_shop_items("potion")
+    db.count_shop_items("potion")
+    weapon = next(item for item in inventory if item[1] == 7)
+    db.equip_item(uid, weapon[0], "right_hand_id")
+    db.get_equipped_items(uid)
+    db.unequip_item(uid, "right_hand_id")
+    db.get_character_skills("Guerreiro", 10)
+    db.get_available_quests(uid, "daily")
+    db.accept_quest(uid, 1)
+    db.get_player_active_quests(uid)
+    db.get_quest_by_id(1)
+    db.update_quest_progress(uid, "kill", "Goblin")
+    db.update_quest_progress(uid, "work", "hours", 2)
+    db.flush_quest_progress()
+    db.complete_quest(uid, 1)
+    db.get_server_state("last_daily_reset")
+    db.set_server_state("audit", "1")
+    db.reset_player_quests_by_type("daily")
+    db.get_all_jobs()
+    db.get_job_by_id(1)
+    db.set_player_job(uid, 1)
+    db.get_player_job_progress(uid, 1)
+    db.update_player_job_progress(uid, 1, 2)
+    db.reset_player_job_progress(uid, 1)
+    db.create_market_listing(2, 1, 1, 50, 0)
+    db.get_market_listings()
+    db.get_market_listings(search_term="Poção")
+    db.count_market_listings()
+    db.count_market_listings("Poção")
+    listing = db.get_market_listings()[0]
+    db.get_market_listing_by_id(listing[0])
+    db.update_market_listing_quantity(listing[0], 1)
+    db.remove_market_listing(listing[0])
+    db.get_all_market_listings()
+    order_id = db.create_market_buy_order(uid, 1, 2, 40, 0)
+    db.get_market_buy_order_by_id(order_id)
+    db.update_market_buy_order_quantity(order_id, 1)
+    db.get_all_market_buy_orders()
+    db.remove_market_buy_order(order_id)
+    db.get_character_names([1, 2, 3])
+    db.get_leaderboard("level")
+    db.get_leaderboard("pvp")
+    db.get_leaderboard("level", 10, 1)
+    db.get_leaderboard_rank(uid, "pvp")
+    party_id = db.create_party(uid)
+    db.add_member_to_party(party_id, 2)
+    db.get_party_by_member(2)
+    db.get_party_by_leader(uid)
+    db.get_party_details(party_id)
+    db.remove_member_from_party(2)
+    db.disband_party(party_id)
+    db.get_all_dungeons()
+    db.get_dungeon_by_name("cripta")
+    db.get_boss_by_id(1)
+    db.get_boss_loot(1)
+    turn = db.append_narrative_turn(uid, "user", "olá")
+    db.append_narrative_turn(uid, "assistant", "Bem-vindo, aventureiro.")
+    db.save_narrative_summary(uid, "O herói chegou à vila.", turn["id"])
+    db.get_narrative_memory(uid)
+    db.get_narrative_summary_batch(uid, 0)
+    db.get_narrative_summary_backlog(0)
+    db.create_loot_item({"name": "Relíquia", "description": "Teste", "item_type": "weapon", "rarity": "unique"})
+    db.delete_character_full(players)
+    db.unregister_guild(1)
+
+
+def full_scans(conn, sql):
+    """Retorna (tabelas varridas por completo, plano) de uma consulta."""
+    try:
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    except sqlite3.Error as e:
+        return [], [f"(não foi possível analisar: {e})"]
+    details = [row[3] for row in plan]
+    # Subconsultas materializadas aparecem como SCAN do seu apelido; não são tabelas reais
+    derived = {d.split()[-1] for d in details if d.startswith(("CO-ROUTINE", "MATERIALIZE"))}
+    scans = []
+    for detail in details:
+        if not detail.startswith("SCAN "):
+            continue
+        if "USING" in detail or "CONSTANT ROW" in detail or "VIRTUAL TABLE INDEX" in detail:
+            continue
+        table = detail.split()[1]
+        if table not in derived:
+            scans.append(table)
+    return scans, details
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sinaliza funções do database.py que fazem varredura completa.")
+    parser.add_argument("--players", type=int, default=200)
+    parser.add_argument("--strict", action="store_true")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    database.DATABASE_NAME = os.path.join(tempfile.mkdtemp(prefix="query_audit_"), "audit.db")
+    with redirect_stdout(open(os.devnull, "w")):
+        database.init_db()
+    database.close_pool() # As conexões novas já nascem com o rastreamento
+    install_tracing()
+    with redirect_stdout(open(os.devnull, "w")):
+        run_scenario(args.players)
+    database.close_pool()
+
+    conn = sqlite3.connect(database.DATABASE_NAME)
+    public = sorted(name for name in dir(database) if hasattr(getattr(database, name), "__wrapped__"))
+    flagged = unexpected = 0
+    for name in public:
+        statements = captured.get(name)
+        if not statements:
+            continue
+        problems = []
+        for sql in sorted(statements):
+            scans, plan = full_scans(conn, sql)
+            if scans:
+                problems.append((sql, scans, plan))
+        if not problems:
+            print(f"  ok    {name} ({len(statements)} consulta(s))")
+            continue
+        flagged += 1
+        tables = sorted({t for _, scans, _ in problems for t in scans})
+        if name in EXPECTED_FULL_SCANS:
+            print(f"  scan  {name}: {', '.join(tables)} (esperado: {EXPECTED_FULL_SCANS[name]})")
+        else:
+            unexpected += 1
+            print(f"! SCAN  {name}: {', '.join(tables)}")
+        if args.verbose:
+            for sql, _, plan in problems:
+                print(f"        SQL:   {' '.join(sql.split())}")
+                for detail in plan:
+                    print(f"        plano: {detail}")
+
+    not_run = [name for name in public if name not in captured]
+    print(f"\n{len(captured)} funções com SQL analisadas; {flagged} com varredura completa ({unexpected} inesperada(s)).")
+    if not_run:
+        print(f"Sem SQL no roteiro (cache, memória ou não exercitadas): {', '.join(not_run)}")
+    if args.strict and unexpected:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()